@@ -334,6 +334,9 @@ REQUIRED = [
     ROOT / "export_step1_7_per_scenario.py",
     ROOT / "step1_immutable_ALLINONE.py",
     ROOT / "step_2_helpers_FIXED.py",
+    ROOT / "conflict_penalty.py",
+    ROOT / "friend_graph.py",
+    ROOT / "parse_cache.py",
     ROOT / "step_2_zoiroi_idiaterotites_FIXED_v3_PATCHED.py",
     ROOT / "step3_amivaia_filia_FIXED.py",
     ROOT / "step4_corrected.py",
@@ -0,0 +1,422 @@
+# -*- coding: utf-8 -*-
+"""
+benchmarks.py
+-------------
+Μετρήσεις χρόνου για τα «καυτά» σημεία της ροής (συνθετικά δεδομένα, σταθερό seed).
+Κάθε benchmark συγκρίνει τη νέα υλοποίηση με την παλιά και ελέγχει ότι δίνουν ίδιο αποτέλεσμα.
+
+CLI:
+    python benchmarks.py step1
+    python benchmarks.py step1 --num-classes 3 --max-kids 14
+    python benchmarks.py step1-apply --students 1000
+    python benchmarks.py step3 --students 100 500 2000
+    python benchmarks.py step4-fill --students 1000 --scenarios 5
+    python benchmarks.py step5 --students 1500
+    python benchmarks.py step5-beam --students 300 1500 --beam-widths 1 8 32
+"""
+import argparse
+import contextlib
+import io
+import random
+import time
+from typing import Callable, Iterable, List, Tuple
+
+
+def _timed(fn: Callable, *args, **kwargs) -> Tuple[float, object]:
+    """Εκτελεί τη fn σιωπηλά (χωρίς prints) και επιστρέφει (δευτερόλεπτα, αποτέλεσμα)."""
+    with contextlib.redirect_stdout(io.StringIO()):
+        t0 = time.perf_counter()
+        out = fn(*args, **kwargs)
+        dt = time.perf_counter() - t0
+    return dt, out
+
+
+def _synthetic_friendships(names: List[str], n_pairs: int, seed: int) -> frozenset:
+    """Τυχαίες αμοιβαίες δυάδες (sorted tuples) ανάμεσα στα ονόματα."""
+    rng = random.Random(seed)
+    all_pairs = [(a, b) for i, a in enumerate(names) for b in names[i + 1:]]
+    picked = rng.sample(all_pairs, min(n_pairs, len(all_pairs)))
+    return frozenset(tuple(sorted(p)) for p in picked)
+
+
+# ------------------------- Βήμα 1 -------------------------
+
+def bench_step1_generation(sizes: Iterable[int] = range(8, 21), num_classes: int = 2,
+                           legacy_max_kids: int = 16, partition_max_kids: int = 20,
+                           seed: int = 42) -> List[dict]:
+    """
+    Βήμα 1: itertools.product ("exhaustive") έναντι ισόρροπων διαμερίσεων ("partition")
+    και branch-and-bound top-5 ("bnb") για n παιδιά εκπαιδευτικών. Το exhaustive τρέχει
+    μόνο μέχρι legacy_max_kids (κλιμακώνεται ως num_classes ** n) και το partition μέχρι
+    partition_max_kids (υλοποιεί όλες τις ισόρροπες διαμερίσεις).
+    """
+    from step1_immutable_ALLINONE import Step1ImmutableProcessor
+
+    limits = {"exhaustive": legacy_max_kids, "partition": partition_max_kids, "bnb": None}
+    rows = []
+    print(f"{'kids':>5} {'exhaustive(s)':>14} {'partition(s)':>13} {'bnb(s)':>9} {'speedup':>9} {'scenarios':>10}  same")
+    for n in sizes:
+        kids = [f"Παιδί_{i:02d}" for i in range(n)]
+        friendships = _synthetic_friendships(kids, n // 2, seed + n)
+
+        times, results = {}, {}
+        for mode, limit in limits.items():
+            if limit is not None and n > limit:
+                continue
+            times[mode], results[mode] = _timed(Step1ImmutableProcessor(mode)._exhaustive_generation,
+                                                kids, num_classes, friendships)
+        ref = results["bnb"]
+        same = all(res == ref for res in results.values()) if len(results) > 1 else None
+        slowest = max((times[m] for m in ("exhaustive", "partition") if m in times), default=None)
+
+        row = {"kids": n, **{f"{m}_s": times.get(m) for m in limits},
+               "speedup": (slowest / times["bnb"]) if (slowest and times["bnb"]) else None,
+               "scenarios": len(ref), "same": same}
+        rows.append(row)
+        cells = [f"{times[m]:.3f}" if m in times else "—" for m in limits]
+        speed_txt = f"{row['speedup']:.1f}x" if row["speedup"] else "—"
+        same_txt = "—" if same is None else ("OK" if same else "DIFF")
+        print(f"{n:>5} {cells[0]:>14} {cells[1]:>13} {cells[2]:>9} {speed_txt:>9} {len(ref):>10}  {same_txt}")
+    return rows
+
+
+def _legacy_step1_apply(df, scenarios):
+    """Η παλιά εγγραφή στηλών ΒΗΜΑ1: μία μάσκα ΟΝΟΜΑ == μαθητής ανά παιδί και σενάριο."""
+    result_df = df.copy()
+    for scenario in scenarios:
+        col_name = scenario.column_name
+        result_df[col_name] = ""
+        for student_name, class_assigned in scenario.assignments.items():
+            mask = result_df["ΟΝΟΜΑ"] == student_name
+            if mask.any():
+                result_df.loc[mask, col_name] = class_assigned
+    return result_df
+
+
+def bench_step1_apply(n_students: int = 1000, n_kids: int = 100, n_scenarios: int = 5,
+                      num_classes: int = 40, seed: int = 42) -> dict:
+    """
+    Βήμα 1: εγγραφή στηλών ΒΗΜΑ1_ΣΕΝΑΡΙΟ_k σε συνθετικό ρόστερ n_students μαθητών
+    (παλιές μάσκες ανά μαθητή έναντι δείκτη ονομάτων + categorical στήλης).
+    """
+    import pandas as pd
+    from step1_immutable_ALLINONE import Step1ImmutableProcessor, Step1Results, Step1Scenario
+
+    rng = random.Random(seed)
+    names = [f"Μαθητής_{i:04d}" for i in range(n_students)]
+    df = pd.DataFrame({"ΟΝΟΜΑ": names,
+                       "ΦΥΛΟ": [rng.choice("ΑΚ") for _ in names],
+                       "ΠΑΙΔΙ_ΕΚΠΑΙΔΕΥΤΙΚΟΥ": ["Ο"] * n_students})
+    kids = rng.sample(names, n_kids)
+    labels = [f"Α{i+1}" for i in range(num_classes)]
+    scenarios = tuple(
+        Step1Scenario(id=k, column_name=f"ΒΗΜΑ1_ΣΕΝΑΡΙΟ_{k}",
+                      assignments={name: rng.choice(labels) for name in kids},
+                      description="συνθετικό", broken_friendships=0)
+        for k in range(1, n_scenarios + 1)
+    )
+    results = Step1Results(scenarios=scenarios, friendships=frozenset(), teacher_kids=tuple(kids),
+                           num_classes=num_classes, creation_timestamp="benchmark")
+
+    processor = Step1ImmutableProcessor()
+    processor._results = results
+    t_old, old_df = _timed(_legacy_step1_apply, df, scenarios)
+    t_new, new_df = _timed(processor.apply_to_dataframe, df)
+
+    cols = [s.column_name for s in scenarios]
+    same = all((new_df[c].astype(str) == old_df[c]).all() for c in cols)
+    mem_old = int(old_df[cols].memory_usage(deep=True).sum())
+    mem_new = int(new_df[cols].memory_usage(deep=True).sum())
+    row = {"students": n_students, "kids": n_kids, "scenarios": n_scenarios,
+           "legacy_s": t_old, "indexed_s": t_new, "speedup": t_old / t_new if t_new else None,
+           "legacy_bytes": mem_old, "categorical_bytes": mem_new, "same": same}
+    print(f"{n_students} μαθητές, {n_kids} παιδιά εκπ., {n_scenarios} σενάρια")
+    print(f"  legacy:  {t_old:.3f}s  {mem_old:>9} bytes")
+    print(f"  indexed: {t_new:.3f}s  {mem_new:>9} bytes  ({row['speedup']:.1f}x)  {'OK' if same else 'DIFF'}")
+    return row
+
+
+# ------------------------- Βήμα 3 -------------------------
+
+def _synthetic_step2_roster(n_students: int, placed_ratio: float, seed: int):
+    """Ρόστερ με ΦΙΛΟΙ (μερικές αμοιβαίες δυάδες) και στήλη ΒΗΜΑ2_ΣΕΝΑΡΙΟ_1 (~placed_ratio τοποθετημένοι)."""
+    import math
+    import pandas as pd
+
+    rng = random.Random(seed)
+    names = [f"Μαθητής_{i:04d}" for i in range(n_students)]
+    labels = [f"Α{i+1}" for i in range(max(2, math.ceil(n_students / 25)))]
+    friends = {n: set(rng.sample(names, 2)) - {n} for n in names}
+    for a, b in _synthetic_friendships(names, n_students, seed):
+        friends[a].add(b); friends[b].add(a)
+    return pd.DataFrame({
+        "ΟΝΟΜΑ": names,
+        "ΦΥΛΟ": [rng.choice("ΑΚ") for _ in names],
+        "ΦΙΛΟΙ": [", ".join(sorted(friends[n])) for n in names],
+        "ΒΗΜΑ2_ΣΕΝΑΡΙΟ_1": [rng.choice(labels) if rng.random() < placed_ratio else None for _ in names],
+    })
+
+
+def bench_step3(sizes: Iterable[int] = (100, 500, 2000), placed_ratio: float = 0.8,
+                seed: int = 42) -> List[dict]:
+    """
+    Βήμα 3: apply_step3_on_sheet σε greedy και matching mode (χρόνος + πόσοι τοποθετήθηκαν).
+    Το matching πρέπει να τοποθετεί τουλάχιστον όσους και το greedy.
+    """
+    from step3_amivaia_filia_FIXED import apply_step3_on_sheet, STEP3_MODES
+
+    rows = []
+    print(f"{'students':>9} {'greedy(s)':>10} {'matching(s)':>12} {'placed greedy':>14} {'placed matching':>16}  ok")
+    for n in sizes:
+        df = _synthetic_step2_roster(n, placed_ratio, seed + n)
+        before = int(df["ΒΗΜΑ2_ΣΕΝΑΡΙΟ_1"].notna().sum())
+        times, placed = {}, {}
+        for mode in STEP3_MODES:
+            times[mode], (df3, _meta) = _timed(apply_step3_on_sheet, df, "ΒΗΜΑ2_ΣΕΝΑΡΙΟ_1", None, mode)
+            placed[mode] = int(df3["ΒΗΜΑ3_ΣΕΝΑΡΙΟ_1"].notna().sum()) - before
+        ok = placed["matching"] >= placed["greedy"]
+        rows.append({"students": n, **{f"{m}_s": times[m] for m in STEP3_MODES},
+                     **{f"placed_{m}": placed[m] for m in STEP3_MODES}, "ok": ok})
+        print(f"{n:>9} {times['greedy']:>10.3f} {times['matching']:>12.3f} "
+              f"{placed['greedy']:>14} {placed['matching']:>16}  {'OK' if ok else 'FEWER'}")
+    return rows
+
+
+# ------------------------- Βήμα 4 -------------------------
+
+def _legacy_step4_fill(df, solutions):
+    """Η παλιά ροή: iterrows για τη βάση ΒΗΜΑ1–3 και εγγραφή κάθε κελιού ΒΗΜΑ4 με .loc."""
+    import numpy as np
+    import pandas as pd
+    from step4_corrected import _find_step_cols, _get_current_assignment_row
+
+    step_cols = _find_step_cols(df)
+    base = pd.Series(index=df.index, dtype=object)
+    for ridx, row in df.iterrows():
+        val = _get_current_assignment_row(row, step_cols)
+        if val is not None:
+            base.loc[ridx] = val
+    out = df.copy()
+    for k, assign in enumerate(solutions, start=1):
+        col = f"ΒΗΜΑ4_ΣΕΝΑΡΙΟ_{k}"
+        out[col] = np.nan
+        for idx, cl in assign.items():
+            if pd.notna(cl):
+                out.loc[idx, col] = cl
+        out[col] = out[col].where(out[col].notna(), base)
+    return out
+
+
+def _step4_fill(df, solutions):
+    """Η νέα ροή (όπως στο run_step4_multi_with_fill_v2): backfill στηλών + μία εγγραφή ανά σενάριο."""
+    from step4_corrected import _base_assignment_series
+
+    base = _base_assignment_series(df)
+    out = df.copy()
+    for k, assign in enumerate(solutions, start=1):
+        col = f"ΒΗΜΑ4_ΣΕΝΑΡΙΟ_{k}"
+        out[col] = assign
+        out[col] = out[col].where(out[col].notna(), base)
+    return out
+
+
+def bench_step4_fill(n_students: int = 1000, n_scenarios: int = 5, num_classes: int = 40,
+                     seed: int = 42) -> dict:
+    """
+    Βήμα 4: βάση αναθέσεων από ΒΗΜΑ1–3 και εγγραφή στηλών ΒΗΜΑ4_ΣΕΝΑΡΙΟ_k
+    (iterrows + κελί-κελί έναντι backfill + μία εγγραφή ανά στήλη).
+    """
+    import pandas as pd
+    import warnings
+
+    rng = random.Random(seed)
+    labels = [f"Α{i+1}" for i in range(num_classes)]
+    names = [f"Μαθητής_{i:04d}" for i in range(n_students)]
+    pick = lambda p: [rng.choice(labels) if rng.random() < p else None for _ in names]
+    df = pd.DataFrame({"ΟΝΟΜΑ": names, "ΦΥΛΟ": [rng.choice("ΑΚ") for _ in names],
+                       "ΒΗΜΑ1_ΣΕΝΑΡΙΟ_1": pick(0.1), "ΒΗΜΑ2_ΣΕΝΑΡΙΟ_1": pick(0.3),
+                       "ΒΗΜΑ3_ΣΕΝΑΡΙΟ_1": pick(0.5)})
+    unplaced = [i for i in range(n_students) if rng.random() < 0.3]
+    solutions = []
+    for _ in range(n_scenarios):
+        assign = pd.Series(index=df.index, dtype=object)
+        assign.loc[unplaced] = [rng.choice(labels) for _ in unplaced]
+        solutions.append(assign)
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", FutureWarning)   # upcast float→object στο παλιό .loc
+        t_old, old_df = _timed(_legacy_step4_fill, df, solutions)
+    t_new, new_df = _timed(_step4_fill, df, solutions)
+    same = old_df.equals(new_df)
+    row = {"students": n_students, "scenarios": n_scenarios, "legacy_s": t_old, "vectorised_s": t_new,
+           "speedup": t_old / t_new if t_new else None, "same": same}
+    print(f"{n_students} μαθητές, {n_scenarios} σενάρια ΒΗΜΑ4")
+    print(f"  legacy:     {t_old:.3f}s")
+    print(f"  vectorised: {t_new:.3f}s  ({row['speedup']:.1f}x)  {'OK' if same else 'DIFF'}")
+    return row
+
+
+# ------------------------- Βήμα 5 -------------------------
+
+def _legacy_step5_place(df, scenario_col):
+    """Η παλιά ροή του Βήματος 5: πλήθη με σάρωση της στήλης ανά μαθητή και υποψήφιο, εγγραφή με .loc."""
+    import step5_enhanced as s5
+
+    df = df.copy()
+    labs = s5._get_class_labels(df, scenario_col)
+    fully_mutual = df["ΠΛΗΡΩΣ_ΑΜΟΙΒΑΙΑ"].apply(s5._is_yes)
+    friends_list = df["ΦΙΛΟΙ"].map(s5._parse_list_cell)
+    mask = df[scenario_col].isna() & ((friends_list.map(len) == 0) | (~fully_mutual))
+    is_boy = lambda lab: ((df[scenario_col] == lab) & (df["ΦΥΛΟ"].astype(str).str.upper() == "Α")).sum()
+    is_girl = lambda lab: ((df[scenario_col] == lab) & (df["ΦΥΛΟ"].astype(str).str.upper() == "Κ")).sum()
+    for _, row in df[mask].copy().iterrows():
+        name, gender = str(row["ΟΝΟΜΑ"]).strip(), str(row["ΦΥΛΟ"]).strip().upper()
+        sizes = {lab: int((df[scenario_col] == lab).sum()) for lab in labs}
+        avail = [lab for lab, n in sizes.items() if n == min(sizes.values()) and n < 25]
+        if not avail:
+            continue
+        pool = avail
+        if len(avail) > 1:
+            diffs = [(c, max(sizes[l] + (l == c) for l in labs) - min(sizes[l] + (l == c) for l in labs))
+                     for c in avail]
+            pool = [c for c, d in diffs if d <= 2] or avail
+        if len(pool) > 1:
+            scores = []
+            for c in pool:
+                b = [int(is_boy(l)) + (l == c and gender == "Α") for l in labs]
+                g = [int(is_girl(l)) + (l == c and gender == "Κ") for l in labs]
+                scores.append((max(b) - min(b)) + (max(g) - min(g)))
+            pool = [c for c, sc in zip(pool, scores) if sc == min(scores)]
+            chosen = random.choice(pool)
+        else:
+            chosen = pool[0]
+        df.loc[df["ΟΝΟΜΑ"] == name, scenario_col] = chosen
+    return df, s5.calculate_penalty_score(df, scenario_col)
+
+
+def _synthetic_step4_roster(n_students: int, placed_ratio: float, seed: int):
+    """Ρόστερ μετά το Βήμα 4: ~placed_ratio τοποθετημένοι στη ΒΗΜΑ4_ΣΕΝΑΡΙΟ_1, χωρίς πλήρως αμοιβαίες φιλίες."""
+    import math
+    import pandas as pd
+
+    rng = random.Random(seed)
+    names = [f"Μαθητής_{i:04d}" for i in range(n_students)]
+    labels = [f"Α{i+1}" for i in range(max(2, math.ceil(n_students / 25)))]
+    return pd.DataFrame({
+        "ΟΝΟΜΑ": names,
+        "ΦΥΛΟ": [rng.choice("ΑΚ") for _ in names],
+        "ΚΑΛΗ_ΓΝΩΣΗ_ΕΛΛΗΝΙΚΩΝ": [rng.choice("ΝΟ") for _ in names],
+        "ΦΙΛΟΙ": [rng.choice(names) if rng.random() < 0.5 else "" for _ in names],
+        "ΠΛΗΡΩΣ_ΑΜΟΙΒΑΙΑ": ["Ο"] * n_students,
+        "ΒΗΜΑ4_ΣΕΝΑΡΙΟ_1": [rng.choice(labels) if rng.random() < placed_ratio else None for _ in names],
+    })
+
+
+def bench_step5(n_students: int = 1500, placed_ratio: float = 0.6, seed: int = 42) -> dict:
+    """
+    Βήμα 5: τοποθέτηση υπολοίπων με σάρωση στηλών ανά μαθητή έναντι τρεχόντων
+    πληθών ανά τμήμα. Ίδιο seed ⇒ ίδιο αποτέλεσμα. Η παλιά ροή κλιμακώνεται περίπου
+    κυβικά (~20 λεπτά για 1.500 μαθητές / 60 τμήματα).
+    """
+    import warnings
+    from step5_enhanced import step5_place_remaining_students
+
+    df = _synthetic_step4_roster(n_students, placed_ratio, seed)
+    n_classes = df["ΒΗΜΑ4_ΣΕΝΑΡΙΟ_1"].nunique()
+
+    random.seed(seed)
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", FutureWarning)
+        t_old, (old_df, old_pen) = _timed(_legacy_step5_place, df, "ΒΗΜΑ4_ΣΕΝΑΡΙΟ_1")
+    random.seed(seed)
+    t_new, (new_df, new_pen) = _timed(step5_place_remaining_students, df, "ΒΗΜΑ4_ΣΕΝΑΡΙΟ_1")
+    same = old_df.equals(new_df) and old_pen == new_pen
+    row = {"students": n_students, "to_place": int(df["ΒΗΜΑ4_ΣΕΝΑΡΙΟ_1"].isna().sum()),
+           "legacy_s": t_old, "tallies_s": t_new, "speedup": t_old / t_new if t_new else None, "same": same}
+    print(f"{n_students} μαθητές, {row['to_place']} προς τοποθέτηση, {n_classes} τμήματα")
+    print(f"  legacy:  {t_old:.3f}s")
+    print(f"  tallies: {t_new:.3f}s  ({row['speedup']:.1f}x)  {'OK' if same else 'DIFF'}")
+    return row
+
+
+def bench_step5_beam(sizes: Iterable[int] = (300, 1500), beam_widths: Iterable[int] = (1, 8, 32),
+                     placed_ratio: float = 0.6, seed: int = 42) -> List[dict]:
+    """
+    Βήμα 5: greedy έναντι beam search (χρόνος + τελικό calculate_penalty_score).
+    Το beam κρατά τη λύση του μόνο αν είναι αυστηρά καλύτερη, άρα penalty ≤ greedy.
+    """
+    from step5_enhanced import step5_place_remaining_students
+
+    beam_widths = list(beam_widths)
+    rows = []
+    print(f"{'students':>9} {'greedy pen':>11} " + " ".join(f"{'beam' + str(b) + ' pen':>11} {'(s)':>6}" for b in beam_widths))
+    for n in sizes:
+        df = _synthetic_step4_roster(n, placed_ratio, seed + n)
+        random.seed(seed)
+        t_greedy, (_, pen_greedy) = _timed(step5_place_remaining_students, df, "ΒΗΜΑ4_ΣΕΝΑΡΙΟ_1")
+        row = {"students": n, "greedy_s": t_greedy, "greedy_penalty": pen_greedy}
+        cells = []
+        for b in beam_widths:
+            random.seed(seed)
+            dt, (_, pen) = _timed(step5_place_remaining_students, df, "ΒΗΜΑ4_ΣΕΝΑΡΙΟ_1",
+                                  mode="beam", beam_width=b)
+            row[f"beam{b}_s"], row[f"beam{b}_penalty"] = dt, pen
+            cells.append(f"{pen:>11} {dt:>6.2f}")
+        rows.append(row)
+        print(f"{n:>9} {pen_greedy:>11} " + " ".join(cells))
+    return rows
+
+
+# ------------------------- CLI -------------------------
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmarks της ροής κατανομής μαθητών.")
+    sub = parser.add_subparsers(dest="bench", required=True)
+
+    p1 = sub.add_parser("step1", help="Βήμα 1: exhaustive vs partition vs branch-and-bound")
+    p1.add_argument("--min-kids", type=int, default=8)
+    p1.add_argument("--max-kids", type=int, default=20)
+    p1.add_argument("--num-classes", type=int, default=2)
+    p1.add_argument("--legacy-max-kids", type=int, default=16)
+    p1.add_argument("--partition-max-kids", type=int, default=20)
+
+    p1a = sub.add_parser("step1-apply", help="Βήμα 1: εγγραφή στηλών ΒΗΜΑ1_ΣΕΝΑΡΙΟ_k")
+    p1a.add_argument("--students", type=int, default=1000)
+    p1a.add_argument("--kids", type=int, default=100)
+    p1a.add_argument("--scenarios", type=int, default=5)
+    p1a.add_argument("--num-classes", type=int, default=40)
+
+    p3 = sub.add_parser("step3", help="Βήμα 3: greedy vs matching τοποθέτηση δυάδων")
+    p3.add_argument("--students", type=int, nargs="+", default=[100, 500, 2000])
+    p3.add_argument("--placed-ratio", type=float, default=0.8)
+
+    p4 = sub.add_parser("step4-fill", help="Βήμα 4: βάση ΒΗΜΑ1–3 και εγγραφή στηλών ΒΗΜΑ4")
+    p4.add_argument("--students", type=int, default=1000)
+    p4.add_argument("--scenarios", type=int, default=5)
+
+    p5 = sub.add_parser("step5", help="Βήμα 5: τοποθέτηση υπολοίπων μαθητών")
+    p5.add_argument("--students", type=int, default=1500)
+    p5.add_argument("--placed-ratio", type=float, default=0.6)
+
+    p5b = sub.add_parser("step5-beam", help="Βήμα 5: greedy vs beam search")
+    p5b.add_argument("--students", type=int, nargs="+", default=[300, 1500])
+    p5b.add_argument("--beam-widths", type=int, nargs="+", default=[1, 8, 32])
+    p5b.add_argument("--placed-ratio", type=float, default=0.6)
+
+    args = parser.parse_args()
+    if args.bench == "step5-beam":
+        bench_step5_beam(args.students, args.beam_widths, placed_ratio=args.placed_ratio)
+    elif args.bench == "step5":
+        bench_step5(args.students, placed_ratio=args.placed_ratio)
+    elif args.bench == "step4-fill":
+        bench_step4_fill(args.students, args.scenarios)
+    elif args.bench == "step3":
+        bench_step3(args.students, placed_ratio=args.placed_ratio)
+    elif args.bench == "step1-apply":
+        bench_step1_apply(args.students, n_kids=args.kids, n_scenarios=args.scenarios,
+                          num_classes=args.num_classes)
+    elif args.bench == "step1":
+        bench_step1_generation(range(args.min_kids, args.max_kids + 1),
+                               num_classes=args.num_classes,
+                               legacy_max_kids=args.legacy_max_kids,
+                               partition_max_kids=args.partition_max_kids)
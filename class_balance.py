@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+"""
+class_balance.py
+----------------
+Κοινός, διανυσματικός υπολογισμός πληθών ανά τμήμα για τα penalty scores (Βήματα 3 και 5).
+
+• Οι σημαίες (αγόρι / κορίτσι / καλή γνώση ελληνικών) κανονικοποιούνται μία φορά σε
+  boolean στήλες και όλα τα πλήθη ανά τμήμα βγαίνουν με ΕΝΑ groupby, αντί για μάσκα
+  ολόκληρης στήλης ανά τμήμα και ανά κριτήριο.
+• spread_penalty: +1 για κάθε μονάδα διαφοράς (max − min) πάνω από το επιτρεπτό.
+
+Σημασιολογία ίδια με τους παλιούς βρόχους: τμήμα = γραμμές με df[scenario_col] == label,
+φύλο = str(ΦΥΛΟ).upper() ∈ {"Α", "Κ"}, τμήματα χωρίς μαθητές μετρούν με 0.
+"""
+from typing import Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+TALLY_COLUMNS = ("total", "boys", "girls", "good")
+
+
+def class_tallies(df: pd.DataFrame, scenario_col: str, labels: Sequence[str],
+                  good: Optional[Sequence[bool]] = None) -> pd.DataFrame:
+    """
+    Πίνακας labels × (total, boys, girls, good) για τη στήλη σεναρίου.
+
+    good: προαιρετική boolean σημαία ανά γραμμή (π.χ. καλή γνώση ελληνικών)· αλλιώς 0.
+    """
+    labels = list(labels)
+    gender = df["ΦΥΛΟ"].astype(str).str.upper()
+    flags = pd.DataFrame({
+        "total": np.ones(len(df), dtype=np.int64),
+        "boys": (gender == "Α").to_numpy(dtype=np.int64),
+        "girls": (gender == "Κ").to_numpy(dtype=np.int64),
+        "good": (np.zeros(len(df), dtype=np.int64) if good is None
+                 else np.asarray(good, dtype=bool).astype(np.int64)),
+    })
+    key = df[scenario_col].to_numpy(dtype=object)
+    in_labels = pd.Series(key, dtype=object).isin(labels).to_numpy()
+    counts = flags[in_labels].groupby(key[in_labels]).sum()
+    return counts.reindex(labels, fill_value=0).reindex(columns=list(TALLY_COLUMNS)).astype(np.int64)
+
+
+def spread_penalty(counts: Sequence[int], allowed: int) -> int:
+    """+1 για κάθε μονάδα της διαφοράς max − min πάνω από allowed (0 για κενή λίστα)."""
+    values = np.asarray(counts, dtype=np.int64)
+    if values.size == 0:
+        return 0
+    return int(max(0, int(values.max() - values.min()) - allowed))
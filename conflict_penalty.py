@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+"""
+conflict_penalty.py
+-------------------
+Κοινή δομή παιδαγωγικών συγκρούσεων (ΖΩΗΡΟΣ / ΙΔΙΑΙΤΕΡΟΤΗΤΑ) για τα Βήματα 2 και 8.
+
+Ποινή ανά ζεύγος μαθητών στο ίδιο τμήμα:
+  • Ι–Ι  = 5   (όπου «Ι» = έχει ιδιαιτερότητα, με ή χωρίς ζωηρότητα)
+  • Ι–Ζ  = 4   (ο ένας ιδιαιτερότητα, ο άλλος μόνο ζωηρός)
+  • Ζ–Ζ  = 3   (και οι δύο μόνο ζωηροί)
+
+Αντί για O(n²) ζεύγη ανά τμήμα, η ποινή ενός τμήματος προκύπτει σε κλειστή μορφή από
+τα πλήθη του: nZ (μόνο Ζ), nI (μόνο Ι), nZI (Ζ+Ι). Η μετακίνηση ενός μαθητή αλλάζει
+μόνο δύο τμήματα και υπολογίζεται σε O(1).
+"""
+from typing import Dict, Hashable, List, Optional, Sequence
+
+import numpy as np
+
+# Κωδικοί είδους μαθητή
+KIND_NONE, KIND_Z, KIND_I, KIND_ZI = 0, 1, 2, 3
+
+
+def pair_conflict_penalty(aZ, aI, bZ, bI) -> int:
+    """Ποινή παιδαγωγικής σύγκρουσης ανά ζεύγος."""
+    if aI and bI: return 5
+    if (aI and bZ) or (bI and aZ): return 4
+    if aZ and bZ: return 3
+    return 0
+
+
+def class_conflict_sum(nZ: int, nI: int, nZI: int) -> int:
+    """Συνολική ποινή ενός τμήματος από τα πλήθη του (κλειστή μορφή του αθροίσματος ζευγών)."""
+    i_any = nI + nZI
+    return 5 * (i_any * (i_any - 1) // 2) + 4 * nZ * i_any + 3 * (nZ * (nZ - 1) // 2)
+
+
+def class_conflict_pairs(nZ: int, nI: int, nZI: int) -> int:
+    """Πλήθος ζευγών με ποινή > 0 σε ένα τμήμα (κάθε ζεύγος σημασμένων μαθητών)."""
+    flagged = nZ + nI + nZI
+    return flagged * (flagged - 1) // 2
+
+
+def conflict_kinds(z_flags: Sequence[bool], i_flags: Sequence[bool]) -> np.ndarray:
+    """Κωδικός είδους ανά μαθητή: 0 = τίποτα, 1 = μόνο Ζ, 2 = μόνο Ι, 3 = Ζ+Ι."""
+    return np.asarray(z_flags, dtype=np.int64) + 2 * np.asarray(i_flags, dtype=np.int64)
+
+
+class ConflictCounts:
+    """
+    Πλήθη (nZ, nI, nZI) ανά τμήμα για ένα ρόστερ.
+
+    kinds: κωδικός είδους ανά μαθητή (βλ. conflict_kinds)
+    labels: τμήμα ανά μαθητή (None = μη τοποθετημένος)
+    Οι μαθητές αναφέρονται με τη θέση τους (0..n-1).
+    """
+
+    def __init__(self, kinds: Sequence[int], labels: Sequence[Optional[Hashable]]):
+        self.kinds: List[int] = [int(k) for k in kinds]
+        self.labels: List[Optional[Hashable]] = list(labels)
+        self.counts: Dict[Hashable, List[int]] = {}
+        for kind, lab in zip(self.kinds, self.labels):
+            if lab is not None:
+                self.counts.setdefault(lab, [0, 0, 0, 0])[kind] += 1
+
+    @staticmethod
+    def _sum(c: Sequence[int]) -> int:
+        return class_conflict_sum(c[KIND_Z], c[KIND_I], c[KIND_ZI])
+
+    def class_sum(self, label: Hashable) -> int:
+        return self._sum(self.counts.get(label, [0, 0, 0, 0]))
+
+    def total(self) -> int:
+        """Συνολική ποινή συγκρούσεων όλων των τμημάτων."""
+        return sum(self.class_sum(lab) for lab in self.counts)
+
+    def move_delta(self, idx: int, new_label: Optional[Hashable]) -> int:
+        """Μεταβολή της συνολικής ποινής αν ο μαθητής idx μετακινηθεί στο new_label (O(1))."""
+        old_label, kind = self.labels[idx], self.kinds[idx]
+        if old_label == new_label or kind == KIND_NONE:
+            return 0
+        delta = 0
+        if old_label is not None:
+            c = self.counts[old_label]
+            after = list(c)
+            after[kind] -= 1
+            delta += self._sum(after) - self._sum(c)
+        if new_label is not None:
+            c = self.counts.get(new_label, [0, 0, 0, 0])
+            after = list(c)
+            after[kind] += 1
+            delta += self._sum(after) - self._sum(c)
+        return delta
+
+    def move(self, idx: int, new_label: Optional[Hashable]) -> int:
+        """Μετακινεί τον μαθητή idx (ενημερώνει τα πλήθη επιτόπου) και επιστρέφει τη μεταβολή της ποινής."""
+        delta = self.move_delta(idx, new_label)
+        old_label, kind = self.labels[idx], self.kinds[idx]
+        if old_label is not None:
+            self.counts[old_label][kind] -= 1
+        if new_label is not None:
+            self.counts.setdefault(new_label, [0, 0, 0, 0])[kind] += 1
+        self.labels[idx] = new_label
+        return delta
@@ -37,7 +37,9 @@ def _dedup(df: pd.DataFrame) -> pd.DataFrame:
 def build_step1_6_per_scenario(input_excel: str, output_excel: str, pick_step4: str = "best") -> None:
     root = Path(__file__).parent
     
-    # Import όλων των modules
+    # Import όλων των modules (πρώτα το κοινό parse cache, ώστε να το μοιράζονται όλα τα βήματα)
+    m_cache = _import("parse_cache", root / "parse_cache.py")
+    m_cache.PARSE_CACHE.reset_stats()
     m_step1 = _import("step1_immutable_ALLINONE", root / "step1_immutable_ALLINONE.py")
     m_help2 = _import("step_2_helpers_FIXED", root / "step_2_helpers_FIXED.py")
     m_step2 = _import("step_2_zoiroi_idiaterotites_FIXED_v3_PATCHED", root / "step_2_zoiroi_idiaterotites_FIXED_v3_PATCHED.py")
@@ -119,60 +121,28 @@ def build_step1_6_per_scenario(input_excel: str, output_excel: str, pick_step4:
                 except Exception:
                     pass
 
-            # STEP 4
+            # STEP 4 (δομημένο αποτέλεσμα· από το DataFrame γράφεται μόνο η στήλη που κρατάμε)
             res4 = m_step4.apply_step4_with_enhanced_strategy(
-                df3.copy(), assigned_column=s3col, num_classes=None, max_results=5
+                df3.copy(), assigned_column=s3col, num_classes=None, max_results=5, return_results=True
             )
-            
+
             s4final = f"ΒΗΜΑ4_ΣΕΝΑΡΙΟ_{sid}"
-            if (res4 is not None) and not (isinstance(res4, pd.DataFrame) and res4.empty):
-                # If step4 returns a DataFrame (new API), use it directly; else expect legacy list-of-(df,penalty)
-                if isinstance(res4, pd.DataFrame):
-                    df4_mat = res4
-                    # Decide the source Step4 column
-                    if str(pick_step4).lower() == "best":
-                        try:
-                            _k, best_col = m_step4._pick_best_step4_col(df4_mat) if hasattr(m_step4, "_pick_best_step4_col") else (None, None)
-                        except Exception:
-                            best_col = None
-                        # fallback: first ΒΗΜΑ4_ΣΕΝΑΡΙΟ_k
-                        if best_col is None or best_col not in df4_mat.columns:
-                            cands4 = [c for c in df4_mat.columns if str(c).startswith("ΒΗΜΑ4_ΣΕΝΑΡΙΟ_")]
-                            best_col = cands4[0] if cands4 else None
-                        src = best_col if best_col else None
-                    else:
-                        try:
-                            idx_pick = max(1, min(int(pick_step4), 99))
-                        except Exception:
-                            idx_pick = 1
-                        src = f"ΒΗΜΑ4_ΣΕΝΑΡΙΟ_{idx_pick}"
-                else:
-                    # Legacy behavior: res4 is iterable of scenarios with penalties
-                    df4_mat = m_step4.export_step4_scenarios(df3.copy(), res4, assigned_column=s3col)
-                    if str(pick_step4).lower() == "best":
-                        penalties = [p for (_, p) in res4]
-                        best_idx = int(min(range(len(penalties)), key=lambda i: penalties[i]))
-                        src = f"ΒΗΜΑ4_ΣΕΝΑΡΙΟ_{best_idx+1}"
-                    else:
-                        try:
-                            idx_pick = max(1, min(int(pick_step4), len(res4)))
-                        except Exception:
-                            idx_pick = 1
-                        src = f"ΒΗΜΑ4_ΣΕΝΑΡΙΟ_{idx_pick}"
-                # Build df4 using the chosen src
-                cands4 = [c for c in df4_mat.columns if str(c).startswith("ΒΗΜΑ4_")]
-                if src and (src in df4_mat.columns):
-                    df4 = df4_mat.rename(columns={src: s4final})
-                elif cands4:
-                    df4 = df4_mat.rename(columns={cands4[0]: s4final})
-                else:
-                    # 🚑 SAFETY FALLBACK:
-                    # If Step 4 didn't produce any usable column (no ΒΗΜΑ4_* and no 'src'),
-                    # create ΒΗΜΑ4_ΣΕΝΑΡΙΟ_{sid} by copying Step 3 assignments (or empty strings if missing).
-                    df4 = df3.copy()
-                    df4[s4final] = df3[s3col] if s3col in df3.columns else ""
+            if str(pick_step4).lower() == "best":
+                sc4 = res4.best()
             else:
-                df4 = df3.copy(); df4[s4final] = ""
+                try:
+                    idx_pick = max(1, min(int(pick_step4), 99))
+                except Exception:
+                    idx_pick = 1
+                sc4 = res4.get_scenario(idx_pick) or (res4.scenarios[0] if res4.scenarios else None)
+            df4 = df3.copy()
+            if sc4 is not None:
+                df4[s4final] = sc4.as_series(df4.index)
+            else:
+                # 🚑 SAFETY FALLBACK:
+                # If Step 4 didn't produce any scenario, create ΒΗΜΑ4_ΣΕΝΑΡΙΟ_{sid}
+                # by copying Step 3 assignments (or empty strings if missing).
+                df4[s4final] = df3[s3col] if s3col in df3.columns else ""
 
             # Βάλε τη ΒΗΜΑ4 δίπλα στη ΒΗΜΑ3
             cols4 = df4.columns.tolist()
@@ -256,6 +226,9 @@ def build_step1_6_per_scenario(input_excel: str, output_excel: str, pick_step4:
             sheet_name = f"ΣΕΝΑΡΙΟ_{sid}"
             out_df.to_excel(w, sheet_name=sheet_name[:31], index=False)
 
+    # Όλα τα βήματα εδώ τρέχουν σειριακά σε αυτή τη διεργασία, άρα η αναφορά τα καλύπτει όλα
+    print("Σειριακή διαδρομή — " + m_cache.PARSE_CACHE.report())
+
 # Aliases για συμβατότητα
 build_step1_4_per_scenario = build_step1_6_per_scenario
 build_step1_5_per_scenario = build_step1_6_per_scenario
@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+"""
+friend_graph.py
+---------------
+FriendGraph: γράφος αμοιβαίων φιλιών που χτίζεται ΜΙΑ φορά ανά ρόστερ.
+
+• Κάθε ΟΝΟΜΑ (πρώτη εμφάνιση) παίρνει ακέραιο δείκτη
+• Η στήλη ΦΙΛΟΙ αναλύεται μία φορά ανά μαθητή (με τον parser του καλούντος)
+• Οι αμοιβαίες ακμές αποθηκεύονται ως σύνολο, ώστε is_mutual να είναι O(1)
+  και τα ερωτήματα σε υποσύνολο ονομάτων (scope) να κοιτούν μόνο γείτονες
+
+Σημασιολογία ίδια με τα are_mutual_friends / are_mutual_pair: η αναζήτηση γίνεται με
+ακριβές str(ΟΝΟΜΑ) (πρώτη γραμμή) και η φιλία ελέγχεται με το stripped όνομα του άλλου.
+"""
+from typing import Callable, Dict, Iterable, List, Set, Tuple
+
+import pandas as pd
+
+
+class FriendGraph:
+    def __init__(self, df: pd.DataFrame, parse: Callable[[object], List[str]],
+                 friends_col: str = "ΦΙΛΟΙ"):
+        raw_names = df["ΟΝΟΜΑ"].astype(str).tolist()
+        cells = df[friends_col].tolist() if friends_col in df.columns else [""] * len(raw_names)
+
+        self.index: Dict[str, int] = {}
+        self.names: List[str] = []
+        self.friends: List[Set[str]] = []
+        for name, cell in zip(raw_names, cells):
+            if name in self.index:
+                continue
+            self.index[name] = len(self.names)
+            self.names.append(name)
+            self.friends.append(set(parse(cell)))
+
+        self._stripped = [n.strip() for n in self.names]
+        by_stripped: Dict[str, List[int]] = {}
+        for u, s in enumerate(self._stripped):
+            by_stripped.setdefault(s, []).append(u)
+
+        # Αμοιβαίες ακμές (u <= v) και λίστες γειτόνων
+        self.edges: Set[Tuple[int, int]] = set()
+        self.neighbours: List[Set[int]] = [set() for _ in self.names]
+        for u, fu in enumerate(self.friends):
+            for t in fu:
+                for v in by_stripped.get(t, ()):
+                    if self._stripped[u] in self.friends[v]:
+                        self.edges.add((min(u, v), max(u, v)))
+                        self.neighbours[u].add(v)
+                        self.neighbours[v].add(u)
+
+    def is_mutual(self, a: str, b: str) -> bool:
+        """Ίδιο αποτέλεσμα με are_mutual_friends(df, a, b), σε O(1)."""
+        u = self.index.get(str(a))
+        v = self.index.get(str(b))
+        if u is None or v is None:
+            return False
+        return (str(b).strip() in self.friends[u]) and (str(a).strip() in self.friends[v])
+
+    def mutual_pairs_within(self, names: Iterable[str]) -> List[Tuple[str, str]]:
+        """Ταξινομημένες δυάδες (a, b), a < b, αμοιβαίων φίλων μέσα στο σύνολο names."""
+        scope = {str(x) for x in names}
+        pairs = []
+        for a in scope:
+            u = self.index.get(a)
+            if u is None:
+                continue
+            for v in self.neighbours[u]:
+                b = self.names[v]
+                if a < b and b in scope and self.is_mutual(a, b):
+                    pairs.append((a, b))
+        return sorted(pairs)
@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+"""
+parse_cache.py
+--------------
+Κοινό memoisation επίπεδο για την ανάλυση κελιών ΦΙΛΟΙ / ΣΥΓΚΡΟΥΣΗ σε όλα τα βήματα.
+
+Κάθε βήμα κρατά τον δικό του parser (ίδια σημασιολογία με πριν) και τον τυλίγει με
+@memoized_parser. Το κλειδί είναι (parser, ακατέργαστη τιμή κελιού). Αποθηκεύονται
+μόνο string τιμές (οι λίστες/NaN περνούν κατευθείαν στον parser), με φραγμένο LRU.
+
+Το PARSE_CACHE ανήκει στη διεργασία: με workers > 1 (ProcessPoolExecutor στα Βήματα 3/4/5)
+κάθε worker έχει το δικό του, και οι μετρητές της γονικής διεργασίας ΔΕΝ περιλαμβάνουν
+τις αναλύσεις των workers. Η αναφορά αφορά μόνο όσα έτρεξαν στην τρέχουσα διεργασία.
+
+    from parse_cache import PARSE_CACHE
+    print(PARSE_CACHE.report())
+"""
+import functools
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Tuple
+
+DEFAULT_MAXSIZE = 8192
+
+
+class ParseCache:
+    """LRU cache (parser, κελί) -> tuple ονομάτων, με μετρητές hit/miss και χρόνο που γλιτώθηκε."""
+
+    def __init__(self, maxsize: int = DEFAULT_MAXSIZE):
+        self.maxsize = maxsize
+        self._data: "OrderedDict[Tuple[str, str], Tuple[Tuple[str, ...], float]]" = OrderedDict()
+        self.reset_stats()
+
+    def reset_stats(self) -> None:
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.saved_s = 0.0
+
+    def clear(self) -> None:
+        self._data.clear()
+        self.reset_stats()
+
+    def get_or_parse(self, parser_key: str, parse: Callable[[Any], List[str]], raw: str) -> List[str]:
+        key = (parser_key, raw)
+        entry = self._data.get(key)
+        if entry is not None:
+            self._data.move_to_end(key)
+            self.hits += 1
+            self.saved_s += entry[1]
+            return list(entry[0])
+
+        t0 = time.perf_counter()
+        value = tuple(parse(raw))
+        cost = time.perf_counter() - t0
+        self.misses += 1
+        self._data[key] = (value, cost)
+        if len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+        return list(value)
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits / total) if total else 0.0,
+            "entries": len(self._data),
+            "evictions": self.evictions,
+            "saved_s": self.saved_s,
+        }
+
+    def report(self) -> str:
+        s = self.stats()
+        return (f"Parse cache (μόνο η τρέχουσα διεργασία): {s['hits']} hits / {s['misses']} misses "
+                f"({s['hit_rate']:.0%}), {s['entries']} entries, {s['evictions']} evictions, "
+                f"~{s['saved_s'] * 1000:.1f} ms parsing γλιτώθηκαν")
+
+
+PARSE_CACHE = ParseCache()
+
+
+def memoized_parser(fn: Callable[[Any], List[str]]) -> Callable[[Any], List[str]]:
+    """Decorator: περνά τα string κελιά από το PARSE_CACHE· τα υπόλοιπα στον parser απευθείας."""
+    parser_key = f"{fn.__module__}.{fn.__qualname__}"
+
+    @functools.wraps(fn)
+    def wrapper(x):
+        if not isinstance(x, str):
+            return fn(x)
+        return PARSE_CACHE.get_or_parse(parser_key, fn, x)
+
+    wrapper.uncached = fn
+    return wrapper
@@ -21,10 +21,11 @@ from pathlib import Path
 """
 
 from dataclasses import dataclass, field
-from typing import Dict, List, Set, Tuple, Optional, FrozenSet
+from typing import Dict, List, Set, Tuple, Optional, FrozenSet, Iterator
 import pandas as pd
 import numpy as np
 import itertools
+import heapq
 import math
 import re
 import ast
@@ -95,12 +96,27 @@ class Step1Results:
         return True
 
 
+GENERATION_MODES = ("bnb", "partition", "exhaustive")
+
+
 class Step1ImmutableProcessor:
-    """Επεξεργαστής που εξασφαλίζει immutability του Βήματος 1"""
+    """Επεξεργαστής που εξασφαλίζει immutability του Βήματος 1
+
+    generation_mode:
+      • "bnb"        (default): branch-and-bound για τα top-5 σενάρια ως προς σπασμένες
+        φιλίες, με μνήμη O(5) αντί για όλα τα έγκυρα σενάρια
+      • "partition": κατασκευή διαμερίσεων τμήμα-τμήμα με τον κανόνα ≤1
+        και σπάσιμο συμμετρίας ετικετών κατά την παραγωγή
+      • "exhaustive": η παλιά απαρίθμηση itertools.product (για σύγκριση)
+    Και οι τρεις επιστρέφουν τα ίδια σενάρια.
+    """
     
-    def __init__(self):
+    def __init__(self, generation_mode: str = "bnb"):
+        if generation_mode not in GENERATION_MODES:
+            raise ValueError(f"Άγνωστο generation_mode: {generation_mode} (επιτρέπονται: {GENERATION_MODES})")
         self._results: Optional[Step1Results] = None
         self._is_locked: bool = False
+        self.generation_mode = generation_mode
     
     def create_scenarios(self, df: pd.DataFrame, num_classes: Optional[int] = None) -> Step1Results:
         """Δημιουργία immutable σεναρίων"""
@@ -155,16 +171,27 @@ class Step1ImmutableProcessor:
         
         result_df = df.copy()
         
-        # Προσθήκη στηλών ΒΗΜΑ1_ΣΕΝΑΡΙΟ_X
+        # Δείκτης ΟΝΟΜΑ -> θέσεις γραμμών (μία φορά για όλα τα σενάρια)
+        row_positions: Dict[str, List[int]] = {}
+        for pos, name in enumerate(result_df["ΟΝΟΜΑ"].tolist()):
+            row_positions.setdefault(name, []).append(pos)
+        
+        # Συμπαγής categorical τύπος: "" (κενό) + ετικέτες τμημάτων
+        labels_dtype = pd.CategoricalDtype(
+            [""] + [f"Α{i+1}" for i in range(self._results.num_classes)]
+        )
+        
+        # Προσθήκη στηλών ΒΗΜΑ1_ΣΕΝΑΡΙΟ_X: μία ανάθεση στήλης ανά σενάριο
         for scenario in self._results.scenarios:
-            col_name = scenario.column_name
-            result_df[col_name] = ""  # Αρχικοποίηση με κενές τιμές
+            values = np.full(len(result_df), "", dtype=object)  # Αρχικοποίηση με κενές τιμές
             
             # Συμπλήρωση μόνο για παιδιά εκπαιδευτικών
             for student_name, class_assigned in scenario.assignments.items():
-                mask = result_df["ΟΝΟΜΑ"] == student_name
-                if mask.any():
-                    result_df.loc[mask, col_name] = class_assigned
+                positions = row_positions.get(student_name)
+                if positions:
+                    values[positions] = class_assigned
+            
+            result_df[scenario.column_name] = pd.Categorical(values, dtype=labels_dtype)
         
         # ΚΛΕΙΔΩΜΑ - μετά από αυτό δεν επιτρέπονται αλλαγές
         self._is_locked = True
@@ -225,10 +252,19 @@ class Step1ImmutableProcessor:
         
         return result
     
+    _YES_TOKENS = frozenset({"Ν", "ΝΑΙ", "YES", "TRUE", "1", "Y"})
+    
     def _norm_yesno(self, val) -> str:
         """Κανονικοποίηση Ν/Ο τιμών"""
         s = str(val).strip().upper()
-        return "Ν" if s in {"Ν", "ΝΑΙ", "YES", "TRUE", "1", "Y"} else "Ο"
+        return "Ν" if s in self._YES_TOKENS else "Ο"
+    
+    def _yes_matrix(self, block: pd.DataFrame) -> np.ndarray:
+        """Ολόκληρο μπλοκ Ν/Ο → boolean πίνακας σε ένα πέρασμα (ίδιοι κανόνες με `_norm_yesno`)"""
+        if block.size == 0:
+            return np.zeros(block.shape, dtype=bool)
+        values = np.char.upper(np.char.strip(block.to_numpy(dtype=object).astype(str)))
+        return np.isin(values, list(self._YES_TOKENS))
     
     def _get_teacher_kids(self, df: pd.DataFrame) -> List[str]:
         """Εντοπισμός παιδιών εκπαιδευτικών"""
@@ -249,67 +285,76 @@ class Step1ImmutableProcessor:
     
     def _extract_friendships(self, df: pd.DataFrame, teacher_kids: List[str]) -> FrozenSet[Tuple[str, str]]:
         """Εξαγωγή αμοιβαίων φιλιών μεταξύ παιδιών εκπαιδευτικών"""
-        teacher_kids_set = set(teacher_kids)
-        student_friends = {}
+        kid_names = list(dict.fromkeys(teacher_kids))
+        kid_index = {name: i for i, name in enumerate(kid_names)}
+        # adjacency[i, j] = True αν το παιδί i δήλωσε φίλο το παιδί j
+        adjacency = np.zeros((len(kid_names), len(kid_names)), dtype=bool)
         
         # ΜΕΘΟΔΟΣ 1: Matrix-style (στήλες με ονόματα)
         friendship_cols = self._find_friendship_columns(df)
         if friendship_cols:
             print(f"Εντοπίστηκαν {len(friendship_cols)} στήλες φιλιών (matrix-style)")
-            
-            for col in friendship_cols:
-                friend_name = str(col).strip()
-                if friend_name in teacher_kids_set:
-                    # Βρες ποια παιδιά εκπαιδευτικών έχουν γράψει το friend_name ως φίλο
-                    friend_mask = (df["ΟΝΟΜΑ"].isin(teacher_kids)) & (df[col].map(self._norm_yesno) == "Ν")
-                    students_who_wrote_this_friend = df[friend_mask]["ΟΝΟΜΑ"].tolist()
-                    
-                    for student in students_who_wrote_this_friend:
-                        if student != friend_name:  # Όχι φιλία με τον εαυτό του
-                            if student not in student_friends:
-                                student_friends[student] = set()
-                            student_friends[student].add(friend_name)
+            self._fill_adjacency_from_matrix(df, friendship_cols, kid_index, adjacency)
         
         # ΜΕΘΟΔΟΣ 2: Single-column ΦΙΛΟΙ (fallback)
         elif "ΦΙΛΟΙ" in df.columns:
             print("Χρήση στήλης ΦΙΛΟΙ (single-column)")
-            
-            for _, row in df.iterrows():
-                student_name = str(row["ΟΝΟΜΑ"]).strip()
-                if student_name in teacher_kids_set:
-                    friends_str = str(row["ΦΙΛΟΙ"]).strip()
-                    if friends_str and friends_str.lower() not in ["", "nan", "none"]:
-                        # Split με διάφορα separators
-                        friends_list = []
-                        for sep in [",", ";", "|"]:
-                            if sep in friends_str:
-                                friends_list = [f.strip() for f in friends_str.split(sep)]
-                                break
-                        else:
-                            friends_list = [friends_str.strip()]  # Single friend
-                        
-                        # Φιλτράρισμα μόνο παιδιών εκπαιδευτικών
-                        valid_friends = [f for f in friends_list if f in teacher_kids_set and f != student_name]
-                        
-                        if valid_friends:
-                            student_friends[student_name] = set(valid_friends)
+            self._fill_adjacency_from_list_column(df, kid_index, adjacency)
         
         else:
             print("Δεν βρέθηκαν στήλες φιλιών")
         
-        # Έλεγχος αμοιβαιότητας: A→B ΚΑΙ B→A
-        friendships = set()
-        for student_a in student_friends:
-            friends_of_a = student_friends[student_a]
-            for student_b in friends_of_a:
-                if student_b in student_friends and student_a in student_friends[student_b]:
-                    # Αμοιβαία φιλία βρέθηκε - προσθήκη με sorted order
-                    pair = tuple(sorted([student_a, student_b]))
-                    friendships.add(pair)
+        # Όχι φιλία με τον εαυτό του· αμοιβαιότητα A→B ΚΑΙ B→A = A & A.T
+        np.fill_diagonal(adjacency, False)
+        mutual = np.triu(adjacency & adjacency.T, k=1)
+        friendships = {
+            tuple(sorted((kid_names[i], kid_names[j])))
+            for i, j in zip(*np.nonzero(mutual))
+        }
         
         print(f"Βρέθηκαν {len(friendships)} αμοιβαίες φιλίες μεταξύ παιδιών εκπαιδευτικών")
         return frozenset(friendships)
     
+    def _fill_adjacency_from_matrix(self, df: pd.DataFrame, friendship_cols: List[str],
+                                    kid_index: Dict[str, int], adjacency: np.ndarray) -> None:
+        """Matrix-style: κανονικοποίηση ΟΛΟΥ του μπλοκ παιδιά εκπ. × στήλες παιδιών εκπ. μία φορά"""
+        cols = [col for col in friendship_cols if str(col).strip() in kid_index]
+        row_mask = df["ΟΝΟΜΑ"].isin(list(kid_index))
+        if not cols or not row_mask.any():
+            return
+        
+        yes = self._yes_matrix(df.loc[row_mask, cols])
+        row_idx = np.array([kid_index[name] for name in df.loc[row_mask, "ΟΝΟΜΑ"]])
+        col_idx = np.array([kid_index[str(col).strip()] for col in cols])
+        # OR ώστε διπλές γραμμές/στήλες με ίδιο όνομα να ενώνονται (όπως πριν)
+        np.logical_or.at(adjacency, (row_idx[:, None], col_idx[None, :]), yes)
+    
+    def _fill_adjacency_from_list_column(self, df: pd.DataFrame, kid_index: Dict[str, int],
+                                         adjacency: np.ndarray) -> None:
+        """Single-column ΦΙΛΟΙ: μόνο οι γραμμές παιδιών εκπαιδευτικών, χωρίς iterrows"""
+        names = df["ΟΝΟΜΑ"].astype(str).str.strip()
+        row_mask = names.isin(list(kid_index))
+        cells = df.loc[row_mask, "ΦΙΛΟΙ"].astype(str).str.strip()
+        
+        for student_name, friends_str in zip(names[row_mask], cells):
+            if not friends_str or friends_str.lower() in ["", "nan", "none"]:
+                continue
+            # Split με διάφορα separators
+            for sep in [",", ";", "|"]:
+                if sep in friends_str:
+                    friends_list = [f.strip() for f in friends_str.split(sep)]
+                    break
+            else:
+                friends_list = [friends_str.strip()]  # Single friend
+            
+            # Φιλτράρισμα μόνο παιδιών εκπαιδευτικών
+            valid_friends = [kid_index[f] for f in friends_list if f in kid_index and f != student_name]
+            if valid_friends:
+                # Τελευταία γραμμή κερδίζει για διπλό όνομα (όπως πριν)
+                row = adjacency[kid_index[student_name]]
+                row[:] = False
+                row[valid_friends] = True
+    
     def _count_broken_friendships(self, teacher_kids: List[str], assign_map: Dict[str, str], 
                                friendships: FrozenSet[Tuple[str, str]]) -> int:
         """Μέτρηση σπασμένων φιλιών σε ένα σενάριο κατανομής"""
@@ -366,16 +411,11 @@ class Step1ImmutableProcessor:
         
         return scenarios
     
-    def _exhaustive_generation(self, teacher_kids: List[str], num_classes: int, 
-                             friendships: FrozenSet[Tuple[str, str]]) -> List[Tuple[Dict[str, str], int]]:
-        """Εξαντλητική παραγωγή σεναρίων"""
+    def _product_assignments(self, teacher_kids: List[str], num_classes: int) -> Iterator[Dict[str, str]]:
+        """Παλιά εξαντλητική απαρίθμηση: όλα τα num_classes ** n, φιλτράρισμα εκ των υστέρων"""
         class_labels_list = [f"Α{i+1}" for i in range(num_classes)]
-        valid_scenarios = []
         seen_canonical = set()
         
-        print(f"Παραγωγή σεναρίων για {len(teacher_kids)} παιδιά σε {num_classes} τμήματα...")
-        
-        # Εξαντλητική παραγωγή
         total_combinations = num_classes ** len(teacher_kids)
         print(f"Συνολικές περιπτώσεις: {total_combinations:,}")
         
@@ -402,6 +442,163 @@ class Step1ImmutableProcessor:
                 continue
             seen_canonical.add(canon_key)
             
+            yield assign_map
+    
+    def _balanced_partitions(self, teacher_kids: List[str], num_classes: int) -> Iterator[Dict[str, str]]:
+        """
+        Ισόρροπες διαμερίσεις (≤1) χωρίς διπλότυπα ετικετών.
+        
+        Το παιδί i μπαίνει σε ήδη ανοιχτό τμήμα ή στο αμέσως επόμενο κενό
+        (restricted growth), οπότε κάθε διαμέριση παράγεται ΜΙΑ φορά, με τις ετικέτες
+        και τη σειρά που θα κρατούσε το `_canonical_key` στην εξαντλητική απαρίθμηση.
+        Κλαδιά που δεν μπορούν να καταλήξουν σε μεγέθη q ή q+1 κόβονται αμέσως.
+        """
+        class_labels_list = [f"Α{i+1}" for i in range(num_classes)]
+        n = len(teacher_kids)
+        q, r = divmod(n, num_classes)
+        sizes = [0] * num_classes
+        slots = [0] * n
+        
+        print(f"Κατασκευή ισόρροπων διαμερίσεων: μεγέθη {q}/{q + 1} ({r} τμήματα με {q + 1})")
+        
+        def build(i: int, opened: int, n_full: int, deficit: int) -> Iterator[Dict[str, str]]:
+            if i == n:
+                if opened > 1:  # ΕΛΕΓΧΟΣ 2: Όχι όλα στο ίδιο τμήμα
+                    yield {teacher_kids[j]: class_labels_list[slots[j]] for j in range(n)}
+                return
+            left_after = n - i - 1
+            for c in range(min(opened + 1, num_classes)):
+                new_size = sizes[c] + 1
+                if new_size > q + 1:
+                    continue
+                new_full = n_full + (new_size == q + 1)
+                if new_full > r:
+                    continue
+                # Τα τμήματα κάτω από q πρέπει να μπορούν να γεμίσουν με όσους απομένουν
+                new_deficit = deficit - (sizes[c] < q)
+                if new_deficit > left_after:
+                    continue
+                sizes[c] = new_size
+                slots[i] = c
+                yield from build(i + 1, max(opened, c + 1), new_full, new_deficit)
+                sizes[c] -= 1
+        
+        yield from build(0, 0, 0, num_classes * q)
+    
+    def _best_k_search(self, teacher_kids: List[str], num_classes: int,
+                       friendships: FrozenSet[Tuple[str, str]], k: int = 5) -> List[Tuple[Dict[str, str], int]]:
+        """
+        Branch-and-bound πάνω στις ισόρροπες διαμερίσεις του `_balanced_partitions`.
+        
+        Κρατά heap με τα k καλύτερα (broken, σειρά παραγωγής) και κόβει κάθε μερική
+        ανάθεση της οποίας το κάτω φράγμα σπασμένων φιλιών δεν μπορεί να κερδίσει το k-οστό.
+        Φράγμα = ήδη σπασμένες + για κάθε ατοποθέτητο παιδί u: (τοποθετημένοι φίλοι του u)
+        − (οι περισσότεροι από αυτούς σε ένα τμήμα). Η σειρά παραγωγής μένει λεξικογραφική,
+        άρα οι ισοβαθμίες λύνονται όπως στην εξαντλητική παραγωγή.
+        """
+        class_labels_list = [f"Α{i+1}" for i in range(num_classes)]
+        n = len(teacher_kids)
+        q, r = divmod(n, num_classes)
+        pos = {name: i for i, name in enumerate(teacher_kids)}
+        
+        # Φίλοι ανά παιδί χωρισμένοι σε «προηγούμενους» (ήδη τοποθετημένους) και «επόμενους»
+        earlier: List[List[int]] = [[] for _ in range(n)]
+        later: List[List[int]] = [[] for _ in range(n)]
+        for a, b in friendships:
+            if a not in pos or b not in pos or a == b:
+                continue
+            i, j = sorted((pos[a], pos[b]))
+            earlier[j].append(i)
+            later[i].append(j)
+        
+        sizes = [0] * num_classes
+        slots = [0] * n
+        friend_cnt = [[0] * num_classes for _ in range(n)]  # τοποθετημένοι φίλοι του u ανά τμήμα
+        term = [0] * n  # κάτω φράγμα σπασμένων για τις ακμές του u προς τοποθετημένους
+        heap: List[Tuple[int, int, Dict[str, str]]] = []  # max-heap: (-broken, -seq, assign_map)
+        stats = {"seq": 0, "nodes": 0, "pruned": 0}
+        
+        print(f"Branch-and-bound (top-{k}) για {n} παιδιά, {len(friendships)} αμοιβαίες φιλίες")
+        
+        def build(i: int, opened: int, n_full: int, deficit: int, broken: int, pending: int) -> None:
+            stats["nodes"] += 1
+            if len(heap) == k and broken + pending >= -heap[0][0]:
+                stats["pruned"] += 1
+                return
+            if i == n:
+                if opened > 1:  # ΕΛΕΓΧΟΣ 2: Όχι όλα στο ίδιο τμήμα
+                    stats["seq"] += 1
+                    item = (-broken, -stats["seq"],
+                            {teacher_kids[j]: class_labels_list[slots[j]] for j in range(n)})
+                    if len(heap) < k:
+                        heapq.heappush(heap, item)
+                    else:
+                        heapq.heapreplace(heap, item)
+                return
+            left_after = n - i - 1
+            for c in range(min(opened + 1, num_classes)):
+                new_size = sizes[c] + 1
+                if new_size > q + 1:
+                    continue
+                new_full = n_full + (new_size == q + 1)
+                if new_full > r:
+                    continue
+                new_deficit = deficit - (sizes[c] < q)
+                if new_deficit > left_after:
+                    continue
+                
+                sizes[c] = new_size
+                slots[i] = c
+                new_broken = broken + len(earlier[i]) - friend_cnt[i][c]
+                new_pending = pending - term[i]
+                saved_terms = []
+                for u in later[i]:
+                    saved_terms.append(term[u])
+                    friend_cnt[u][c] += 1
+                    placed = sum(friend_cnt[u])
+                    new_term = placed - max(friend_cnt[u])
+                    new_pending += new_term - term[u]
+                    term[u] = new_term
+                
+                build(i + 1, max(opened, c + 1), new_full, new_deficit, new_broken, new_pending)
+                
+                for u, old_term in zip(later[i], saved_terms):
+                    friend_cnt[u][c] -= 1
+                    term[u] = old_term
+                sizes[c] -= 1
+        
+        build(0, 0, 0, num_classes * q, 0, 0)
+        print(f"Κόμβοι: {stats['nodes']:,} (κλαδέματα: {stats['pruned']:,}), πλήρη σενάρια: {stats['seq']:,}")
+        
+        # Ίδιοι κανόνες με την εξαντλητική: με ≤k έγκυρα σενάρια μένει η σειρά παραγωγής,
+        # αλλιώς σειρά (broken, σειρά παραγωγής) και, αν υπάρχουν σενάρια χωρίς σπασμένες
+        # φιλίες, κρατάμε μόνο αυτά. Κάθε κλάδεμα αφήνει έξω τουλάχιστον ένα έγκυρο σενάριο.
+        if stats["seq"] <= k and not stats["pruned"]:
+            best = sorted(heap, key=lambda t: -t[1])
+        else:
+            best = sorted(heap, key=lambda t: (-t[0], -t[1]))
+            if best[0][0] == 0:
+                best = [t for t in best if t[0] == 0]
+        selected = [(assign_map, -neg_broken) for neg_broken, _, assign_map in best]
+        print(f"Τελική επιλογή: {len(selected)} σενάρια")
+        return selected
+    
+    def _exhaustive_generation(self, teacher_kids: List[str], num_classes: int, 
+                             friendships: FrozenSet[Tuple[str, str]]) -> List[Tuple[Dict[str, str], int]]:
+        """Εξαντλητική παραγωγή σεναρίων"""
+        valid_scenarios = []
+        
+        print(f"Παραγωγή σεναρίων για {len(teacher_kids)} παιδιά σε {num_classes} τμήματα...")
+        
+        if self.generation_mode == "bnb":
+            return self._best_k_search(teacher_kids, num_classes, friendships, k=5)
+        
+        if self.generation_mode == "exhaustive":
+            assignments = self._product_assignments(teacher_kids, num_classes)
+        else:
+            assignments = self._balanced_partitions(teacher_kids, num_classes)
+        
+        for assign_map in assignments:
             # Υπολογισμός σπασμένων φιλιών
             broken_friendships = self._count_broken_friendships(teacher_kids, assign_map, friendships)
             
@@ -433,18 +630,21 @@ class Step1ImmutableProcessor:
 
 # === UTILITY FUNCTIONS ===
 
-def create_immutable_step1(df: pd.DataFrame, num_classes: Optional[int] = None) -> Tuple[pd.DataFrame, Step1Results]:
+def create_immutable_step1(df: pd.DataFrame, num_classes: Optional[int] = None,
+                           generation_mode: str = "bnb") -> Tuple[pd.DataFrame, Step1Results]:
     """
     Δημιουργεί immutable αποτελέσματα βήματος 1.
     
     Args:
         df: Αρχικό DataFrame με δεδομένα μαθητών
         num_classes: Αριθμός τμημάτων (αν None, αυτόματος υπολογισμός)
+        generation_mode: "bnb" (default, branch-and-bound), "partition" ή
+                         "exhaustive" (παλιά απαρίθμηση)· βλ. Step1ImmutableProcessor
     
     Returns:
         (DataFrame με στήλες ΒΗΜΑ1_ΣΕΝΑΡΙΟ_X, Step1Results object)
     """
-    processor = Step1ImmutableProcessor()
+    processor = Step1ImmutableProcessor(generation_mode=generation_mode)
     results = processor.create_scenarios(df, num_classes)
     updated_df = processor.apply_to_dataframe(df)
     
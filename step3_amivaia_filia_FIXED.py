@@ -7,12 +7,14 @@ step3_amivaia_filia_FIXED.py
 - Δεν «σπάει» καμία δυάδα: αν δεν χωράει λόγω ορίου 25, η δυάδα μετρά ως broken και ο ατοποθέτητος παραμένει κενός.
 - Υπολογίζει broken δυάδες & penalty, επιλέγει έως 5 καλύτερα σενάρια.
 """
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
 from typing import List, Tuple, Dict, Optional
 import pandas as pd
 import re
 from pathlib import Path
 from step_3_helpers_FIXED import (
-    parse_friends_string, are_mutual_pair, mutual_dyads,
+    parse_friends_string, roster_dyads,
     count_broken_dyads, calculate_penalty_score_step3, select_best_scenarios
 )
 
@@ -23,19 +25,70 @@ def _auto_num_classes(df, override=None):
     k = max(2, math.ceil(n/25))
     return int(k if override is None else override)
 
-def _class_fits(df: pd.DataFrame, col: str, class_name: str, add: int=1) -> bool:
-    return (df[col]==class_name).sum() + add <= 25
+def _augment_step3_matching(candidates, used_u, rows_of, values, sizes, place) -> None:
+    """
+    Επέκταση του greedy αποτελέσματος σε μέγιστη ανάθεση (augmenting paths, Kuhn).
+    Μετακινούνται μόνο μαθητές του Βήματος 3 με μία γραμμή· κάθε επιτυχημένο path
+    τοποθετεί έναν ακόμη unplaced χωρίς να βγάζει κανέναν.
+    """
+    options: Dict[str, List] = {}
+    for u, _v, cl in candidates:
+        opts = options.setdefault(u, [])
+        if cl not in opts:
+            opts.append(cl)
+    movable = {u for u in options if len(rows_of.get(u, [])) == 1}
+    assigned = {u: values[rows_of[u][0]] for u in used_u if u in movable}
+    members: Dict[object, List[str]] = {}
+    for u, cl in assigned.items():
+        members.setdefault(cl, []).append(u)
+
+    def _move(u: str, cl) -> None:
+        old = assigned.get(u)
+        if old is not None:
+            members[old].remove(u)
+        place(u, cl)
+        assigned[u] = cl
+        members.setdefault(cl, []).append(u)
+
+    def _augment(u: str, seen: set) -> bool:
+        for cl in options[u]:
+            if cl in seen:
+                continue
+            seen.add(cl)
+            if sizes.get(cl, 0) + 1 <= 25:
+                _move(u, cl)
+                return True
+            for w in list(members.get(cl, [])):
+                if _augment(w, seen):
+                    _move(u, cl)
+                    return True
+        return False
+
+    for u in options:
+        if u in movable and u not in used_u and _augment(u, set()):
+            used_u.add(u)
+
+STEP3_MODES = ("greedy", "matching")
 
 def apply_step3_on_sheet(
     df2: pd.DataFrame,
     scenario_col: str,
-    num_classes: Optional[int] = None) -> Tuple[pd.DataFrame, Dict]:
+    num_classes: Optional[int] = None,
+    mode: str = "greedy") -> Tuple[pd.DataFrame, Dict]:
     """
     Παίρνει ένα DataFrame από Βήμα 2 (ένα sheet) και επιστρέφει:
     - df_after: με νέα στήλη ΒΗΜΑ3_ΣΕΝΑΡΙΟ_k (ίδιο όνομα με το sheet αλλά με 'ΒΗΜΑ3')
     - meta: {"broken": int, "penalty": int}
     Κανόνας: τοποθετούμε ΜΟΝΟ δυάδες (u,v) όπου u είναι unplaced, v είναι placed, και είναι αμοιβαία φίλοι.
+
+    mode:
+      • "greedy"   (default): σειρά λιγότερων επιλογών πρώτα, όπως πάντα
+      • "matching": μέγιστη διμερής ανάθεση (unplaced -> τμήμα φίλου) με όριο 25 ανά τμήμα·
+        ξεκινά από το greedy αποτέλεσμα και το επεκτείνει με augmenting paths, άρα
+        τοποθετεί τουλάχιστον όσες δυάδες και το greedy
     """
+    if mode not in STEP3_MODES:
+        raise ValueError(f"Άγνωστο mode: {mode} (επιτρέπονται: {STEP3_MODES})")
     df = df2.copy()
     # νέα στήλη
     new_col = re.sub(r"^ΒΗΜΑ2", "ΒΗΜΑ3", scenario_col)
@@ -45,12 +98,19 @@ def apply_step3_on_sheet(
     # unplaced υποψήφιοι (γενικά όλοι οι κενές αναθέσεις)
     unplaced_names = df[df[new_col].isna()]["ΟΝΟΜΑ"].astype(str).tolist()
 
+    # Δείκτης ΟΝΟΜΑ -> γραμμές (η πρώτη δίνει το κελί ΦΙΛΟΙ) και γράφος αμοιβαίων φιλιών
+    rows_of: Dict[object, List[int]] = {}
+    for pos, name in enumerate(df["ΟΝΟΜΑ"].tolist()):
+        rows_of.setdefault(name, []).append(pos)
+    friend_cells = df["ΦΙΛΟΙ"].tolist()
+    graph, dyads = roster_dyads(df2)
+
     # δώσε προτεραιότητα σε όσους έχουν ΑΚΡΙΒΩΣ 1 αμοιβαίο φίλο (μονοσήμαντες δυάδες)
     def mutual_friends_of(u: str) -> list:
-        cell = df.loc[df["ΟΝΟΜΑ"]==u, "ΦΙΛΟΙ"]
-        friends = parse_friends_string(cell.values[0] if not cell.empty else "")
-        return [v for v in friends if are_mutual_pair(df, u, v)]
-    # κατασκεύασε λίστα (u, v, class_v) για v ήδη placed
+        rows = rows_of.get(u)
+        friends = parse_friends_string(friend_cells[rows[0]] if rows else "")
+        return [v for v in friends if graph.is_mutual(u, v)]
+    # κατασκεύασε λίστα (u, v, class_v) για v ήδη placed — ένα πέρασμα
     candidates = []
     for u in unplaced_names:
         for v in mutual_friends_of(u):
@@ -58,21 +118,44 @@ def apply_step3_on_sheet(
                 candidates.append((u, v, placed[v]))
 
     # Ταξινόμηση: λιγότερες επιλογές πρώτα → μειώνει αδιέξοδα
-    degree = {u: len([1 for x in candidates if x[0]==u]) for u in unplaced_names}
+    degree = Counter(u for u, _, _ in candidates)
     candidates.sort(key=lambda t: (degree.get(t[0], 99), t[2]))
 
+    # Μετρητές μεγέθους ανά τμήμα: έλεγχος χωρητικότητας και τοποθέτηση σε O(1)·
+    # η στήλη γράφεται μία φορά στο τέλος
+    values = df[new_col].tolist()
+    sizes: Dict[object, int] = {}
+    for val in values:
+        if pd.notna(val):
+            sizes[val] = sizes.get(val, 0) + 1
+    changed: Dict[int, object] = {}
+
+    def _place(u: str, cl) -> None:
+        for r in rows_of.get(u, []):
+            if pd.notna(values[r]):
+                sizes[values[r]] -= 1
+            values[r] = cl
+            sizes[cl] = sizes.get(cl, 0) + 1
+            changed[r] = cl
+
     used_u = set()
     for u, v, cl in candidates:
         if u in used_u:
             continue
-        if _class_fits(df, new_col, cl, add=1):
-            df.loc[df["ΟΝΟΜΑ"]==u, new_col] = cl
+        if sizes.get(cl, 0) + 1 <= 25:
+            _place(u, cl)
             used_u.add(u)
             # ενημέρωσε και το placed ώστε αν έχει κι άλλος φίλος τον u, τώρα να θεωρείται placed
             placed[u] = cl
 
+    if mode == "matching":
+        _augment_step3_matching(candidates, used_u, rows_of, values, sizes, _place)
+
+    if changed:
+        df.iloc[list(changed), df.columns.get_loc(new_col)] = list(changed.values())
+
     # Μετρικά
-    broken = count_broken_dyads(df2, df, new_col)
+    broken = count_broken_dyads(df2, df, new_col, pairs=dyads)
     num_classes = _auto_num_classes(df, num_classes)
     penalty = calculate_penalty_score_step3(df, new_col, num_classes)
     meta = {"broken": int(broken), "penalty": int(penalty)}
@@ -119,10 +202,34 @@ def apply_step3_to_dataframe(df_step2: pd.DataFrame, num_classes: Optional[int]
     
     return df_result
 
-def step3_run_all_from_step2(step2_xlsx_path: str, output_xlsx_path: str) -> str:
+def _step3_sheet_task(task: Tuple[pd.DataFrame, str, Optional[int]]) -> Tuple[Dict, pd.Series]:
+    """Worker: (df2, scenario_col, num_classes) -> (meta, νέα στήλη ΒΗΜΑ3). Top-level ώστε να γίνεται pickle."""
+    df2, scenario_col, num_classes = task
+    df3, meta = apply_step3_on_sheet(df2, scenario_col=scenario_col, num_classes=num_classes)
+    return meta, df3[re.sub(r"^ΒΗΜΑ2", "ΒΗΜΑ3", scenario_col)]
+
+def _run_step3_tasks(tasks: List[Tuple[pd.DataFrame, str, Optional[int]]],
+                     workers: Optional[int] = None) -> List[Tuple[Dict, pd.Series]]:
+    """Τρέχει το Βήμα 3 ανά sheet: σειριακά (workers None/1) ή σε process pool, με σταθερή σειρά."""
+    if workers is not None and workers > 1 and len(tasks) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as ex:
+            return list(ex.map(_step3_sheet_task, tasks))
+    return [_step3_sheet_task(t) for t in tasks]
+
+def _materialise_step3(df2: pd.DataFrame, scenario_col: str, col: pd.Series) -> pd.DataFrame:
+    """Ίδιο DataFrame με το apply_step3_on_sheet, από το sheet του Βήματος 2 και τη στήλη ΒΗΜΑ3."""
+    df3 = df2.copy()
+    df3[re.sub(r"^ΒΗΜΑ2", "ΒΗΜΑ3", scenario_col)] = col
+    return df3
+
+def step3_run_all_from_step2(step2_xlsx_path: str, output_xlsx_path: str,
+                             workers: Optional[int] = None) -> str:
     """
     Διαβάζει το workbook του Βήμα 2 και παράγει νέο workbook για το Βήμα 3
     με ένα sheet ανά σενάριο. Επιστρέφει το path του αρχείου.
+
+    Το workbook διαβάζεται μία φορά· κάθε sheet επιστρέφει μόνο meta + τη στήλη ΒΗΜΑ3
+    (workers > 1 → process pool) και πλήρη DataFrames φτιάχνονται μόνο για τα ≤5 επιλεγμένα.
     """
     p = Path(step2_xlsx_path)
     assert p.exists(), f"Δεν βρέθηκε: {p}"
@@ -131,24 +238,22 @@ def step3_run_all_from_step2(step2_xlsx_path: str, output_xlsx_path: str) -> str
     if not s2_sheets:
         raise ValueError("Δεν βρέθηκαν sheets 'ΒΗΜΑ2_ΣΕΝΑΡΙΟ_*' στο αρχείο Βήμα 2.")
 
-    # ΔΙΟΡΘΩΣΗ: Φόρτωση οποιουδήποτε sheet για να πάρουμε το μέγεθος
-    df0 = pd.read_excel(p, sheet_name=s2_sheets[0])
-    N = len(df0)
-    num_classes = _auto_num_classes(df0, None)
+    sheets = pd.read_excel(xls, sheet_name=s2_sheets)
+    # ΔΙΟΡΘΩΣΗ: οποιοδήποτε sheet δίνει το μέγεθος
+    num_classes = _auto_num_classes(sheets[s2_sheets[0]], None)
 
-    results = []
-    for s in s2_sheets:
-        df2 = pd.read_excel(p, sheet_name=s)
-        df3, meta = apply_step3_on_sheet(df2, scenario_col=s, num_classes=num_classes)
-        results.append((re.sub(r"^ΒΗΜΑ2", "ΒΗΜΑ3", s), df3, meta))
+    tasks = [(sheets[s], s, num_classes) for s in s2_sheets]
+    done = _run_step3_tasks(tasks, workers)
+    results = [(re.sub(r"^ΒΗΜΑ2", "ΒΗΜΑ3", s), i, meta) for i, (s, (meta, _)) in enumerate(zip(s2_sheets, done))]
 
-    # Επιλογή έως 5 καλύτερων
+    # Επιλογή έως 5 καλύτερων (μόνο από τα meta)
     selected = select_best_scenarios(results)
 
     # Γράψε αρχείο
     out = Path(output_xlsx_path)
     with pd.ExcelWriter(out, engine="openpyxl") as w:
-        for name, df3, meta in selected:
+        for name, i, meta in selected:
+            df3 = _materialise_step3(tasks[i][0], tasks[i][1], done[i][1])
             df3.to_excel(w, index=False, sheet_name=name[:31])
         # και ένα sheet "Σύνοψη"
         rows = [{"Sheet": name, "Broken_dyads": meta["broken"], "Penalty": meta["penalty"]}
@@ -158,57 +263,46 @@ def step3_run_all_from_step2(step2_xlsx_path: str, output_xlsx_path: str) -> str
     return out.as_posix()
 
 # === EXTRA: FULL exporter that works with "ΣΕΝΑΡΙΟ_*" sheets from Step 2 FULL ===
-def export_step3_nextcol_full(step2_xlsx_path: str, out_xlsx_path: str) -> str:
+def export_step3_nextcol_full(step2_xlsx_path: str, out_xlsx_path: str,
+                              workers: Optional[int] = None) -> str:
     """
     Διαβάζει workbook του Βήματος 2 (FULL: φύλλα τύπου 'ΣΕΝΑΡΙΟ_k' που περιέχουν στήλες ΒΗΜΑ2_ΣΕΝΑΡΙΟ_k)
     και παράγει νέο workbook για το Βήμα 3 κρατώντας ΟΛΕΣ τις αρχικές στήλες.
     - Προσθέτει τη στήλη 'ΒΗΜΑ3_ΣΕΝΑΡΙΟ_k' ακριβώς δεξιά από τη 'ΒΗΜΑ2_ΣΕΝΑΡΙΟ_k' για κάθε σενάριο.
     - Ονόματα φύλλων εξόδου: 'ΒΗΜΑ3_ΣΕΝΑΡΙΟ_k'.
+    - Το workbook διαβάζεται μία φορά· workers > 1 → τα sheets τρέχουν σε process pool.
     """
-    import pandas as pd, re
-    from pathlib import Path
-
     p = Path(step2_xlsx_path)
     assert p.exists(), f"Δεν βρέθηκε: {p}"
-    xls = pd.ExcelFile(p)
 
-    outputs = []
-    for sh in xls.sheet_names:
-        # Δουλεύουμε με κάθε "ΣΕΝΑΡΙΟ_k" sheet
-        df2 = pd.read_excel(p, sheet_name=sh)
-        # βρες τη στήλη ΒΗΜΑ2_ΣΕΝΑΡΙΟ_k
+    # Δουλεύουμε με κάθε "ΣΕΝΑΡΙΟ_k" sheet που έχει στήλη ΒΗΜΑ2_ΣΕΝΑΡΙΟ_k
+    tasks = []
+    for df2 in pd.read_excel(p, sheet_name=None).values():
         s2_cols = [c for c in df2.columns if str(c).strip().upper().startswith("ΒΗΜΑ2_ΣΕΝΑΡΙΟ_")]
-        if not s2_cols:
-            # αν δεν υπάρχει, συνέχισε στο επόμενο sheet
-            continue
-        scenario_col = s2_cols[0]
-        # Εφάρμοσε ΒΗΜΑ 3
-        df3, meta = apply_step3_on_sheet(df2, scenario_col=scenario_col, num_classes=None)
-        # Βάλε τη νέα στήλη δίπλα στη ΒΗΜΑ2
-        new_col = re.sub(r"^ΒΗΜΑ2", "ΒΗΜΑ3", scenario_col)
-        cols = df3.columns.tolist()
-        # μετακίνησε new_col δίπλα στη scenario_col
-        if new_col in cols:
-            cols.remove(new_col)
-        idx = cols.index(scenario_col) + 1 if scenario_col in cols else len(cols)
-        cols = cols[:idx] + [new_col] + cols[idx:]
-        df3 = df3[cols]
-        # sheet name εξόδου
-        sid = re.search(r"ΣΕΝΑΡΙΟ[_\s]*(\d+)", scenario_col)
-        sid = sid.group(1) if sid else "1"
-        out_sheet = f"ΒΗΜΑ3_ΣΕΝΑΡΙΟ_{sid}"
-        outputs.append((out_sheet, df3, meta))
-
-    if not outputs:
+        if s2_cols:
+            tasks.append((df2, s2_cols[0], None))
+
+    if not tasks:
         raise ValueError("Δεν βρέθηκαν στήλες ΒΗΜΑ2_ΣΕΝΑΡΙΟ_* στο αρχείο Βήμα 2.")
 
     out = Path(out_xlsx_path)
+    rows = []
     with pd.ExcelWriter(out, engine="xlsxwriter") as w:
-        for name, df3, meta in outputs:
-            df3.to_excel(w, index=False, sheet_name=name[:31])
+        for (df2, scenario_col, _), (meta, col) in zip(tasks, _run_step3_tasks(tasks, workers)):
+            df3 = _materialise_step3(df2, scenario_col, col)
+            # Βάλε τη νέα στήλη δίπλα στη ΒΗΜΑ2
+            new_col = re.sub(r"^ΒΗΜΑ2", "ΒΗΜΑ3", scenario_col)
+            cols = df3.columns.tolist()
+            if new_col in cols:
+                cols.remove(new_col)
+            idx = cols.index(scenario_col) + 1 if scenario_col in cols else len(cols)
+            cols = cols[:idx] + [new_col] + cols[idx:]
+            # sheet name εξόδου
+            sid = re.search(r"ΣΕΝΑΡΙΟ[_\s]*(\d+)", scenario_col)
+            sid = sid.group(1) if sid else "1"
+            name = f"ΒΗΜΑ3_ΣΕΝΑΡΙΟ_{sid}"
+            df3[cols].to_excel(w, index=False, sheet_name=name[:31])
+            rows.append({"Sheet": name, "Broken_dyads": meta["broken"], "Penalty": meta["penalty"]})
         # Σύνοψη
-        import pandas as pd
-        rows = [{"Sheet": name, "Broken_dyads": meta["broken"], "Penalty": meta["penalty"]}
-                for name, _, meta in outputs]
         pd.DataFrame(rows).to_excel(w, index=False, sheet_name="Σύνοψη")
     return out.as_posix()
@@ -29,11 +29,14 @@ API (κύρια):
     export_step3_to_per_scenario_exact_filled_v2(step3_xlsx, out_xlsx, config=Step4Config()) -> str
 """
 
-from dataclasses import dataclass
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
 from typing import Dict, List, Tuple, Optional, Any
-import pandas as pd, numpy as np, re, math, random, statistics
+import pandas as pd, numpy as np, re, math, random, statistics, time
 from datetime import datetime
 
+from parse_cache import memoized_parser
+
 # ------------------------- Exceptions -------------------------
 
 class Step4Error(Exception): pass
@@ -42,6 +45,9 @@ class InvalidConfigError(Step4Error): pass
 
 # ------------------------- Config & constants -----------------
 
+STEP4_SEARCH_MODES = ("heuristic", "optimal")
+STEP4_TT_MAX_ENTRIES = 500_000
+
 @dataclass
 class Step4Config:
     max_pop_diff: int = 4
@@ -71,6 +77,18 @@ class Step4Config:
     # NEW: ideal strategy flags
     use_ideal_strategy: bool = True
     prefer_opposites: bool = True
+    # NEW: "heuristic" (ideal/v2 όπως πριν) ή "optimal" (branch-and-bound, αληθινά top-k)
+    search_mode: str = "heuristic"
+    node_budget: Optional[int] = None
+    time_budget_s: Optional[float] = None
+    # v2 / optimal: ένα αντιπρόσωπο ανά σύνολο ισοδύναμων (ως προς ετικέτες τμημάτων) καταστάσεων.
+    # Προαιρετικό: με True τα σενάρια που είναι απλές μεταθέσεις ετικετών δεν επιστρέφονται,
+    # άρα αλλάζει το σύνολο (και το πλήθος) των σεναρίων σε σχέση με πριν.
+    symmetry_breaking: bool = False
+
+    def __post_init__(self):
+        if self.search_mode not in STEP4_SEARCH_MODES:
+            raise InvalidConfigError(f"Άγνωστο search_mode: {self.search_mode} (επιτρέπονται: {STEP4_SEARCH_MODES})")
 
 STEP_COLUMN_PATTERNS = re.compile(r"^ΒΗΜΑ[1-3]_ΣΕΝΑΡΙΟ_\d+$")
 FRIEND_COLUMN_CANDIDATES = ("ΦΙΛΟΙ","ΦΙΛΟΣ")
@@ -106,6 +124,7 @@ def _greek_norm(x: Any) -> str:
     # unknown -> empty
     return ""
 
+@memoized_parser
 def _friends_list(x):
     """
     Return a clean Python list of friend names from a cell value.
@@ -192,13 +211,17 @@ def _detect_classes(df: pd.DataFrame) -> List[str]:
     classes = sorted(set(classes), key=lambda x: (len(str(x)), str(x)))
     return classes
 
-def _get_current_assignment_row(row: pd.Series, step_cols: List[str]) -> Optional[str]:
+def _assignment_priority(step_cols: List[str]) -> List[str]:
+    """Σειρά προτεραιότητας: ΒΗΜΑ3 → ΒΗΜΑ2 → ΒΗΜΑ1 → υπόλοιπες (σταθερή μέσα σε κάθε ομάδα)."""
     def key_order(c):
         if str(c).startswith("ΒΗΜΑ3_"): return 0
         if str(c).startswith("ΒΗΜΑ2_"): return 1
         if str(c).startswith("ΒΗΜΑ1_"): return 2
         return 3
-    for c in sorted(step_cols, key=key_order):
+    return sorted(step_cols, key=key_order)
+
+def _get_current_assignment_row(row: pd.Series, step_cols: List[str]) -> Optional[str]:
+    for c in _assignment_priority(step_cols):
         v = row.get(c, np.nan)
         if pd.notna(v) and str(v).strip() != "":
             return str(v).strip()
@@ -315,21 +338,27 @@ def metrics_diff_tuple(mets: Dict[str,Dict[str,int]]) -> Tuple[int,int,int,int]:
     girls  = [m["girls"] for m in mets.values()] or [0]
     return (max(totals)-min(totals), max(boys)-min(boys), max(girls)-min(girls), max(goods)-min(goods))
 
-def ranges_ok(mets: Dict[str,Dict[str,int]], cfg: Step4Config) -> bool:
-    d_pop, d_boys, d_girls, d_good = metrics_diff_tuple(mets)
+def _diffs_ok(diffs: Tuple[int,int,int,int], cfg: Step4Config) -> bool:
+    d_pop, d_boys, d_girls, d_good = diffs
     if d_pop > cfg.max_pop_diff: return False
     if d_good > cfg.max_greek_diff: return False
     if d_boys > cfg.max_gender_diff: return False
     if d_girls > cfg.max_gender_diff: return False
     return True
 
-def penalty_score(mets: Dict[str,Dict[str,int]]) -> int:
-    d_pop, d_boys, d_girls, d_good = metrics_diff_tuple(mets)
+def ranges_ok(mets: Dict[str,Dict[str,int]], cfg: Step4Config) -> bool:
+    return _diffs_ok(metrics_diff_tuple(mets), cfg)
+
+def _penalty_from_diffs(diffs: Tuple[int,int,int,int]) -> int:
+    d_pop, d_boys, d_girls, d_good = diffs
     pop_pen = max(0, d_pop - 1)
     grk_pen = max(0, d_good - 2)
     sex_pen = max(0, d_boys - 1) + max(0, d_girls - 1)
     return int(pop_pen + grk_pen + sex_pen)
 
+def penalty_score(mets: Dict[str,Dict[str,int]]) -> int:
+    return _penalty_from_diffs(metrics_diff_tuple(mets))
+
 def variance_score(mets: Dict[str,Dict[str,int]]) -> Tuple[float,float,float]:
     vals = list(mets.values())
     if not vals:
@@ -343,33 +372,172 @@ def variance_score(mets: Dict[str,Dict[str,int]]) -> Tuple[float,float,float]:
     v_grk = statistics.pvariance(goods) if len(goods) > 1 else 0.0
     return (v_tot, v_gen, v_grk)
 
+# ------------------------- Array-backed metrics engine --------
+
+# Στήλες του πίνακα μετρικών ανά τμήμα (ίδια σειρά με metrics_diff_tuple)
+M_TOTAL, M_BOYS, M_GIRLS, M_GOOD = 0, 1, 2, 3
+_METRIC_KEYS = ("total", "boys", "girls", "greek_good")
+
+class Step4Engine:
+    """
+    Μετρικά τμημάτων του Βήματος 4 σε πίνακα NumPy (K τμήματα × 4: total, boys, girls, greek_good).
+
+    • Κάθε μαθητής γίνεται μία φορά διάνυσμα (1, αγόρι, κορίτσι, καλή ελληνικά)
+    • place/remove είναι πρόσθεση/αφαίρεση διανύσματος σε μία γραμμή
+    • candidate_* αξιολογούν με μία πράξη την τοποθέτηση μιας ομάδας σε ΚΑΘΕ τμήμα
+    Οι διασπορές υπολογίζονται ακριβώς (ακέραια αθροίσματα), όπως το statistics.pvariance.
+    """
+
+    def __init__(self, df: pd.DataFrame, base_assign: pd.Series, classes: List[str]):
+        self.classes: List[str] = list(classes)
+        self.col_of: Dict[str,int] = {c: k for k, c in enumerate(self.classes)}
+        self.pos_of: Dict[Any,int] = {idx: pos for pos, idx in enumerate(df.index)}
+        n = len(df)
+        gender = (df["ΦΥΛΟ"].map(_gender_norm) if "ΦΥΛΟ" in df.columns
+                  else pd.Series("", index=df.index))
+        greek = (df["ΚΑΛΗ_ΓΝΩΣΗ_ΕΛΛΗΝΙΚΩΝ"].map(_greek_norm) if "ΚΑΛΗ_ΓΝΩΣΗ_ΕΛΛΗΝΙΚΩΝ" in df.columns
+                 else pd.Series("", index=df.index))
+        self.student_vec = np.zeros((n, 4), dtype=np.int64)
+        self.student_vec[:, M_TOTAL] = 1
+        self.student_vec[:, M_BOYS] = (gender == "ΑΓΟΡΙ").to_numpy()
+        self.student_vec[:, M_GIRLS] = (gender == "ΚΟΡΙΤΣΙ").to_numpy()
+        self.student_vec[:, M_GOOD] = (greek == "Ν").to_numpy()
+
+        self.M = np.zeros((len(self.classes), 4), dtype=np.int64)
+        rows, cols = [], []
+        for pos, cl in enumerate(base_assign.tolist()):
+            if pd.isna(cl):
+                continue
+            k = self.col_of.get(str(cl))
+            if k is not None:
+                rows.append(pos); cols.append(k)
+        np.add.at(self.M, np.asarray(cols, dtype=np.int64), self.student_vec[np.asarray(rows, dtype=np.int64)])
+
+    # -- διανύσματα / ενημερώσεις --
+    def group_vector(self, members: Tuple[Any, ...]) -> np.ndarray:
+        return self.student_vec[[self.pos_of[sid] for sid in members]].sum(axis=0)
+
+    def place(self, k: int, vec: np.ndarray) -> None:
+        self.M[k] += vec
+
+    def remove(self, k: int, vec: np.ndarray) -> None:
+        self.M[k] -= vec
+
+    # -- τρέχουσα κατάσταση --
+    def diffs(self) -> Tuple[int,int,int,int]:
+        if not len(self.M):
+            return (0, 0, 0, 0)
+        d = self.M.max(axis=0) - self.M.min(axis=0)
+        return (int(d[M_TOTAL]), int(d[M_BOYS]), int(d[M_GIRLS]), int(d[M_GOOD]))
+
+    def metrics(self) -> Dict[str,Dict[str,int]]:
+        """Στιγμιότυπο σε μορφή dict-of-dicts (όπως empty_metrics)."""
+        return {c: dict(zip(_METRIC_KEYS, map(int, self.M[k]))) for k, c in enumerate(self.classes)}
+
+    # -- αξιολόγηση «βάλε την ομάδα στο τμήμα k» για κάθε k --
+    def fits(self, size: int, cap: int) -> np.ndarray:
+        return self.M[:, M_TOTAL] + size <= cap
+
+    def candidate_diffs(self, vec: np.ndarray) -> np.ndarray:
+        """(K, 4): metrics_diff_tuple αν η ομάδα μπει στο τμήμα k."""
+        K = len(self.M)
+        cand = np.broadcast_to(self.M, (K,) + self.M.shape).copy()
+        cand[np.arange(K), np.arange(K)] += vec
+        return cand.max(axis=1) - cand.min(axis=1)
+
+    def candidate_ok(self, vec: np.ndarray, cfg: Step4Config) -> np.ndarray:
+        d = self.candidate_diffs(vec)
+        return ((d[:, M_TOTAL] <= cfg.max_pop_diff) & (d[:, M_GOOD] <= cfg.max_greek_diff)
+                & (d[:, M_BOYS] <= cfg.max_gender_diff) & (d[:, M_GIRLS] <= cfg.max_gender_diff))
+
+    def candidate_weighted_score(self, vec: np.ndarray, cfg: Step4Config) -> np.ndarray:
+        """(K,): w_pop·v_tot + w_gender·v_gen + w_greek·v_grk (βλ. variance_score) αν η ομάδα μπει στο τμήμα k."""
+        K = len(self.M)
+        if K <= 1:
+            return np.zeros(K)
+        # σειρές: total, boys-girls, greek_good
+        X = np.stack([self.M[:, M_TOTAL], self.M[:, M_BOYS] - self.M[:, M_GIRLS], self.M[:, M_GOOD]], axis=1)
+        x = np.array([vec[M_TOTAL], vec[M_BOYS] - vec[M_GIRLS], vec[M_GOOD]], dtype=np.int64)
+        S = X.sum(axis=0) + x                          # ίδιο άθροισμα για κάθε k
+        Q = (X * X).sum(axis=0) + 2 * X * x + x * x    # (K, 3) άθροισμα τετραγώνων
+        var = (K * Q - S * S) / (K * K)                # = pvariance, σωστά στρογγυλεμένο
+        return cfg.w_pop_variance*var[:, 0] + cfg.w_gender_variance*var[:, 1] + cfg.w_greek_variance*var[:, 2]
+
+    def candidate_lower_bounds(self, vec: np.ndarray, rest: np.ndarray) -> np.ndarray:
+        """
+        (K, 4): κάτω φράγμα του τελικού metrics_diff_tuple αν η ομάδα μπει στο τμήμα k
+        και μετά τοποθετηθούν ομάδες με συνολικό διάνυσμα rest.
+
+        Χαλάρωση ανά διάσταση (μονάδες αντί για ομάδες, χωρίς cap): το τελικό άθροισμα S
+        είναι σταθερό και οι τιμές μόνο αυξάνονται, άρα
+            range ≥ max(τρέχον max, ⌈S/K⌉) − L*,  L* = min_j ⌊(rest + P_j) / j⌋
+        όπου P_j το άθροισμα των j μικρότερων τιμών (μέγιστο εφικτό ελάχιστο, water-filling).
+        """
+        K = len(self.M)
+        cand = np.broadcast_to(self.M, (K,) + self.M.shape).copy()
+        cand[np.arange(K), np.arange(K)] += vec
+        S = self.M.sum(axis=0) + vec + rest
+        P = np.cumsum(np.sort(cand, axis=1), axis=1)                       # (K, K, 4)
+        j = np.arange(1, K + 1, dtype=np.int64)[None, :, None]
+        level = ((rest[None, None, :] + P) // j).min(axis=1)                # (K, 4)
+        top = np.maximum(cand.max(axis=1), -(-S // K))
+        return top - level
+
+    def profile(self) -> bytes:
+        """Ταξινομημένες γραμμές μετρικών: ίδιο για καταστάσεις που διαφέρουν μόνο στις ετικέτες τμημάτων."""
+        return self.M[np.lexsort(self.M.T[::-1])].tobytes()
+
+    def row_key(self, k: int) -> bytes:
+        return self.M[k].tobytes()
+
+    def solution(self, df: pd.DataFrame, assign: Dict[Any,str]) -> Dict[str,Any]:
+        ser = pd.Series(index=df.index, dtype=object)
+        if assign:
+            ser.loc[list(assign)] = list(assign.values())
+        return {"assign": ser, "metrics": self.metrics(), "penalty": _penalty_from_diffs(self.diffs())}
+
+class StateTable:
+    """
+    Transposition table για την αναζήτηση του Βήματος 4: (βάθος, Step4Engine.profile()).
+
+    Όλα τα κριτήρια (όρια, cap, penalty, σταθμισμένη διασπορά) εξαρτώνται μόνο από το
+    πολυσύνολο των γραμμών μετρικών, άρα δύο καταστάσεις με ίδιο profile στο ίδιο βάθος
+    έχουν ισοδύναμα υποδέντρα (μετάθεση τμημάτων / ίδιες-κατηγορίας δυάδες). Φραγμένο μέγεθος.
+    """
+
+    def __init__(self, enabled: bool = True, max_entries: int = STEP4_TT_MAX_ENTRIES):
+        self.enabled = enabled
+        self.max_entries = max_entries
+        self._seen: set = set()
+        self.hits = 0
+
+    def seen(self, depth: int, eng: "Step4Engine") -> bool:
+        """True αν η κατάσταση έχει ήδη εξερευνηθεί· αλλιώς την καταγράφει."""
+        if not self.enabled:
+            return False
+        key = (depth, eng.profile())
+        if key in self._seen:
+            self.hits += 1
+            return True
+        if len(self._seen) < self.max_entries:
+            self._seen.add(key)
+        return False
+
 # ------------------------- Core algorithm ---------------------
 
 def _base_assignment_series(df: pd.DataFrame) -> pd.Series:
-    step_cols = _find_step_cols(df)
-    base = pd.Series(index=df.index, dtype=object)
-    for ridx, row in df.iterrows():
-        val = _get_current_assignment_row(row, step_cols)
-        if val is not None:
-            base.loc[ridx] = val
+    """Τρέχουσα ανάθεση ανά μαθητή: πρώτη μη κενή τιμή στις στήλες ΒΗΜΑ3 → ΒΗΜΑ2 → ΒΗΜΑ1 (stripped)."""
+    base = pd.Series(np.nan, index=df.index, dtype=object)
+    for c in _assignment_priority(_find_step_cols(df)):
+        col = df[c]
+        txt = col.astype(str).str.strip()
+        base = base.combine_first(txt.where(col.notna() & (txt != "")))
     return base
 
 def _classes_from_base(base: pd.Series) -> List[str]:
     classes = sorted(set(str(v) for v in base.dropna().unique().tolist()))
     return [c for c in classes if c.strip() != ""]
 
-def _init_metrics_from_base(df: pd.DataFrame, base: pd.Series, classes: List[str]) -> Dict[str,Dict[str,int]]:
-    mets = empty_metrics(classes)
-    class_set = set(classes)
-    for idx, cl in base.items():
-        if pd.isna(cl):
-            continue
-        cl = str(cl)
-        if cl not in class_set:
-            continue
-        apply_student_to_metrics(df, idx, cl, mets)
-    return mets
-
 def _dyad_catalog(df: pd.DataFrame, dyads: List[Tuple[int,int]]) -> List[Dict[str,Any]]:
     info = []
     cat_counts = {}
@@ -387,99 +555,64 @@ def _dyad_catalog(df: pd.DataFrame, dyads: List[Tuple[int,int]]) -> List[Dict[st
     info.sort(key=lambda x: (-x["scarcity"], x["pair"]))
     return info
 
-def _class_weighted_score(mets: Dict[str,Dict[str,int]], cfg: Step4Config) -> float:
-    v_tot, v_gen, v_grk = variance_score(mets)
-    return cfg.w_pop_variance*v_tot + cfg.w_gender_variance*v_gen + cfg.w_greek_variance*v_grk
-
-def _place_pair(df: pd.DataFrame, pair: Tuple[int,int], cl: str, mets: Dict[str,Dict[str,int]]) -> None:
-    apply_student_to_metrics(df, pair[0], cl, mets)
-    apply_student_to_metrics(df, pair[1], cl, mets)
-
-def _would_break_cap(mets: Dict[str,Dict[str,int]], cl: str, size: int, cfg: Step4Config) -> bool:
-    return (mets.get(cl, {"total":0})["total"] + size) > cfg.cap_per_class
-
 def generate_scenarios_for_dyads_v2(df: pd.DataFrame,
                                     dyads: List[Tuple[int,int]],
                                     base_assign: pd.Series,
                                     classes: List[str],
                                     cfg: Step4Config) -> List[Dict[str,Any]]:
-    """Backtracking με incremental metrics, scarcity ordering & weighted class scoring."""
-    base_metrics = _init_metrics_from_base(df, base_assign, classes)
+    """
+    Backtracking με incremental metrics (Step4Engine), scarcity ordering & weighted class scoring.
+    Με cfg.symmetry_breaking: τμήματα με ίδια μετρικά δοκιμάζονται μία φορά και καταστάσεις
+    που έχουν ήδη εξερευνηθεί (StateTable) παραλείπονται — τα σενάρια δεν είναι απλές
+    μεταθέσεις ετικετών μεταξύ τους.
+    """
+    eng = Step4Engine(df, base_assign, classes)
     dyad_info = _dyad_catalog(df, dyads)
+    vecs = [eng.group_vector(item["pair"]) for item in dyad_info]
+    table = StateTable(getattr(cfg, "symmetry_breaking", False))
 
     solutions: List[Dict[str,Any]] = []
     new_assign: Dict[int,str] = {}
-    mets = {c: m.copy() for c,m in base_metrics.items()}  # working metrics
 
     def backtrack(idx: int):
         if len(solutions) >= cfg.max_scenarios:
             return
+        if table.seen(idx, eng):
+            return
         if idx >= len(dyad_info):
             # accept if ranges ok
-            if not ranges_ok(mets, cfg): return
-            pen = penalty_score(mets)
-            assign_ser = pd.Series(index=df.index, dtype=object)
-            for sid, cl in new_assign.items():
-                assign_ser.loc[sid] = cl
-            solutions.append({"assign": assign_ser, "metrics": {c: m.copy() for c,m in mets.items()}, "penalty": pen})
+            if not _diffs_ok(eng.diffs(), cfg): return
+            solutions.append(eng.solution(df, new_assign))
             return
 
         item = dyad_info[idx]
-        pair, size = item["pair"], item["size"]
+        pair, size, vec = item["pair"], item["size"], vecs[idx]
 
-        # order classes by lowest projected weighted score
-        class_scores: List[Tuple[float,str]] = []
-        for cl in classes:
-            if _would_break_cap(mets, cl, size, cfg):
-                continue
-            # simulate
-            _place_pair(df, pair, cl, mets)
-            ok_now = ranges_ok(mets, cfg)  # early pruning (tight bound)
-            score = _class_weighted_score(mets, cfg) + (1000.0 if not ok_now else 0.0)
-            # undo
-            # We need to revert metrics: subtract pair
-            # Create a cheap revert by manual subtraction
-            for sid in pair:
-                row = df.loc[sid]
-                m = mets[cl]
-                m["total"] -= 1
-                g = _gender_norm(row.get("ΦΥΛΟ",""))
-                if g == "ΑΓΟΡΙ": m["boys"] -= 1
-                elif g == "ΚΟΡΙΤΣΙ": m["girls"] -= 1
-                if _greek_norm(row.get("ΚΑΛΗ_ΓΝΩΣΗ_ΕΛΛΗΝΙΚΩΝ","")) == "Ν": m["greek_good"] -= 1
-            class_scores.append((score, cl))
-
-        class_scores.sort(key=lambda t: t[0])
-
-        for _, cl in class_scores:
+        # order classes by lowest projected weighted score (early pruning: +1000 αν σπάει τα όρια)
+        score = eng.candidate_weighted_score(vec, cfg) + np.where(eng.candidate_ok(vec, cfg), 0.0, 1000.0)
+        fits = eng.fits(size, cfg.cap_per_class)
+        order = [int(k) for k in np.argsort(score, kind="stable") if fits[k]]
+
+        tried = set()
+        for k in order:
             if len(solutions) >= cfg.max_scenarios:
                 break
-            # apply
+            if table.enabled:
+                row = eng.row_key(k)
+                if row in tried:
+                    continue
+                tried.add(row)
+            cl = classes[k]
             for sid in pair: new_assign[sid] = cl
-            _place_pair(df, pair, cl, mets)
-
-            # deeper
+            eng.place(k, vec)
             backtrack(idx+1)
-
-            # revert
+            eng.remove(k, vec)
             for sid in pair: del new_assign[sid]
-            # subtract pair from mets
-            for sid in pair:
-                row = df.loc[sid]
-                m = mets[cl]
-                m["total"] -= 1
-                g = _gender_norm(row.get("ΦΥΛΟ",""))
-                if g == "ΑΓΟΡΙ": m["boys"] -= 1
-                elif g == "ΚΟΡΙΤΣΙ": m["girls"] -= 1
-                if _greek_norm(row.get("ΚΑΛΗ_ΓΝΩΣΗ_ΕΛΛΗΝΙΚΩΝ","")) == "Ν": m["greek_good"] -= 1
 
     backtrack(0)
 
     # sort & tie-breakers
-    def diffs_tuple(m):
-        d_pop, d_boys, d_girls, d_good = metrics_diff_tuple(m)
-        return (d_pop, d_boys, d_girls, d_good)
-    solutions.sort(key=lambda s: (s["penalty"],) + diffs_tuple(s["metrics"]))
+    solutions.sort(key=lambda s: (s["penalty"],) + metrics_diff_tuple(s["metrics"]))
     return solutions[:cfg.max_scenarios]
 
 
@@ -487,7 +620,7 @@ def generate_scenarios_for_dyads_v2(df: pd.DataFrame,
 def generate_scenarios_for_dyads_ideal(df, dyads, base_assign, classes, cfg):
     # Fallback minimal ideal strategy: equalize category counts per class with alternation.
     K = len(classes)
-    mets = _init_metrics_from_base(df, base_assign, classes)
+    eng = Step4Engine(df, base_assign, classes)
     # Build category counts and dyads per category
     info = []
     cat_counts = {}
@@ -496,7 +629,7 @@ def generate_scenarios_for_dyads_ideal(df, dyads, base_assign, classes, cfg):
         cat = group_category(rows)  # uses gender_cat/greek_cat
         key = (cat["gender_cat"], cat["greek_cat"])
         cat_counts[key] = cat_counts.get(key, 0) + 1
-        info.append({"pair": (i,j), "key": key})
+        info.append({"pair": (i,j), "key": key, "vec": eng.group_vector((i,j))})
     # Ideal per category (students)
     per_class_cat = {key: {cl:0 for cl in classes} for key in cat_counts.keys()}
     ideals = {key: round((sum(per_class_cat[key].values()) + 2*sum(1 for x in info if x["key"]==key))/max(1,K)) for key in cat_counts.keys()}
@@ -510,63 +643,225 @@ def generate_scenarios_for_dyads_ideal(df, dyads, base_assign, classes, cfg):
     def backtrack(pos):
         if len(sols) >= cfg.max_scenarios: return
         if pos >= len(info):
-            if not ranges_ok(mets, cfg): return
-            pen = penalty_score(mets)
-            ser = pd.Series(index=df.index, dtype=object)
-            for sid, cl in assign.items(): ser.loc[sid] = cl
-            sols.append({"assign": ser, "metrics": {c: m.copy() for c,m in mets.items()}, "penalty": pen})
+            if not _diffs_ok(eng.diffs(), cfg): return
+            sols.append(eng.solution(df, assign))
             return
         item = info[pos]
-        pair, key = item["pair"], item["key"]
+        pair, key, vec = item["pair"], item["key"], item["vec"]
+        fits = eng.fits(2, cfg.cap_per_class)
+        ok = eng.candidate_ok(vec, cfg)
         cands = []
-        for cl in classes:
-            # cap check
-            if _would_break_cap(mets, cl, 2, cfg): 
+        for k, cl in enumerate(classes):
+            if not (fits[k] and ok[k]):
                 continue
             # score by gap to ideal + alternation bonus
             gap = abs((per_class_cat[key][cl] + 2) - ideals[key])
             alt_bonus = -0.5 if (cfg.prefer_opposites and last_key[cl] is not None and last_key[cl] != key) else 0.0
-            # simulate quick range ok
-            _place_pair(df, pair, cl, mets)
-            ok = ranges_ok(mets, cfg)
-            # revert
-            for sid in pair:
-                row = df.loc[sid]; m = mets[cl]
-                m["total"] -= 1
-                g = _gender_norm(row.get("ΦΥΛΟ",""))
-                if g == "ΑΓΟΡΙ": m["boys"] -= 1
-                elif g == "ΚΟΡΙΤΣΙ": m["girls"] -= 1
-                if _greek_norm(row.get("ΚΑΛΗ_ΓΝΩΣΗ_ΕΛΛΗΝΙΚΩΝ","")) == "Ν": m["greek_good"] -= 1
-            if ok:
-                cands.append(((gap + alt_bonus), cl))
+            cands.append(((gap + alt_bonus), k))
         if not cands:
             return
         cands.sort(key=lambda x: x[0])
-        best = [cl for sc,cl in cands if sc == cands[0][0]]
-        for cl in best[:max(2, cfg.max_scenarios - len(sols))]:
+        best = [k for sc,k in cands if sc == cands[0][0]]
+        for k in best[:max(2, cfg.max_scenarios - len(sols))]:
+            cl = classes[k]
             assign[pair[0]] = cl; assign[pair[1]] = cl
-            _place_pair(df, pair, cl, mets)
+            eng.place(k, vec)
             per_class_cat[key][cl] += 2
             prev = last_key[cl]; last_key[cl] = key
             backtrack(pos+1)
             last_key[cl] = prev
             per_class_cat[key][cl] -= 2
+            eng.remove(k, vec)
             for sid in pair:
                 del assign[sid]
-                row = df.loc[sid]; m = mets[cl]
-                m["total"] -= 1
-                g = _gender_norm(row.get("ΦΥΛΟ",""))
-                if g == "ΑΓΟΡΙ": m["boys"] -= 1
-                elif g == "ΚΟΡΙΤΣΙ": m["girls"] -= 1
-                if _greek_norm(row.get("ΚΑΛΗ_ΓΝΩΣΗ_ΕΛΛΗΝΙΚΩΝ","")) == "Ν": m["greek_good"] -= 1
     backtrack(0)
     sols.sort(key=lambda s: (s["penalty"],) + metrics_diff_tuple(s["metrics"]))
     return sols[:cfg.max_scenarios]
-# ------------------------- Public APIs --------------------------------------
+def _penalty_rows(diffs: np.ndarray) -> np.ndarray:
+    """_penalty_from_diffs για κάθε γραμμή ενός (N, 4) πίνακα διαφορών."""
+    d = np.maximum(diffs - np.array([1, 1, 1, 2]), 0)
+    return d.sum(axis=1)
 
-def run_step4_multi_with_fill_v2(df: pd.DataFrame, config: Step4Config = Step4Config()) -> pd.DataFrame:
+def generate_scenarios_for_dyads_optimal(df, dyads, base_assign, classes, cfg):
+    """
+    Branch-and-bound: τα cfg.max_scenarios σενάρια με το μικρότερο
+    (penalty_score, metrics_diff_tuple) που τηρούν όρια και cap.
+
+    Κάθε κλάδος κόβεται όταν το κάτω φράγμα (Step4Engine.candidate_lower_bounds, από τα
+    αθροίσματα των δυάδων που απομένουν) παραβιάζει τα όρια ή δεν μπορεί να νικήσει το
+    k-οστό καλύτερο. Με cfg.node_budget / cfg.time_budget_s η αναζήτηση μπορεί να κοπεί·
+    κάθε λύση έχει sol["search"] = {"nodes", "truncated", "proven_optimal", "table_hits"}.
+
+    Με cfg.symmetry_breaking τα top-k είναι διακριτά profiles μετρικών (όχι μεταθέσεις
+    ετικετών): ισοδύναμα τμήματα δοκιμάζονται μία φορά, οι δυάδες ίδιου διανύσματος
+    μπαίνουν διαδοχικά και οι ήδη εξερευνημένες καταστάσεις παραλείπονται (StateTable).
+    """
+    eng = Step4Engine(df, base_assign, classes)
+    dyad_info = _dyad_catalog(df, dyads)
+    n = len(dyad_info)
+    for item in dyad_info:
+        item["vec"] = eng.group_vector(item["pair"])
+    # δυάδες ίδιου διανύσματος διαδοχικά (μέσα στην ίδια σπανιότητα) → πιο συχνά hits στο table
+    dyad_info.sort(key=lambda x: (-x["scarcity"], tuple(int(v) for v in x["vec"]), x["pair"]))
+    vecs = [item["vec"] for item in dyad_info]
+    table = StateTable(getattr(cfg, "symmetry_breaking", False))
+    rest = np.zeros((n + 1, 4), dtype=np.int64)
+    for i in range(n - 1, -1, -1):
+        rest[i] = rest[i + 1] + vecs[i]
+    limits = np.array([cfg.max_pop_diff, cfg.max_gender_diff, cfg.max_gender_diff, cfg.max_greek_diff])
+    k_best = max(1, int(cfg.max_scenarios))
+    deadline = (time.perf_counter() + cfg.time_budget_s) if cfg.time_budget_s is not None else None
+
+    top: List[Tuple[Tuple[int,...], bytes, Dict[str,Any]]] = []   # ταξινομημένα κατά κλειδί, ≤ k_best
+    assign: Dict[int,str] = {}
+    nodes = 0
+    truncated = False
+
+    def backtrack(idx: int) -> None:
+        nonlocal nodes, truncated
+        if truncated:
+            return
+        nodes += 1
+        if (cfg.node_budget is not None and nodes > cfg.node_budget) or \
+                (deadline is not None and time.perf_counter() > deadline):
+            truncated = True
+            return
+        if table.seen(idx, eng):
+            return
+        if idx >= n:
+            diffs = eng.diffs()
+            if not _diffs_ok(diffs, cfg):
+                return
+            prof = eng.profile()
+            if table.enabled and any(p == prof for _, p, _ in top):
+                return
+            key = (_penalty_from_diffs(diffs),) + diffs
+            pos = len(top)
+            while pos > 0 and top[pos - 1][0] > key:
+                pos -= 1
+            top.insert(pos, (key, prof, eng.solution(df, assign)))
+            del top[k_best:]
+            return
+
+        pair, size, vec = dyad_info[idx]["pair"], dyad_info[idx]["size"], vecs[idx]
+        lb = eng.candidate_lower_bounds(vec, rest[idx + 1])
+        feasible = eng.fits(size, cfg.cap_per_class) & (lb <= limits).all(axis=1)
+        pens = _penalty_rows(lb)
+        order = sorted(((int(pens[k]),) + tuple(int(x) for x in lb[k]), k) for k in np.flatnonzero(feasible))
+
+        tried = set()
+        for key, k in order:
+            if len(top) >= k_best and key >= top[-1][0]:
+                break   # κανένα παιδί από εδώ και πέρα δεν μπαίνει στα top-k
+            if table.enabled:
+                row = eng.row_key(k)
+                if row in tried:
+                    continue
+                tried.add(row)
+            cl = classes[k]
+            for sid in pair: assign[sid] = cl
+            eng.place(k, vec)
+            backtrack(idx + 1)
+            eng.remove(k, vec)
+            for sid in pair: del assign[sid]
+            if truncated:
+                return
+
+    backtrack(0)
+    info = {"nodes": nodes, "truncated": truncated, "proven_optimal": not truncated,
+            "table_hits": table.hits}
+    sols = [sol for _, _, sol in top]
+    for sol in sols:
+        sol["search"] = dict(info)
+    return sols
+
+# ------------------------- Results ----------------------------------------
+
+@dataclass(frozen=True, eq=False)
+class Step4Scenario:
+    """Σενάριο Βήματος 4 (FILLED: νέες αναθέσεις δυάδων + βάση Βημάτων 1–3)."""
+    id: int
+    column_name: str                      # "ΒΗΜΑ4_ΣΕΝΑΡΙΟ_1"
+    assignment: np.ndarray                # τμήμα ανά γραμμή του ρόστερ (object, NaN = κανένα)
+    penalty: Optional[int] = None         # None στο carry-forward
+    metrics: Dict[str, Dict[str, int]] = field(default_factory=dict)
+    search: Dict[str, Any] = field(default_factory=dict)
+
+    def as_series(self, index: pd.Index) -> pd.Series:
+        return pd.Series(self.assignment, index=index, dtype=object, name=self.column_name)
+
+@dataclass(frozen=True, eq=False)
+class Step4Results:
+    """
+    Δομημένο αποτέλεσμα του Βήματος 4 για ένα ρόστερ.
+    Το DataFrame (στήλες ΒΗΜΑ4_ΣΕΝΑΡΙΟ_k, ΒΗΜΑ4_penalty_k, ΒΗΜΑ4_meta) φτιάχνεται μόνο στο to_dataframe.
+    """
+    index: pd.Index
+    base_assignment: np.ndarray
+    scenarios: Tuple[Step4Scenario, ...]
+    config: Step4Config
+    generated_at: str
+    summary: Optional[str] = None         # Σύνοψη_ΒΗΜΑ4 (carry-forward / κανένα αποδεκτό σενάριο)
+    carry_forward: bool = False
+
+    def get_scenario(self, scenario_id: int) -> Optional[Step4Scenario]:
+        for scenario in self.scenarios:
+            if scenario.id == scenario_id:
+                return scenario
+        return None
+
+    def best(self) -> Optional[Step4Scenario]:
+        """Σενάριο με τη μικρότερη penalty (πρώτο σε ισοβαθμία)· χωρίς penalties, το πρώτο."""
+        scored = [sc for sc in self.scenarios if sc.penalty is not None]
+        if scored:
+            return min(scored, key=lambda sc: sc.penalty)
+        return self.scenarios[0] if self.scenarios else None
+
+    def base_series(self) -> pd.Series:
+        return pd.Series(self.base_assignment, index=self.index, dtype=object)
+
+    def meta(self) -> str:
+        meta = f"generated:{self.generated_at} cfg={self.config}"
+        if self.scenarios and self.scenarios[0].search:
+            search = self.scenarios[0].search
+            meta += f" nodes={search['nodes']} proven_optimal={search['proven_optimal']}"
+        return meta
+
+    def to_dataframe(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Το ρόστερ με τις στήλες του Βήματος 4 (μορφή run_step4_multi_with_fill_v2)."""
+        out = df.copy()
+        for sc in self.scenarios:
+            out[sc.column_name] = sc.as_series(out.index)
+        if self.carry_forward or not self.scenarios:
+            out["Σύνοψη_ΒΗΜΑ4"] = self.summary
+            return out
+
+        # FILLED: και για τυχόν προϋπάρχουσες στήλες ΒΗΜΑ4_ΣΕΝΑΡΙΟ_k
+        base = self.base_series()
+        for c in [c for c in out.columns if re.match(r"^ΒΗΜΑ4_ΣΕΝΑΡΙΟ_\d+$", str(c))]:
+            out[c] = out[c].where(out[c].notna(), base)
+
+        # penalties snapshot στην πρώτη γραμμή (συμβατότητα με αρχεία που διαβάζουν τις στήλες)
+        for sc in self.scenarios:
+            out.loc[out.index[0], f"ΒΗΜΑ4_penalty_{sc.id}"] = int(sc.penalty)
+        out.loc[out.index[0], "ΒΗΜΑ4_meta"] = self.meta()
+        return out
+
+# ------------------------- Public APIs (run) ---------------------------------
+
+def run_step4_results(df: pd.DataFrame, config: Step4Config = Step4Config()) -> Step4Results:
+    """Βήμα 4 χωρίς υλοποίηση DataFrame: αναθέσεις, penalties και μετρικά ανά σενάριο."""
     _require_columns(df)
     base_assign = _base_assignment_series(df)
+    generated_at = datetime.now().isoformat(timespec="seconds")
+
+    def _carry_forward(summary: str) -> Step4Results:
+        arr = base_assign.to_numpy(dtype=object)
+        scenarios = tuple(Step4Scenario(id=k, column_name=f"ΒΗΜΑ4_ΣΕΝΑΡΙΟ_{k}", assignment=arr)
+                          for k in range(1, config.max_scenarios+1))
+        return Step4Results(index=df.index, base_assignment=arr, scenarios=scenarios, config=config,
+                            generated_at=generated_at, summary=summary, carry_forward=True)
+
     classes = _detect_classes(df)
     if not classes:
         # αν δεν βρεθούν από στήλες 1..3, πάρε από base
@@ -574,61 +869,70 @@ def run_step4_multi_with_fill_v2(df: pd.DataFrame, config: Step4Config = Step4Co
     if not classes:
         raise InsufficientDataError("Δεν εντοπίστηκαν labels τμημάτων από τα Βήματα 1–3.")
     if len(classes) < 2:
-        out = df.copy()
-        for k in range(1, config.max_scenarios+1):
-            out[f"ΒΗΜΑ4_ΣΕΝΑΡΙΟ_{k}"] = base_assign
-        out["Σύνοψη_ΒΗΜΑ4"] = "Μόνο 1 τμήμα — carry-forward από Βήματα 1–3."
-        return out
+        return _carry_forward("Μόνο 1 τμήμα — carry-forward από Βήματα 1–3.")
     unplaced_df, dyads = build_unplaced_and_mutual_dyads(df)
-
-    out = df.copy()
     if not dyads:
         # carry-forward to ensure ΒΗΜΑ4 continuity
-        for k in range(1, config.max_scenarios+1):
-            out[f"ΒΗΜΑ4_ΣΕΝΑΡΙΟ_{k}"] = base_assign
-        out["Σύνοψη_ΒΗΜΑ4"] = "Δεν βρέθηκαν πλήρως αμοιβαίες δυάδες μεταξύ μη-τοποθετημένων."
-        return out
-
-    sols = (generate_scenarios_for_dyads_ideal(df, dyads, base_assign, classes, config)
-        if getattr(config, 'use_ideal_strategy', True) else
-        generate_scenarios_for_dyads_v2(df, dyads, base_assign, classes, config))
-    if not sols:
-        out["Σύνοψη_ΒΗΜΑ4"] = "Δεν βρέθηκαν αποδεκτά σενάρια με βάση τα όρια."
-        return out
+        return _carry_forward("Δεν βρέθηκαν πλήρως αμοιβαίες δυάδες μεταξύ μη-τοποθετημένων.")
 
-    # Γράψε έως 5 σενάρια
-    for k,sol in enumerate(sols, start=1):
-        col = f"ΒΗΜΑ4_ΣΕΝΑΡΙΟ_{k}"
-        out[col] = np.nan
-        for idx, cl in sol["assign"].items():
-            if pd.notna(cl):
-                out.loc[idx, col] = cl
-
-    # FILLED: μεταφορά όλων των υπαρχουσών αναθέσεων (βάση)
-    for c in [c for c in out.columns if re.match(r"^ΒΗΜΑ4_ΣΕΝΑΡΙΟ_\d+$", str(c))]:
-        out[c] = out[c].where(out[c].notna(), base_assign)
-
-    # penalties snapshot στην πρώτη γραμμή (αν θες να επιλέγεις “best” αργότερα)
-    for k,sol in enumerate(sols, start=1):
-        out.loc[out.index[0], f"ΒΗΜΑ4_penalty_{k}"] = int(sol["penalty"])
+    if getattr(config, 'search_mode', 'heuristic') == "optimal":
+        sols = generate_scenarios_for_dyads_optimal(df, dyads, base_assign, classes, config)
+    else:
+        sols = (generate_scenarios_for_dyads_ideal(df, dyads, base_assign, classes, config)
+            if getattr(config, 'use_ideal_strategy', True) else
+            generate_scenarios_for_dyads_v2(df, dyads, base_assign, classes, config))
+
+    # FILLED: νέες αναθέσεις + μεταφορά όλων των υπαρχουσών αναθέσεων (βάση)
+    scenarios = tuple(
+        Step4Scenario(id=k, column_name=f"ΒΗΜΑ4_ΣΕΝΑΡΙΟ_{k}",
+                      assignment=sol["assign"].where(sol["assign"].notna(), base_assign).to_numpy(dtype=object),
+                      penalty=int(sol["penalty"]), metrics=sol["metrics"], search=sol.get("search", {}))
+        for k, sol in enumerate(sols, start=1))
+    return Step4Results(index=df.index, base_assignment=base_assign.to_numpy(dtype=object),
+                        scenarios=scenarios, config=config, generated_at=generated_at,
+                        summary=None if scenarios else "Δεν βρέθηκαν αποδεκτά σενάρια με βάση τα όρια.")
 
-    # metadata
-    out.loc[out.index[0], "ΒΗΜΑ4_meta"] = f"generated:{datetime.now().isoformat(timespec='seconds')} cfg={config}"
+def run_step4_multi_with_fill_v2(df: pd.DataFrame, config: Step4Config = Step4Config()) -> pd.DataFrame:
+    return run_step4_results(df, config).to_dataframe(df)
 
-    return out
+# ------------------------- Per-sheet execution ----------------------------
 
-def export_step4_nextcol_full_multi_filled_v2(step3_xlsx_path: str, out_xlsx_path: str, config: Step4Config = Step4Config()) -> str:
+def _step4_sheet_task(task: Tuple[pd.DataFrame, str, Step4Config]):
+    """Worker: (df, φύλλο, config) -> Step4Results ή η εξαίρεση. Top-level ώστε να γίνεται pickle.
+    Η αναζήτηση είναι ντετερμινιστική, οπότε σειριακά και pool δίνουν τα ίδια σενάρια."""
+    df, sheet_name, config = task
+    try:
+        return run_step4_results(df, config=config)
+    except Exception as ex:
+        return ex
+
+def _run_step4_sheets(tasks: List[Tuple[pd.DataFrame, str, Step4Config]], workers: Optional[int] = None) -> list:
+    """Βήμα 4 ανά φύλλο: σειριακά (workers None/1) ή σε process pool· τα αποτελέσματα με τη σειρά των tasks."""
+    if workers is not None and workers > 1 and len(tasks) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as ex:
+            return list(ex.map(_step4_sheet_task, tasks))
+    return [_step4_sheet_task(t) for t in tasks]
+
+def _is_summary_sheet(sh) -> bool:
+    return str(sh).strip().lower().startswith("σύνοψη")
+
+def export_step4_nextcol_full_multi_filled_v2(step3_xlsx_path: str, out_xlsx_path: str, config: Step4Config = Step4Config(),
+                                              workers: Optional[int] = None) -> str:
     xls = pd.ExcelFile(step3_xlsx_path)
+    sheets = [(sh, xls.parse(sh)) for sh in xls.sheet_names]
+    done = iter(_run_step4_sheets([(df, sh, config) for sh, df in sheets if not _is_summary_sheet(sh)], workers))
     summary_rows = []
     with pd.ExcelWriter(out_xlsx_path, engine="openpyxl") as writer:
-        for sh in xls.sheet_names:
-            df = xls.parse(sh)
-            if str(sh).strip().lower().startswith("σύνοψη"):
+        for sh, df in sheets:
+            if _is_summary_sheet(sh):
                 # αντιγράφουμε σύνοψη, για πληρότητα
                 df.to_excel(writer, index=False, sheet_name=str(sh)[:31])
                 continue
             try:
-                out_df = run_step4_multi_with_fill_v2(df, config=config)
+                res = next(done)
+                if isinstance(res, Exception):
+                    raise res
+                out_df = res.to_dataframe(df)
                 step4_cols = [c for c in out_df.columns if re.match(r"^ΒΗΜΑ4_ΣΕΝΑΡΙΟ_\d+$", str(c))]
                 placed_counts = [int(out_df[c].notna().sum()) for c in step4_cols] if step4_cols else []
                 summary_rows.append({
@@ -654,7 +958,11 @@ def export_step4_nextcol_full_multi_filled_v2(step3_xlsx_path: str, out_xlsx_pat
         meta.to_excel(writer, index=False, sheet_name="Meta")
     return out_xlsx_path
 
-def _pick_best_step4_col(df: pd.DataFrame) -> Tuple[Optional[int], Optional[str]]:
+def _pick_best_step4_col(df) -> Tuple[Optional[int], Optional[str]]:
+    """(k, στήλη) του καλύτερου σεναρίου· δέχεται Step4Results ή (παλιά μορφή) DataFrame με ΒΗΜΑ4_penalty_k."""
+    if isinstance(df, Step4Results):
+        best = df.best()
+        return (best.id, best.column_name) if best is not None else (None, None)
     pen_map = {}
     for c in df.columns:
         m = re.match(r"^ΒΗΜΑ4_penalty_(\d+)$", str(c))
@@ -676,34 +984,32 @@ def _pick_best_step4_col(df: pd.DataFrame) -> Tuple[Optional[int], Optional[str]
     k = int(re.search(r"\d+$", first_col).group(0))
     return k, first_col
 
-def export_step3_to_per_scenario_exact_filled_v2(step3_xlsx_path: str, out_xlsx_path: str, config: Step4Config = Step4Config()) -> str:
+def export_step3_to_per_scenario_exact_filled_v2(step3_xlsx_path: str, out_xlsx_path: str, config: Step4Config = Step4Config(),
+                                                  workers: Optional[int] = None) -> str:
     TARGET_BASE_COLS = ['Α/Α','ΟΝΟΜΑ','ΦΥΛΟ','ΖΩΗΡΟΣ','ΙΔΙΑΙΤΕΡΟΤΗΤΑ','ΠΑΙΔΙ_ΕΚΠΑΙΔΕΥΤΙΚΟΥ','ΚΑΛΗ_ΓΝΩΣΗ_ΕΛΛΗΝΙΚΩΝ','ΦΙΛΟΙ']
     xls = pd.ExcelFile(step3_xlsx_path)
+    sheets = [(sh, xls.parse(sh)) for sh in xls.sheet_names if not _is_summary_sheet(sh)]
+    done = _run_step4_sheets([(df, sh, config) for sh, df in sheets], workers)
     with pd.ExcelWriter(out_xlsx_path, engine="openpyxl") as writer:
         chosen_rows = []
-        for sh in xls.sheet_names:
-            if str(sh).strip().lower().startswith("σύνοψη"):
-                continue
-            df = xls.parse(sh)
-            filled_df = run_step4_multi_with_fill_v2(df, config=config)
+        for (sh, df), res in zip(sheets, done):
+            if isinstance(res, Exception):
+                raise res
             m = re.search(r"ΒΗΜΑ3_ΣΕΝΑΡΙΟ_(\d+)", str(sh))
             sid = int(m.group(1)) if m else 1
 
-            out_df = pd.DataFrame(index=filled_df.index)
+            out_df = pd.DataFrame(index=df.index)
             for c in TARGET_BASE_COLS:
-                out_df[c] = filled_df[c] if c in filled_df.columns else None
+                out_df[c] = df[c] if c in df.columns else None
             for step in [1,2,3]:
                 col = f"ΒΗΜΑ{step}_ΣΕΝΑΡΙΟ_{sid}"
-                out_df[col] = filled_df[col] if col in filled_df.columns else None
-
-            best_k, best_col = _pick_best_step4_col(filled_df)
-            if best_col is not None:
-                out_df[f"ΒΗΜΑ4_ΣΕΝΑΡΙΟ_{sid}"] = filled_df[best_col]
-                pen = None
-                if best_k is not None and f"ΒΗΜΑ4_penalty_{best_k}" in filled_df.columns:
-                    pser = filled_df[f"ΒΗΜΑ4_penalty_{best_k}"].dropna()
-                    pen = float(pser.iloc[0]) if not pser.empty else None
-                chosen_rows.append({"Sheet": f"ΣΕΝΑΡΙΟ_{sid}", "Best": best_col, "Penalty": pen})
+                out_df[col] = df[col] if col in df.columns else None
+
+            best = res.best()
+            if best is not None:
+                out_df[f"ΒΗΜΑ4_ΣΕΝΑΡΙΟ_{sid}"] = best.as_series(df.index)
+                pen = float(best.penalty) if best.penalty is not None else None
+                chosen_rows.append({"Sheet": f"ΣΕΝΑΡΙΟ_{sid}", "Best": best.column_name, "Penalty": pen})
             else:
                 out_df[f"ΒΗΜΑ4_ΣΕΝΑΡΙΟ_{sid}"] = None
                 chosen_rows.append({"Sheet": f"ΣΕΝΑΡΙΟ_{sid}", "Best": "(none)", "Penalty": None})
@@ -730,53 +1036,60 @@ def apply_step4_with_enhanced_strategy(
     assigned_column: str = 'ΒΗΜΑ3_ΣΕΝΑΡΙΟ_1',
     num_classes: Optional[int] = None,
     max_results: int = 5,
+    return_results: bool = False,
     **kwargs
 ):
     """
     Return DataFrame with ΒΗΜΑ4_ΣΕΝΑΡΙΟ_1..max_results filled.
     - If no mutual dyads exist, all ΒΗΜΑ4_ΣΕΝΑΡΙΟ_k are carry-forward of prior steps (Βήμα3→2→1).
     - Honors hard constraints and produces up to `max_results` candidate Step4 columns.
+    - return_results=True: returns the Step4Results object instead (no DataFrame assembly).
     """
-    cfg = Step4Config(max_scenarios=int(max_results), use_ideal_strategy=True, prefer_opposites=True)
+    cfg = Step4Config(max_scenarios=int(max_results), use_ideal_strategy=True, prefer_opposites=True,
+                      search_mode=kwargs.get("search_mode", "heuristic"),
+                      node_budget=kwargs.get("node_budget"), time_budget_s=kwargs.get("time_budget_s"))
+    if return_results:
+        return run_step4_results(df, config=cfg)
     return run_step4_multi_with_fill_v2(df, config=cfg)
 
 
-def export_step3_to_per_scenario_exact_like_template(step3_xlsx_path: str, out_xlsx_path: str, config: Step4Config = Step4Config()) -> str:
+def export_step3_to_per_scenario_exact_like_template(step3_xlsx_path: str, out_xlsx_path: str, config: Step4Config = Step4Config(),
+                                                     workers: Optional[int] = None) -> str:
     """
     Export EXACTLY like the provided template:
     - Only sheets named 'ΣΕΝΑΡΙΟ_{k}'.
     - Columns (in order): 8 base + ΒΗΜΑ1_ΣΕΝΑΡΙΟ_k, ΒΗΜΑ2_ΣΕΝΑΡΙΟ_k, ΒΗΜΑ3_ΣΕΝΑΡΙΟ_k, ΒΗΜΑ4_ΣΕΝΑΡΙΟ_k
     - No 'Σύνοψη' / No 'Meta' sheets.
+    - workers > 1: τα φύλλα τρέχουν σε process pool (ίδια έξοδος με το σειριακό τρέξιμο).
     """
     TARGET_BASE_COLS = ['Α/Α','ΟΝΟΜΑ','ΦΥΛΟ','ΖΩΗΡΟΣ','ΙΔΙΑΙΤΕΡΟΤΗΤΑ','ΠΑΙΔΙ_ΕΚΠΑΙΔΕΥΤΙΚΟΥ','ΚΑΛΗ_ΓΝΩΣΗ_ΕΛΛΗΝΙΚΩΝ','ΦΙΛΟΙ']
     xls = pd.ExcelFile(step3_xlsx_path)
+    sheets = [(sh, xls.parse(sh)) for sh in xls.sheet_names if not _is_summary_sheet(sh)]
+    done = _run_step4_sheets([(df, sh, config) for sh, df in sheets], workers)
     with pd.ExcelWriter(out_xlsx_path, engine="openpyxl") as writer:
-        for sh in xls.sheet_names:
-            if str(sh).strip().lower().startswith("σύνοψη"):
-                continue
-            df = xls.parse(sh)
-            filled_df = run_step4_multi_with_fill_v2(df, config=config)
+        for (sh, df), res in zip(sheets, done):
+            if isinstance(res, Exception):
+                raise res
             m = re.search(r"ΒΗΜΑ3_ΣΕΝΑΡΙΟ_(\d+)", str(sh))
             sid = int(m.group(1)) if m else 1
 
-            out_df = pd.DataFrame(index=filled_df.index)
+            out_df = pd.DataFrame(index=df.index)
             # base
             for c in TARGET_BASE_COLS:
-                out_df[c] = filled_df[c] if c in filled_df.columns else None
+                out_df[c] = df[c] if c in df.columns else None
 
             # step columns
             step_cols = [f"ΒΗΜΑ1_ΣΕΝΑΡΙΟ_{sid}", f"ΒΗΜΑ2_ΣΕΝΑΡΙΟ_{sid}", f"ΒΗΜΑ3_ΣΕΝΑΡΙΟ_{sid}"]
             for c in step_cols:
-                out_df[c] = filled_df[c] if c in filled_df.columns else None
+                out_df[c] = df[c] if c in df.columns else None
 
             # pick best ΒΗΜΑ4 and keep only that one
-            k_best, best_col = _pick_best_step4_col(filled_df)
-            if best_col is not None and best_col in filled_df.columns:
-                out_df[f"ΒΗΜΑ4_ΣΕΝΑΡΙΟ_{sid}"] = filled_df[best_col]
+            best = res.best()
+            if best is not None:
+                out_df[f"ΒΗΜΑ4_ΣΕΝΑΡΙΟ_{sid}"] = best.as_series(df.index)
             else:
                 # carry-forward if none
-                base_assign = _base_assignment_series(filled_df)
-                out_df[f"ΒΗΜΑ4_ΣΕΝΑΡΙΟ_{sid}"] = base_assign
+                out_df[f"ΒΗΜΑ4_ΣΕΝΑΡΙΟ_{sid}"] = res.base_series()
 
             ordered = TARGET_BASE_COLS + step_cols + [f"ΒΗΜΑ4_ΣΕΝΑΡΙΟ_{sid}"]
             out_df = out_df[ordered]
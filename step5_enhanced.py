@@ -13,10 +13,16 @@ step_5_ypoloipoi_mathites_CORRECTED_ENHANCED.py
 """
 
 from __future__ import annotations
-import random, re
+import random, re, zlib
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
 from typing import List, Dict, Tuple, Any, Optional
+import numpy as np
 import pandas as pd
 
+from class_balance import class_tallies, spread_penalty
+from parse_cache import memoized_parser
+
 def _auto_num_classes(df: pd.DataFrame, override: Optional[int] = None) -> int:
     """Αυτόματος υπολογισμός αριθμού τμημάτων (25 μαθητές/τμήμα, min=2)."""
     import math
@@ -40,6 +46,7 @@ def _is_no(x: Any) -> bool:
     """Έλεγχος αν η τιμή είναι 'όχι'."""
     return _norm_str(x) in NO_TOKENS
 
+@memoized_parser
 def _parse_list_cell(x: Any) -> List[str]:
     """Parsing λίστας από διάφορα formats (string, list, κ.ά.)."""
     if isinstance(x, list):
@@ -76,27 +83,62 @@ def _get_class_labels(df: pd.DataFrame, scenario_col: str) -> List[str]:
                    if re.match(r"^Α\d+$", str(v))])
     return labs or [f"Α{i+1}" for i in range(2)]
 
-def _count_broken_pairs(df: pd.DataFrame, scenario_col: str) -> int:
-    """Δυναμικός υπολογισμός σπασμένων πλήρως αμοιβαίων φιλιών."""
-    by_class = dict(zip(df["ΟΝΟΜΑ"].astype(str).str.strip(), df[scenario_col].astype(str)))
-    broken = set()
-    
-    for _, r in df.iterrows():
-        if not _is_yes(r.get("ΠΛΗΡΩΣ_ΑΜΟΙΒΑΙΑ", False)):
+def _good_greek_flags(df: pd.DataFrame) -> np.ndarray:
+    """Διανυσματικό _is_good_greek για όλες τις γραμμές."""
+    if "ΚΑΛΗ_ΓΝΩΣΗ_ΕΛΛΗΝΙΚΩΝ" in df.columns:
+        return df["ΚΑΛΗ_ΓΝΩΣΗ_ΕΛΛΗΝΙΚΩΝ"].map(_is_yes).to_numpy(dtype=bool)
+    if "ΓΝΩΣΗ_ΕΛΛΗΝΙΚΩΝ" in df.columns:
+        return df["ΓΝΩΣΗ_ΕΛΛΗΝΙΚΩΝ"].map(_norm_str).isin({"ΚΑΛΗ", "GOOD", "Ν"}).to_numpy(dtype=bool)
+    return np.zeros(len(df), dtype=bool)
+
+# Cache ρόστερ -> ζεύγη πλήρως αμοιβαίων φίλων: τα σενάρια ίδιου ρόστερ μοιράζονται το ευρετήριο
+_PAIRS_CACHE_SIZE = 4
+_PAIRS_CACHE: "OrderedDict[tuple, Tuple[Tuple[str, str], ...]]" = OrderedDict()
+
+def _fully_mutual_pairs(df: pd.DataFrame) -> Tuple[Tuple[str, str], ...]:
+    """
+    Ζεύγη (me, fr), me < fr, όπου ο me (ΠΛΗΡΩΣ_ΑΜΟΙΒΑΙΑ=Ν) δηλώνει τον fr στους ΦΙΛΟΥΣ
+    και ο fr (πρώτη γραμμή με αυτό το όνομα) έχει επίσης ΠΛΗΡΩΣ_ΑΜΟΙΒΑΙΑ=Ν.
+    Εξαρτάται μόνο από το ρόστερ, όχι από τη στήλη σεναρίου.
+    """
+    if "ΠΛΗΡΩΣ_ΑΜΟΙΒΑΙΑ" not in df.columns or "ΦΙΛΟΙ" not in df.columns:
+        return ()
+    names = tuple(df["ΟΝΟΜΑ"].astype(str).str.strip())
+    flags = tuple(df["ΠΛΗΡΩΣ_ΑΜΟΙΒΑΙΑ"].map(_is_yes))
+    cells = tuple(df["ΦΙΛΟΙ"].astype(str))
+    key = (names, flags, cells)
+    hit = _PAIRS_CACHE.get(key)
+    if hit is not None:
+        _PAIRS_CACHE.move_to_end(key)
+        return hit
+
+    first_flag: Dict[str, bool] = {}
+    for name, flag in zip(names, flags):
+        first_flag.setdefault(name, flag)
+    pairs = set()
+    for me, flag, cell in zip(names, flags, df["ΦΙΛΟΙ"].tolist()):
+        if not flag:
             continue
-            
-        me = str(r["ΟΝΟΜΑ"]).strip()
-        c_me = by_class.get(me)
-        
-        for fr in _parse_list_cell(r.get("ΦΙΛΟΙ", [])):
-            if me < fr:  # Αποφυγή διπλής καταμέτρησης
-                friend_row = df[df["ΟΝΟΜΑ"].astype(str).str.strip() == fr]
-                if not friend_row.empty and _is_yes(friend_row.iloc[0].get("ΠΛΗΡΩΣ_ΑΜΟΙΒΑΙΑ", False)):
-                    c_fr = by_class.get(fr)
-                    if pd.notna(c_me) and pd.notna(c_fr) and c_me != c_fr:
-                        broken.add((me, fr))
-    
-    return len(broken)
+        for fr in _parse_list_cell(cell):
+            if me < fr and first_flag.get(fr, False):
+                pairs.add((me, fr))
+    hit = tuple(sorted(pairs))
+    _PAIRS_CACHE[key] = hit
+    if len(_PAIRS_CACHE) > _PAIRS_CACHE_SIZE:
+        _PAIRS_CACHE.popitem(last=False)
+    return hit
+
+def _count_broken_pairs(df: pd.DataFrame, scenario_col: str) -> int:
+    """Δυναμικός υπολογισμός σπασμένων πλήρως αμοιβαίων φιλιών (από το ευρετήριο ζευγών)."""
+    pairs = _fully_mutual_pairs(df)
+    if not pairs:
+        return 0
+    # Τελευταία εμφάνιση κάθε ονόματος -> τμήμα ως string (μη τοποθετημένος = "nan", όπως πριν)
+    by_class = pd.Series(df[scenario_col].astype(str).to_numpy(),
+                         index=df["ΟΝΟΜΑ"].astype(str).str.strip().to_numpy())
+    by_class = by_class[~by_class.index.duplicated(keep="last")]
+    a, b = zip(*pairs)
+    return int((by_class.reindex(list(a)).to_numpy() != by_class.reindex(list(b)).to_numpy()).sum())
 
 def calculate_penalty_score(df: pd.DataFrame, scenario_col: str, 
                           num_classes: Optional[int] = None) -> int:
@@ -106,44 +148,18 @@ def calculate_penalty_score(df: pd.DataFrame, scenario_col: str,
     - Πληθυσμός: +1 για κάθε διαφορά > 1  
     - Φύλο: +1 για κάθε διαφορά > 1 (αγόρια ή κορίτσια)
     - Σπασμένη Φιλία: +5 για κάθε σπασμένη πλήρως αμοιβαία φιλία
+
+    Όλα τα πλήθη ανά τμήμα υπολογίζονται με ένα groupby (class_balance.class_tallies).
     """
     labs = _get_class_labels(df, scenario_col)
     if num_classes is None:
         num_classes = _auto_num_classes(df, None)
 
-    penalty = 0
-
-    # 1. Ισορροπία Γνώσης Ελληνικών
-    greek_counts = []
-    for lab in labs:
-        sub = df[df[scenario_col] == lab].copy()
-        greek_counts.append(int(sub.apply(_is_good_greek, axis=1).sum()))
-    
-    if greek_counts:
-        greek_diff = max(greek_counts) - min(greek_counts)
-        penalty += max(0, greek_diff - 2)  # +1 για κάθε διαφορά > 2
-
-    # 2. Ισορροπία Πληθυσμού  
-    class_sizes = [int((df[scenario_col] == lab).sum()) for lab in labs]
-    if class_sizes:
-        pop_diff = max(class_sizes) - min(class_sizes)
-        penalty += max(0, pop_diff - 1)  # +1 για κάθε διαφορά > 1
-
-    # 3. Ισορροπία Φύλου
-    boys_counts = [int(((df[scenario_col] == lab) & 
-                       (df["ΦΥΛΟ"].astype(str).str.upper() == "Α")).sum()) 
-                   for lab in labs]
-    girls_counts = [int(((df[scenario_col] == lab) & 
-                        (df["ΦΥΛΟ"].astype(str).str.upper() == "Κ")).sum()) 
-                    for lab in labs]
-    
-    if boys_counts:
-        boys_diff = max(boys_counts) - min(boys_counts)
-        penalty += max(0, boys_diff - 1)  # +1 για κάθε διαφορά > 1
-    
-    if girls_counts:
-        girls_diff = max(girls_counts) - min(girls_counts)
-        penalty += max(0, girls_diff - 1)  # +1 για κάθε διαφορά > 1
+    tallies = class_tallies(df, scenario_col, labs, good=_good_greek_flags(df))
+    penalty = (spread_penalty(tallies["good"], 2)      # 1. Ισορροπία Γνώσης Ελληνικών
+               + spread_penalty(tallies["total"], 1)   # 2. Ισορροπία Πληθυσμού
+               + spread_penalty(tallies["boys"], 1)    # 3. Ισορροπία Φύλου
+               + spread_penalty(tallies["girls"], 1))
 
     # 4. Σπασμένες Πλήρως Αμοιβαίες Φιλίες
     if "ΣΠΑΣΜΕΝΗ_ΦΙΛΙΑ" in df.columns:
@@ -155,8 +171,105 @@ def calculate_penalty_score(df: pd.DataFrame, scenario_col: str,
 
     return penalty
 
+STEP5_MODES = ("greedy", "beam")
+STEP5_BEAM_WIDTH = 8
+STEP5_CLASS_CAP = 25
+# Επιτρεπτή διαφορά (max − min) ανά κριτήριο, όπως στο calculate_penalty_score:
+# πληθυσμός, αγόρια, κορίτσια, καλή γνώση ελληνικών
+_STEP5_ALLOWED = np.array([1, 1, 1, 2], dtype=np.int64)
+
+def _spread_stats(counts: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """(max, min, πλήθος τμημάτων στο min) ανά κριτήριο για πίνακα πληθών 4 × K."""
+    lo = counts.min(axis=1)
+    return counts.max(axis=1), lo, (counts == lo[:, None]).sum(axis=1)
+
+def _beam_step5_choices(counts0: np.ndarray, increments: np.ndarray,
+                        beam_width: int, cap: int = STEP5_CLASS_CAP) -> List[List[int]]:
+    """
+    Beam search για τη σειρά τοποθέτησης του Βήματος 5.
+
+    counts0: πλήθη 4 × K (σύνολο, αγόρια, κορίτσια, καλή γνώση) πριν το Βήμα 5
+    increments: m × 4, τι προσθέτει κάθε μαθητής (με τη σειρά τοποθέτησης)
+    Κρατά τις beam_width καλύτερες μερικές αναθέσεις. Κάθε επέκταση βαθμολογείται σε O(1)
+    ανά κριτήριο από (max, min, πλήθος στο min) του γονέα, άρα κάθε βήμα κοστίζει
+    O(beam_width × K). Τμήματα με ίδια στήλη πληθών δίνουν ισοδύναμες επεκτάσεις και
+    δοκιμάζεται μόνο το πρώτο. Επιστρέφει, για κάθε τελική κατάσταση, τον δείκτη τμήματος
+    ανά μαθητή (−1 = όλα τα τμήματα γεμάτα).
+    """
+    beam = [(counts0, *_spread_stats(counts0), None)]
+    for inc in increments:
+        grows = inc.astype(bool)[:, None]
+        children = []
+        for rank, (counts, hi, lo, nlo, _trail) in enumerate(beam):
+            _, first = np.unique(counts.T, axis=0, return_index=True)
+            ks = np.sort(first)
+            ks = ks[counts[0, ks] < cap]
+            if ks.size == 0:
+                spread = hi - lo
+                children.append((int(np.maximum(spread - _STEP5_ALLOWED, 0).sum()), int(spread.sum()), rank, -1))
+                continue
+            col = counts[:, ks]
+            new_hi = np.maximum(hi[:, None], col + inc[:, None])
+            new_lo = lo[:, None] + (grows & (col == lo[:, None]) & (nlo[:, None] == 1))
+            spread = new_hi - new_lo
+            pen = np.maximum(spread - _STEP5_ALLOWED[:, None], 0).sum(axis=0)
+            raw = spread.sum(axis=0)
+            children.extend(zip(pen.tolist(), raw.tolist(), [rank] * ks.size, ks.tolist()))
+        children.sort()
+
+        next_beam, seen = [], set()
+        for _pen, _raw, rank, k in children:
+            counts, *_stats, trail = beam[rank]
+            if k >= 0:
+                counts = counts.copy()
+                counts[:, k] += inc
+            key = counts.tobytes()
+            if key in seen:
+                continue
+            seen.add(key)
+            next_beam.append((counts, *_spread_stats(counts), (k, trail)))
+            if len(next_beam) >= beam_width:
+                break
+        beam = next_beam
+
+    out = []
+    for *_state, trail in beam:
+        ks = []
+        while trail is not None:
+            k, trail = trail
+            ks.append(k)
+        out.append(ks[::-1])
+    return out
+
+def _beam_step5_columns(df: pd.DataFrame, scenario_col: str, labs: List[str],
+                        positions: np.ndarray, beam_width: int) -> List[np.ndarray]:
+    """Υποψήφιες στήλες σεναρίου από το beam search (μία ανά τελική κατάσταση), ανά γραμμή."""
+    current = df[scenario_col].to_numpy(dtype=object)
+    tallies = class_tallies(df, scenario_col, labs, good=_good_greek_flags(df))
+    counts0 = tallies[["total", "boys", "girls", "good"]].to_numpy(dtype=np.int64).T.copy()
+    gender = df["ΦΥΛΟ"].astype(str).str.upper().to_numpy()
+    good = _good_greek_flags(df)
+    increments = np.column_stack([
+        np.ones(len(positions), dtype=np.int64),
+        (gender[positions] == "Α").astype(np.int64),
+        (gender[positions] == "Κ").astype(np.int64),
+        good[positions].astype(np.int64),
+    ]) if len(positions) else np.zeros((0, 4), dtype=np.int64)
+
+    columns = []
+    for choice in _beam_step5_choices(counts0, increments, beam_width):
+        col = current.copy()
+        for pos, k in zip(positions, choice):
+            if k >= 0:
+                col[pos] = labs[k]
+        columns.append(col)
+    return columns
+
 def step5_place_remaining_students(df: pd.DataFrame, scenario_col: str, 
-                                 num_classes: Optional[int] = None) -> Tuple[pd.DataFrame, int]:
+                                 num_classes: Optional[int] = None,
+                                 mode: str = "greedy",
+                                 beam_width: int = STEP5_BEAM_WIDTH,
+                                 rng: Optional[random.Random] = None) -> Tuple[pd.DataFrame, int]:
     """
     Βήμα 5: Τοποθέτηση υπολοίπων μαθητών χωρίς (πλήρως αμοιβαίες) φιλίες.
     
@@ -164,7 +277,19 @@ def step5_place_remaining_students(df: pd.DataFrame, scenario_col: str,
     1. Τμήμα με μικρότερο πληθυσμό (< 25 μαθητές)
     2. Σε ισοπαλία: προτίμηση όσων κρατούν διαφορά πληθυσμού ≤2
     3. Σε ισοπαλία: καλύτερη ισορροπία φύλου σε ΌΛΑ τα τμήματα
+
+    mode="beam": επιπλέον beam search (πλάτος beam_width) με τη μερική βαθμολογία του
+    penalty από τα τρέχοντα πλήθη. Κρατιέται η λύση του beam μόνο αν έχει αυστηρά
+    μικρότερο calculate_penalty_score από την greedy, άρα ποτέ δεν είναι χειρότερη.
+    Στο beam κάθε γραμμή τοποθετείται μόνη της (όχι όλες οι γραμμές με ίδιο ΟΝΟΜΑ).
+
+    rng: πηγή τυχαιότητας για τις ισοπαλίες (π.χ. random.Random(seed))· αν λείπει,
+    χρησιμοποιείται το module random όπως πριν.
     """
+    if mode not in STEP5_MODES:
+        raise ValueError(f"Άγνωστο mode: {mode} (επιτρέπονται: {STEP5_MODES})")
+    if rng is None:
+        rng = random
     df = df.copy()
     labs = _get_class_labels(df, scenario_col)
     if num_classes is None:
@@ -186,88 +311,162 @@ def step5_place_remaining_students(df: pd.DataFrame, scenario_col: str,
          (broken_friendship))            # Σπασμένες φιλίες
     )
 
-    remaining_students = df[mask_step5].copy()
+    beam_columns = []
+    if mode == "beam":
+        # Ευθυγράμμιση με το df.index, όπως κάνει το .loc με boolean Series
+        aligned = mask_step5 if mask_step5.index.equals(df.index) else mask_step5.reindex(df.index)
+        positions = np.flatnonzero(aligned.fillna(False).to_numpy(dtype=bool))
+        beam_columns = _beam_step5_columns(df, scenario_col, labs, positions, beam_width)
+
+    # Τρέχοντα πλήθη ανά τμήμα (σύνολο, αγόρια, κορίτσια): μετρώνται μία φορά και
+    # ενημερώνονται σε κάθε τοποθέτηση, αντί για σάρωση όλης της στήλης ανά μαθητή.
+    assigned = df[scenario_col].to_numpy(dtype=object, copy=True)
+    gender_col = df["ΦΥΛΟ"].astype(str).str.upper().to_numpy()
+    slot = {lab: k for k, lab in enumerate(labs)}
+    sizes = [0] * len(labs)
+    boys = [0] * len(labs)
+    girls = [0] * len(labs)
+
+    def _tally(pos: int, step: int) -> None:
+        k = slot.get(assigned[pos]) if isinstance(assigned[pos], str) else None
+        if k is None:
+            return
+        sizes[k] += step
+        if gender_col[pos] == "Α":
+            boys[k] += step
+        elif gender_col[pos] == "Κ":
+            girls[k] += step
+
+    for pos in range(len(df)):
+        _tally(pos, 1)
+
+    # Γραμμές ανά ΟΝΟΜΑ (ίδια αντιστοίχιση με το df["ΟΝΟΜΑ"] == name)
+    rows_by_name: Dict[str, List[int]] = {}
+    for pos, raw in enumerate(df["ΟΝΟΜΑ"].tolist()):
+        if isinstance(raw, str):
+            rows_by_name.setdefault(raw, []).append(pos)
+
+    remaining_students = df.loc[mask_step5, ["ΟΝΟΜΑ", "ΦΥΛΟ"]]
+    placed = np.zeros(len(df), dtype=bool)
 
     # Διαδοχική τοποθέτηση κάθε μαθητή
-    for _, row in remaining_students.iterrows():
-        name = str(row["ΟΝΟΜΑ"]).strip()
-        gender = str(row["ΦΥΛΟ"]).strip().upper()
+    for raw_name, raw_gender in zip(remaining_students["ΟΝΟΜΑ"].tolist(),
+                                    remaining_students["ΦΥΛΟ"].tolist()):
+        name = str(raw_name).strip()
+        gender = str(raw_gender).strip().upper()
 
         # 1. Εύρεση διαθέσιμων τμημάτων με ελάχιστο πληθυσμό
-        class_sizes = {lab: int((df[scenario_col] == lab).sum()) for lab in labs}
-        min_size = min(class_sizes.values())
-        available_classes = [lab for lab, size in class_sizes.items() 
-                           if size == min_size and size < 25]
-        
-        if not available_classes:
+        min_size = min(sizes)
+        available = [k for k, size in enumerate(sizes) if size == min_size and size < STEP5_CLASS_CAP]
+
+        if not available:
             continue  # Όλα τα τμήματα γεμάτα
 
-        if len(available_classes) == 1:
-            chosen_class = available_classes[0]
+        if len(available) == 1:
+            chosen = available[0]
         else:
             # 2. Προτίμηση υποψηφίων που κρατούν διαφορά πληθυσμού ≤2
             candidates_with_pop_diff = []
-            for candidate in available_classes:
-                new_sizes = {lab: int((df[scenario_col] == lab).sum()) + (1 if lab == candidate else 0)
-                           for lab in labs}
-                pop_diff = max(new_sizes.values()) - min(new_sizes.values())
-                candidates_with_pop_diff.append((candidate, pop_diff))
-            
+            for k in available:
+                new_sizes = sizes.copy()
+                new_sizes[k] += 1
+                candidates_with_pop_diff.append((k, max(new_sizes) - min(new_sizes)))
+
             # Φιλτράρισμα: προτίμηση όσων κρατούν pop_diff ≤ 2
             preferred_pool = [c for c, d in candidates_with_pop_diff if d <= 2]
             pool = preferred_pool if preferred_pool else [c for c, _ in candidates_with_pop_diff]
-            
+
             if len(pool) == 1:
-                chosen_class = pool[0]
+                chosen = pool[0]
             else:
-                # 3. Ισορροπία φύλου - υπολογισμός για ΌΛΑ τα τμήματα
+                # 3. Ισορροπία φύλου σε ΌΛΑ τα τμήματα, από τα τρέχοντα πλήθη
                 best_score = float('inf')
                 best_classes = []
-                
-                for candidate in pool:
-                    # Προσομοίωση προσθήκης μαθητή στο candidate τμήμα
-                    boys_counts = []
-                    girls_counts = []
-                    
-                    for lab in labs:
-                        boys_in_class = int(((df[scenario_col] == lab) & 
-                                           (df["ΦΥΛΟ"].astype(str).str.upper() == "Α")).sum())
-                        girls_in_class = int(((df[scenario_col] == lab) & 
-                                            (df["ΦΥΛΟ"].astype(str).str.upper() == "Κ")).sum())
-                        
-                        # Προσθήκη μαθητή στο candidate
-                        if lab == candidate:
-                            if gender == "Α":
-                                boys_in_class += 1
-                            elif gender == "Κ":
-                                girls_in_class += 1
-                        
-                        boys_counts.append(boys_in_class)
-                        girls_counts.append(girls_in_class)
-                    
-                    # Υπολογισμός διαφοράς φύλου
-                    boys_diff = max(boys_counts) - min(boys_counts) if boys_counts else 0
-                    girls_diff = max(girls_counts) - min(girls_counts) if girls_counts else 0
-                    total_gender_diff = boys_diff + girls_diff
-                    
+
+                for k in pool:
+                    boys_counts, girls_counts = boys.copy(), girls.copy()
+                    if gender == "Α":
+                        boys_counts[k] += 1
+                    elif gender == "Κ":
+                        girls_counts[k] += 1
+                    total_gender_diff = ((max(boys_counts) - min(boys_counts))
+                                         + (max(girls_counts) - min(girls_counts)))
+
                     if total_gender_diff < best_score:
                         best_score = total_gender_diff
-                        best_classes = [candidate]
+                        best_classes = [k]
                     elif total_gender_diff == best_score:
-                        best_classes.append(candidate)
-                
-                # Τυχαία επιλογή σε ισοπαλία
-                chosen_class = random.choice(best_classes)
+                        best_classes.append(k)
 
-        # Τοποθέτηση μαθητή
-        df.loc[df["ΟΝΟΜΑ"] == name, scenario_col] = chosen_class
-
-    return df, calculate_penalty_score(df, scenario_col, num_classes)
+                # Τυχαία επιλογή σε ισοπαλία
+                chosen = rng.choice(best_classes)
+
+        # Τοποθέτηση μαθητή (όλες οι γραμμές με αυτό το ΟΝΟΜΑ, όπως πριν)
+        for pos in rows_by_name.get(name, ()):
+            _tally(pos, -1)
+            assigned[pos] = labs[chosen]
+            _tally(pos, 1)
+            placed[pos] = True
+
+    # Μία μαζική εγγραφή των τοποθετήσεων
+    if placed.any():
+        df.loc[placed, scenario_col] = assigned[placed]
+
+    penalty = calculate_penalty_score(df, scenario_col, num_classes)
+    for col in beam_columns:
+        trial = df.copy()
+        trial[scenario_col] = col
+        trial_penalty = calculate_penalty_score(trial, scenario_col, num_classes)
+        if trial_penalty < penalty:
+            df, penalty = trial, trial_penalty
+    return df, penalty
+
+def _scenario_seed(random_seed: int, scenario_name: str) -> int:
+    """Seed ανά σενάριο από random_seed + όνομα σεναρίου (ανεξάρτητο από σειρά/worker)."""
+    return (int(random_seed) * 1_000_003 + zlib.crc32(str(scenario_name).encode("utf-8"))) % (2**32)
+
+def _step5_scenario_task(task: Tuple[str, pd.DataFrame, str, Optional[int], Optional[int], str, int]):
+    """
+    Worker: (όνομα, df, στήλη, num_classes, seed, mode, beam_width) -> (όνομα, penalty, στήλη ως array, σφάλμα).
+    Επιστρέφει μόνο τη στήλη τοποθετήσεων, όχι ολόκληρο το DataFrame. Top-level ώστε να γίνεται pickle.
+    Με seed=None χρησιμοποιείται η τρέχουσα κατάσταση του random (σειριακή εκτέλεση),
+    αλλιώς ένα τοπικό random.Random(seed), χωρίς να αλλάζει η global κατάσταση.
+    """
+    name, df, scenario_col, num_classes, seed, mode, beam_width = task
+    rng = random.Random(seed) if seed is not None else None
+    try:
+        updated_df, score = step5_place_remaining_students(df, scenario_col, num_classes,
+                                                           mode=mode, beam_width=beam_width, rng=rng)
+        return name, score, updated_df[scenario_col].to_numpy(), None
+    except Exception as e:
+        return name, None, None, e
+
+def _run_step5_tasks(tasks: List[Tuple[str, pd.DataFrame, str, Optional[int], Optional[int], str, int]],
+                     workers: Optional[int] = None) -> list:
+    """Βήμα 5 ανά σενάριο: σειριακά (workers None/1) ή σε process pool· τα αποτελέσματα με τη σειρά των tasks."""
+    if workers is not None and workers > 1 and len(tasks) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as ex:
+            return list(ex.map(_step5_scenario_task, tasks))
+    return [_step5_scenario_task(t) for t in tasks]
 
 def apply_step5_to_all_scenarios(scenarios_dict: Dict[str, pd.DataFrame], 
-                               scenario_col: str, num_classes: Optional[int] = None) -> Tuple[pd.DataFrame, int, str]:
+                               scenario_col: str, num_classes: Optional[int] = None,
+                               workers: Optional[int] = None,
+                               random_seed: Optional[int] = None,
+                               mode: str = "greedy",
+                               beam_width: int = STEP5_BEAM_WIDTH) -> Tuple[pd.DataFrame, int, str]:
     """
     Εφαρμογή Βήματος 5 σε όλα τα σενάρια και επιλογή του βέλτιστου.
+
+    Κάθε σενάριο επιστρέφει μόνο (penalty, στήλη τοποθετήσεων)· το DataFrame
+    ξαναχτίζεται μόνο για το σενάριο που επιλέγεται.
+
+    workers: None = σειριακά με το τρέχον random (όπως πριν). Με ακέραιο, τα σενάρια
+             τρέχουν σε process pool (workers > 1) και κάθε σενάριο παίρνει δικό του
+             ντετερμινιστικό seed από random_seed + όνομα σεναρίου, ώστε το αποτέλεσμα
+             να μην εξαρτάται από τον αριθμό workers.
+    random_seed: βάση των seeds ανά σενάριο· αν λείπει, αντλείται από το random.
+    mode / beam_width: όπως στο step5_place_remaining_students.
     
     Returns:
         Tuple[pd.DataFrame, int, str]: Το σενάριο με το χαμηλότερο penalty score, 
@@ -275,16 +474,25 @@ def apply_step5_to_all_scenarios(scenarios_dict: Dict[str, pd.DataFrame],
     """
     if not scenarios_dict:
         raise ValueError("Δεν δόθηκαν σενάρια προς επεξεργασία")
-    
+    if mode not in STEP5_MODES:
+        raise ValueError(f"Άγνωστο mode: {mode} (επιτρέπονται: {STEP5_MODES})")
+
+    if workers is None and random_seed is None:
+        seeds = {name: None for name in scenarios_dict}
+        tie_rng = random
+    else:
+        base = random_seed if random_seed is not None else random.getrandbits(32)
+        seeds = {name: _scenario_seed(base, name) for name in scenarios_dict}
+        tie_rng = random.Random(base)
+    tasks = [(name, scenario_df, scenario_col, num_classes, seeds[name], mode, beam_width)
+             for name, scenario_df in scenarios_dict.items()]
+
     results = {}
-    for scenario_name, scenario_df in scenarios_dict.items():
-        try:
-            updated_df, score = step5_place_remaining_students(
-                scenario_df, scenario_col, num_classes)
-            results[scenario_name] = {"df": updated_df, "penalty_score": score}
-        except Exception as e:
-            print(f"Σφάλμα στο σενάριο {scenario_name}: {e}")
+    for scenario_name, score, assignment, error in _run_step5_tasks(tasks, workers):
+        if error is not None:
+            print(f"Σφάλμα στο σενάριο {scenario_name}: {error}")
             continue
+        results[scenario_name] = {"assignment": assignment, "penalty_score": score}
 
     if not results:
         raise ValueError("Κανένα σενάριο δεν επεξεργάστηκε επιτυχώς")
@@ -294,10 +502,14 @@ def apply_step5_to_all_scenarios(scenarios_dict: Dict[str, pd.DataFrame],
     best_scenarios = [k for k, v in results.items() if v["penalty_score"] == min_score]
     
     # Τυχαία επιλογή σε ισοβαθμία
-    chosen_scenario = random.choice(best_scenarios)
+    chosen_scenario = tie_rng.choice(best_scenarios)
+
+    # Ανακατασκευή μόνο του νικητή: ίδιο df με τη στήλη του Βήματος 5
+    best_df = scenarios_dict[chosen_scenario].copy()
+    best_df[scenario_col] = results[chosen_scenario]["assignment"]
     
     print(f"Επιλέχθηκε σενάριο: {chosen_scenario} με penalty score: {min_score}")
-    return results[chosen_scenario]["df"], results[chosen_scenario]["penalty_score"], chosen_scenario
+    return best_df, min_score, chosen_scenario
 
 
 # Compatibility aliases για backward compatibility
@@ -143,19 +143,21 @@ def _metrics(df: pd.DataFrame, class_col: str, gender_col: str, lang_col: str, g
         "broken_friendships_per_class": broken_per_class
     }
 
-def penalty_score(df: pd.DataFrame, class_col: str, gender_col: str, lang_col: str) -> int:
+def _penalty_from_deltas(d: Dict[str, int]) -> int:
     """
-    Υπολογίζει penalty score σύμφωνα με τις προδιαγραφές:
+    Penalty score από τις διαφορές max−min (deltas του _metrics):
     - Πληθυσμός: +3 * max(0, Δπληθ - 1)
     - Γλώσσα:    +1 * max(0, Δγλώσσας - 2)
     - Φύλο:      +2 * (max(0, Δαγοριών-1) + max(0, Δκοριτσιών-1))
     """
+    boys_over = max(0, d["boys"] - 1)
+    girls_over = max(0, d["girls"] - 1)
+    return 3 * max(0, d["pop"] - 1) + 1 * max(0, d["lang"] - 2) + 2 * (boys_over + girls_over)
+
+def penalty_score(df: pd.DataFrame, class_col: str, gender_col: str, lang_col: str) -> int:
+    """Υπολογίζει penalty score σύμφωνα με τις προδιαγραφές (βλ. _penalty_from_deltas)."""
     try:
-        M = _metrics(df, class_col, gender_col, lang_col)
-        d = M["deltas"]
-        boys_over = max(0, d["boys"] - 1)
-        girls_over = max(0, d["girls"] - 1)
-        return 3 * max(0, d["pop"] - 1) + 1 * max(0, d["lang"] - 2) + 2 * (boys_over + girls_over)
+        return _penalty_from_deltas(_metrics(df, class_col, gender_col, lang_col)["deltas"])
     except Exception as e:
         print(f"Warning: penalty_score calculation failed: {e}")
         return 9999
@@ -359,6 +361,121 @@ def _check_friendship_constraints(df_before: pd.DataFrame, df_after: pd.DataFram
         print(f"Warning: Error checking friendship constraints: {e}")
         return False
 
+# --------------------------
+# Delta Evaluation
+# --------------------------
+class Step6Evaluator:
+    """
+    Αξιολόγηση υποψήφιων ανταλλαγών χωρίς αντίγραφο του DataFrame.
+
+    Κρατά μετρητές ανά τμήμα (σύνολο, αγόρια, κορίτσια, καλή γνώση και ένας ανά
+    προστατευόμενη στήλη), τα πλήθη της baseline για τις προστατευόμενες στήλες και τα
+    μέλη κάθε ομάδας (GROUP_ID). Μια ανταλλαγή αλλάζει μόνο τα τμήματα και τις ομάδες των
+    μαθητών που μετακινούνται, άρα οι έλεγχοι γίνονται με delta O(|moved|) και οι
+    αποκλίσεις σε O(τμήματα). Ίδια σημασιολογία με _apply_swap + _check_size_ok +
+    _check_protected_constraints + _check_friendship_constraints + _metrics/penalty_score.
+    """
+
+    def __init__(self, df: pd.DataFrame, df_baseline: pd.DataFrame, class_col: str,
+                 gender_col: str, lang_col: str, group_col: str):
+        n = len(df)
+        self.cls = df[class_col].to_numpy(dtype=object)
+        self.pos_of: Dict[Any, List[int]] = {}
+        for p, rid in enumerate(df[_IDCOL].tolist()):
+            self.pos_of.setdefault(rid, []).append(p)
+
+        # Στήλες μετρητών: 0 σύνολο, 1 αγόρια, 2 κορίτσια, 3 καλή γνώση, 4.. προστατευόμενες
+        self.protected = [c for c in PROTECTED_COLS if c in df_baseline.columns and c in df.columns]
+        flags = [np.ones(n, dtype=bool), (df[gender_col] == BOY).to_numpy(), (df[gender_col] == GIRL).to_numpy(),
+                 (df[lang_col] == GOOD).to_numpy()] + [(df[c] == GOOD).to_numpy() for c in self.protected]
+        self.flags = np.column_stack(flags).astype(np.int64)
+
+        placed = df[class_col].notna().to_numpy()
+        sums = pd.DataFrame(self.flags[placed]).groupby(self.cls[placed], sort=False).sum()
+        self.counts: Dict[Any, np.ndarray] = {c: row.to_numpy(dtype=np.int64) for c, row in sums.iterrows()}
+        self.over_cap = {c for c, v in self.counts.items() if v[0] > MAX_PER_CLASS}
+
+        # Baseline ανά προστατευόμενη κατηγορία (σταθερή για όλους τους υποψηφίους)
+        self.baseline: List[Dict[Any, int]] = []
+        for col_name in self.protected:
+            baseline_class_col = _find_baseline_col_for_category(df_baseline, col_name)
+            if baseline_class_col is None:
+                print(f"Warning: No baseline found for {col_name}, using current class column")
+                baseline_class_col = class_col
+            self.baseline.append(df_baseline.groupby(baseline_class_col)[col_name].apply(
+                lambda x: (x == GOOD).sum()).to_dict())
+        self.mismatched = {(j, c) for j, base in enumerate(self.baseline)
+                           for c in set(base) | set(self.counts)
+                           if base.get(c, 0) != self._count(c, 4 + j)}
+
+        # Ομάδες: μέλη (θέσεις) και αν είναι ήδη σπασμένες
+        self.group_of: Dict[int, Any] = {}
+        self.members: Dict[Any, np.ndarray] = {}
+        self.split: Dict[Any, bool] = {}
+        if group_col in df.columns:
+            grouped = np.flatnonzero(df[group_col].notna().to_numpy())
+            for gid, idx in df.iloc[grouped].groupby(group_col).indices.items():
+                members = grouped[idx]
+                self.members[gid] = members
+                self.split[gid] = len(set(self.cls[members])) > 1
+                for p in members:
+                    self.group_of[int(p)] = gid
+
+    def _count(self, c, j: int) -> int:
+        v = self.counts.get(c)
+        return int(v[j]) if v is not None else 0
+
+    def moves(self, fromA_ids: List, to_class_B, fromB_ids: List, to_class_A) -> Dict[int, Any]:
+        """Θέση -> νέο τμήμα, όπως στο _apply_swap (το fromB εφαρμόζεται δεύτερο)."""
+        out: Dict[int, Any] = {}
+        for ids, target in ((fromA_ids, to_class_B), (fromB_ids, to_class_A)):
+            for rid in ids:
+                for p in self.pos_of.get(rid, ()):
+                    out[p] = target
+        return out
+
+    def evaluate(self, fromA_ids: List, to_class_B, fromB_ids: List, to_class_A) -> Optional[Tuple[Dict[str, int], int]]:
+        """
+        (deltas, penalty) μετά την ανταλλαγή, ή None αν παραβιάζεται μέγεθος τμήματος,
+        απαραβίαστος περιορισμός ή κατάσταση ομάδας (σπασμένη/ενωμένη).
+        """
+        moves = self.moves(fromA_ids, to_class_B, fromB_ids, to_class_A)
+        delta: Dict[Any, np.ndarray] = {}
+        for p, new in moves.items():
+            old = self.cls[p]
+            if not pd.isna(old):
+                delta.setdefault(old, np.zeros(self.flags.shape[1], dtype=np.int64))
+                delta[old] -= self.flags[p]
+            delta.setdefault(new, np.zeros(self.flags.shape[1], dtype=np.int64))
+            delta[new] += self.flags[p]
+        after = {c: self.counts.get(c, 0) + d for c, d in delta.items()}
+
+        # 1. Μέγεθος τμημάτων
+        if any(v[0] > MAX_PER_CLASS for v in after.values()) or (self.over_cap - set(after)):
+            return None
+
+        # 2. Απαραβίαστοι περιορισμοί έναντι baseline (τα μη επηρεαζόμενα τμήματα μένουν ως έχουν)
+        if any(c not in after for _, c in self.mismatched):
+            return None
+        for c, v in after.items():
+            for j, base in enumerate(self.baseline):
+                if base.get(c, 0) != int(v[4 + j]):
+                    return None
+
+        # 3. Φιλίες: καμία ομάδα δεν αλλάζει κατάσταση (σπασμένη ↔ ενωμένη)
+        for gid in {self.group_of[p] for p in moves if p in self.group_of}:
+            classes = {moves.get(int(p), self.cls[p]) for p in self.members[gid]}
+            if (len(classes) > 1) != self.split[gid]:
+                return None
+
+        # 4. Αποκλίσεις και penalty (τμήματα με τουλάχιστον έναν μαθητή)
+        rows = [after.get(c, v) for c, v in self.counts.items()] + [v for c, v in after.items() if c not in self.counts]
+        M = np.array([v for v in rows if v[0] > 0], dtype=np.int64)
+        spread = M.max(axis=0) - M.min(axis=0)
+        d = dict(pop=int(spread[0]), boys=int(spread[1]), girls=int(spread[2]),
+                 gender=int(max(spread[1], spread[2])), lang=int(spread[3]))
+        return d, _penalty_from_deltas(d)
+
 # --------------------------
 # Swap Operations
 # --------------------------
@@ -422,34 +539,28 @@ def _rank_candidates(df_before: pd.DataFrame, df_baseline: pd.DataFrame,
     """
     Κατατάσσει υποψήφιες ανταλλαγές βάσει στόχου με πλήρεις ελέγχους συμμόρφωσης.
     ✅ ΔΙΟΡΘΩΣΗ: Περιλαμβάνει έλεγχο baseline constraints.
+
+    Κάθε υποψήφιος αξιολογείται με delta από τον Step6Evaluator (χωρίς αντίγραφο του df).
+    Επιστρέφει (fromA, classA, fromB, classB, reason, penalty μετά την ανταλλαγή).
     """
     base_M = _metrics(df_before, class_col, gender_col, lang_col)
     base_d = base_M["deltas"]
     base_pen = penalty_score(df_before, class_col, gender_col, lang_col)
     ranked = []
+    if not candidates:
+        return ranked
+
+    # Η αιτία εξαρτάται μόνο από την τρέχουσα κατάσταση και τον στόχο
+    reason = _determine_reason(df_before, class_col, gender_col, lang_col, objective)
+    evaluator = Step6Evaluator(df_before, df_baseline, class_col, gender_col, lang_col, group_col)
 
     for (fromA, classA, fromB, classB, base_reason) in candidates:
         try:
-            # Καθορισμός σωστής αιτίας
-            reason = _determine_reason(df_before, class_col, gender_col, lang_col, objective)
-            
-            tmp = _apply_swap(df_before, class_col, fromA, classB, fromB, classA, 
-                            reason, 9999, step_col=step_col, group_col=group_col)
-            
-            # 1. Έλεγχος μεγέθους τμημάτων
-            if not _check_size_ok(tmp, class_col):
-                continue
-                
-            # 2. ✅ ΔΙΟΡΘΩΣΗ: Έλεγχος απαραβίαστων περιορισμών με baseline ανά κατηγορία
-            if not _check_protected_constraints(df_baseline, tmp, class_col, step_col):
+            # 1–3. Μέγεθος τμημάτων, απαραβίαστοι περιορισμοί (baseline ανά κατηγορία), φιλίες
+            evaluated = evaluator.evaluate(fromA, classB, fromB, classA)
+            if evaluated is None:
                 continue
-                
-            # 3. Έλεγχος φιλιών (σπασμένες/επανενώσεις)
-            if not _check_friendship_constraints(df_before, tmp, class_col, group_col):
-                continue
-                
-            M = _metrics(tmp, class_col, gender_col, lang_col)
-            d = M["deltas"]
+            d, pen = evaluated
             
             # 4. Πληθυσμιακός έλεγχος (αυστηροποίηση)
             if d["pop"] > TARGET_POP_DIFF:
@@ -457,7 +568,6 @@ def _rank_candidates(df_before: pd.DataFrame, df_baseline: pd.DataFrame,
             if base_d["pop"] <= TARGET_POP_DIFF and d["pop"] > base_d["pop"]:
                 continue
 
-            pen = penalty_score(tmp, class_col, gender_col, lang_col)
             dlang_gain   = base_d["lang"]   - d["lang"]
             dgender_gain = base_d["gender"] - d["gender"]
             pen_gain     = base_pen - pen
@@ -476,14 +586,14 @@ def _rank_candidates(df_before: pd.DataFrame, df_baseline: pd.DataFrame,
             else:
                 key = (-dlang_gain, -dgender_gain, -pen_gain, len(fromA) + len(fromB))
                 
-            ranked.append((key, fromA, classA, fromB, classB, reason))
+            ranked.append((key, fromA, classA, fromB, classB, reason, pen))
             
         except Exception as e:
             print(f"Warning: Error evaluating candidate swap: {e}")
             continue
 
     ranked.sort(key=lambda x: x[0])
-    return [(fromA, classA, fromB, classB, reason) for _, fromA, classA, fromB, classB, reason in ranked]
+    return [entry[1:] for entry in ranked]
 
 # --------------------------
 # Candidate Generation
@@ -643,17 +753,13 @@ def _commit_best_swap_if_improves(df: pd.DataFrame, df_baseline: pd.DataFrame,
 
     base_penalty = penalty_score(df, class_col, gender_col, lang_col)
 
-    # Δοκιμή καλύτερης ανταλλαγής - ήδη φιλτραρισμένη από _rank_candidates
-    for (fromA, classA, fromB, classB, reason) in ranked:
+    # Η πρώτη (καλύτερη) ανταλλαγή που μειώνει το penalty εφαρμόζεται στο DataFrame.
+    # Όλοι οι έλεγχοι και το penalty έχουν ήδη υπολογιστεί στο _rank_candidates.
+    for (fromA, classA, fromB, classB, reason, new_penalty) in ranked:
+        if new_penalty >= base_penalty:
+            continue
         try:
-            tmp = _apply_swap(df, class_col, fromA, classB, fromB, classA, reason, swap_idx, step_col, group_col)
-            
-            # Όλοι οι έλεγχοι έχουν ήδη γίνει στο _rank_candidates
-            # Απλά ελέγχουμε τη βελτίωση penalty
-            new_penalty = penalty_score(tmp, class_col, gender_col, lang_col)
-            if new_penalty < base_penalty:
-                return tmp, True
-                
+            return _apply_swap(df, class_col, fromA, classB, fromB, classA, reason, swap_idx, step_col, group_col), True
         except Exception as e:
             print(f"Warning: Error applying swap: {e}")
             continue
@@ -20,6 +20,9 @@ import pandas as pd
 import numpy as np
 import re
 
+from conflict_penalty import ConflictCounts, conflict_kinds, pair_conflict_penalty
+from parse_cache import memoized_parser
+
 RANDOM_SEED = 42
 random.seed(RANDOM_SEED)
 
@@ -36,6 +39,7 @@ def _is_yes(x) -> bool:
 def _is_no(x) -> bool:
     return _norm_str(x) in NO_TOKENS
 
+@memoized_parser
 def _parse_friends_cell(x) -> List[str]:
     """Δέχεται λίστα ή string. Επιστρέφει λίστα ονομάτων (stripped)."""
     if isinstance(x, list):
@@ -116,33 +120,45 @@ def _pairwise_penalty(counts: Dict[str, int], free: int, weight: int) -> int:
                 penalty += (diff - free) * weight
     return penalty
 
-def _pair_conflict_penalty(aZ, aI, bZ, bI) -> int:
-    """Ποινή παιδαγωγικής σύγκρουσης ανά ζεύγος."""
-    if aI and bI: return 5
-    if (aI and bZ) or (bI and aZ): return 4
-    if aZ and bZ: return 3
-    return 0
+_pair_conflict_penalty = pair_conflict_penalty
+
+def _conflict_counts(df: pd.DataFrame, labels: List[Optional[str]]) -> ConflictCounts:
+    """Πλήθη Ζ/Ι ανά τμήμα (σημαίες με _is_yes)."""
+    flags = df.reindex(columns=['ΖΩΗΡΟΣ','ΙΔΙΑΙΤΕΡΟΤΗΤΑ']).fillna("")
+    kinds = conflict_kinds(flags['ΖΩΗΡΟΣ'].map(_is_yes).tolist(),
+                           flags['ΙΔΙΑΙΤΕΡΟΤΗΤΑ'].map(_is_yes).tolist())
+    return ConflictCounts(kinds, labels)
 
 def _class_conflict_sum(class_df: pd.DataFrame) -> int:
     """Συνολική ποινή συγκρούσεων ενός τμήματος."""
-    s = 0
-    rows = class_df[['ΖΩΗΡΟΣ','ΙΔΙΑΙΤΕΡΟΤΗΤΑ']].fillna("").to_dict('records')
-    for i in range(len(rows)):
-        for j in range(i+1, len(rows)):
-            a = rows[i]; b = rows[j]
-            aZ = _is_yes(a.get('ΖΩΗΡΟΣ')); aI = _is_yes(a.get('ΙΔΙΑΙΤΕΡΟΤΗΤΑ'))
-            bZ = _is_yes(b.get('ΖΩΗΡΟΣ')); bI = _is_yes(b.get('ΙΔΙΑΙΤΕΡΟΤΗΤΑ'))
-            s += _pair_conflict_penalty(aZ, aI, bZ, bI)
-    return s
+    return _conflict_counts(class_df, ["_"] * len(class_df)).total()
+
+def _scenario_labels(df: pd.DataFrame, scenario_col: str) -> List[Optional[str]]:
+    """Τμήμα ανά μαθητή (None αν δεν είναι έγκυρη ετικέτα Α<n>)."""
+    return [str(v) if (pd.notna(v) and re.match(r"^Α\d+$", str(v))) else None
+            for v in df[scenario_col].tolist()]
 
 def _all_conflicts_sum(df: pd.DataFrame, scenario_col: str) -> int:
     """Συνολική ποινή παιδαγωγικών συγκρούσεων."""
-    s = 0
-    for lab, class_df in df.groupby(scenario_col):
-        if not re.match(r"^Α\d+$", str(lab)):
-            continue
-        s += _class_conflict_sum(class_df)
-    return s
+    return _conflict_counts(df, _scenario_labels(df, scenario_col)).total()
+
+def _all_conflicts_sums(df: pd.DataFrame, scenario_cols: List[str]) -> Dict[str, int]:
+    """
+    Ποινή συγκρούσεων για κάθε σενάριο του ίδιου ρόστερ: τα πλήθη χτίζονται μία φορά και
+    κάθε επόμενο σενάριο προκύπτει με move() μόνο για τους μαθητές που άλλαξαν τμήμα.
+    """
+    cols = [c for c in scenario_cols if c in df.columns]
+    if not cols:
+        return {}
+    counts = _conflict_counts(df, _scenario_labels(df, cols[0]))
+    total = counts.total()
+    sums = {cols[0]: total}
+    for c in cols[1:]:
+        for idx, lab in enumerate(_scenario_labels(df, c)):
+            if lab != counts.labels[idx]:
+                total += counts.move(idx, lab)
+        sums[c] = total
+    return sums
 
 def _mutual_pairs(df: pd.DataFrame) -> List[Tuple[str,str]]:
     """Βρίσκει όλες τις *πλήρως αμοιβαίες* δυάδες από «ΦΙΛΟΙ»."""
@@ -185,8 +201,12 @@ def _broken_friendships_count(df: pd.DataFrame, scenario_col: str, critical_pair
 
 def score_one_scenario(df: pd.DataFrame, scenario_col: str, num_classes: Optional[int] = None,
                        critical_pairs: Optional[List[Tuple[str,str]]]=None,
-                       count_unassigned_as_broken: bool=False) -> Dict[str, Any]:
-    """Υπολογίζει αναλυτικό score για ένα σενάριο με σωστή λογική ζευγαριών."""
+                       count_unassigned_as_broken: bool=False,
+                       conflict_penalty: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Υπολογίζει αναλυτικό score για ένα σενάριο με σωστή λογική ζευγαριών.
+    conflict_penalty: προϋπολογισμένη ποινή συγκρούσεων (βλ. _all_conflicts_sums)· None = υπολογίζεται εδώ.
+    """
     df = df.copy()
     if num_classes is None:
         num_classes = _infer_num_classes_from_values(df[scenario_col].values)
@@ -236,7 +256,8 @@ def score_one_scenario(df: pd.DataFrame, scenario_col: str, num_classes: Optiona
         spread_perf1 = spread_perf3 = spread_perf2 = 0
         perf_pen = 0
     # 4) Παιδαγωγικές συγκρούσεις
-    conflict_penalty = _all_conflicts_sum(df, scenario_col)
+    if conflict_penalty is None:
+        conflict_penalty = _all_conflicts_sum(df, scenario_col)
 
     # 5) Σπασμένες φιλίες
     broken = _broken_friendships_count(df, scenario_col, critical_pairs, count_unassigned_as_broken)
@@ -293,11 +314,13 @@ def pick_best_scenario(df: pd.DataFrame, scenario_cols: List[str], num_classes:
     if num_classes is None:
         num_classes = _infer_num_classes_from_values(df[scenario_cols[0]].values)
 
+    conflict_sums = _all_conflicts_sums(df, scenario_cols)
     scores = []
     for c in scenario_cols:
         if c not in df.columns:
             continue
-        s = score_one_scenario(df, c, num_classes, critical_pairs, count_unassigned_as_broken)
+        s = score_one_scenario(df, c, num_classes, critical_pairs, count_unassigned_as_broken,
+                               conflict_penalty=conflict_sums[c])
         scores.append(s)
     if not scores:
         return {"best": None, "scores": []}
@@ -332,11 +355,12 @@ def pick_best_scenario(df: pd.DataFrame, scenario_cols: List[str], num_classes:
 
 def score_to_dataframe(df: pd.DataFrame, scenario_cols: List[str], **kwargs) -> pd.DataFrame:
     """Μετατρέπει scores σε DataFrame για εύκολη προβολή."""
+    conflict_sums = _all_conflicts_sums(df, scenario_cols)
     rows = []
     for c in scenario_cols:
         if c not in df.columns:
             continue
-        s = score_one_scenario(df, c, **kwargs)
+        s = score_one_scenario(df, c, conflict_penalty=conflict_sums[c], **kwargs)
         rows.append({
             "SCENARIO": c,
             "TOTAL": s["total_score"],
@@ -2,6 +2,9 @@
 from typing import List, Dict, Set, Optional
 import pandas as pd, re, ast
 
+from friend_graph import FriendGraph
+from parse_cache import memoized_parser
+
 # ✅ Βασικοί τίτλοι που κρατάμε σε κάθε minimal export
 CORE_COLUMNS_DEFAULT = [
     "ΟΝΟΜΑ", "ΦΥΛΟ", "ΖΩΗΡΟΣ", "ΙΔΙΑΙΤΕΡΟΤΗΤΑ",
@@ -50,6 +53,7 @@ def normalize_columns(df: pd.DataFrame) -> pd.DataFrame:
         df["ΟΝΟΜΑ"] = df["ΟΝΟΜΑ"].astype(str).str.strip()
     return df
 
+@memoized_parser
 def parse_friends_cell(x) -> List[str]:
     if isinstance(x, list):
         return [str(s).strip() for s in x if str(s).strip()]
@@ -86,15 +90,14 @@ def scope_step2(df: pd.DataFrame, step1_col: str) -> Set[str]:
             s.add(str(r.get("ΟΝΟΜΑ","")).strip())
     return s
 
-def mutual_pairs_in_scope(df: pd.DataFrame, scope: Set[str]):
+def friend_graph(df: pd.DataFrame) -> FriendGraph:
+    """FriendGraph του ρόστερ με τον parser του Βήματος 2 (χτίζεται μία φορά, ξαναχρησιμοποιείται)."""
+    return FriendGraph(df, parse_friends_cell)
+
+def mutual_pairs_in_scope(df: pd.DataFrame, scope: Set[str], graph: Optional[FriendGraph] = None):
     scope = {str(x).strip() for x in scope if str(x).strip()}
-    pairs = []
-    names = sorted(scope)
-    for i, a in enumerate(names):
-        for b in names[i+1:]:
-            if are_mutual_friends(df, a, b):
-                pairs.append((a,b))
-    return pairs
+    graph = graph if graph is not None else friend_graph(df)
+    return graph.mutual_pairs_within(scope)
 
 # --------- ΝΕΑ βοηθητικά για το minimal export ---------
 def extract_step1_id(step1_col_name: str) -> int:
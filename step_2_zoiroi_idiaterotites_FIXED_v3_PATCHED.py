@@ -6,9 +6,11 @@ Step 2 — Ζωηροί & Ιδιαιτερότητες (Fixed v3, patched)
 - Δεν δημιουργεί FINAL/audit στήλες. Μόνο τη στήλη ΒΗΜΑ2.
 """
 from typing import List, Dict, Tuple, Any, Set, Optional
+import numpy as np
 import pandas as pd
 import random
 import re
+import time
 
 def _auto_num_classes(df, override=None):
     import math
@@ -20,60 +22,13 @@ def _auto_num_classes(df, override=None):
 from step_2_helpers_FIXED import (
     normalize_columns, parse_friends_cell, scope_step2, mutual_pairs_in_scope
 )
+from conflict_penalty import (
+    class_conflict_pairs, class_conflict_sum, conflict_kinds
+)
 
 RANDOM_SEED = 42
 random.seed(RANDOM_SEED)
 
-def _pair_conflict_penalty(aZ, aI, bZ, bI) -> int:
-    if aI and bI: return 5
-    if (aI and bZ) or (bI and aZ): return 4
-    if aZ and bZ: return 3
-    return 0
-
-def _count_ped_conflicts(df: pd.DataFrame, col: str) -> int:
-    cnt = 0
-    by_class = {}
-    for _, r in df.iterrows():
-        cl = r.get(col)
-        if pd.isna(cl): continue
-        by_class.setdefault(str(cl), []).append(r)
-    for _cl, rows in by_class.items():
-        for i in range(len(rows)):
-            for j in range(i + 1, len(rows)):
-                aZ = str(rows[i].get("ΖΩΗΡΟΣ", "")).strip() == "Ν"
-                aI = str(rows[i].get("ΙΔΙΑΙΤΕΡΟΤΗΤΑ", "")).strip() == "Ν"
-                bZ = str(rows[j].get("ΖΩΗΡΟΣ", "")).strip() == "Ν"
-                bI = str(rows[j].get("ΙΔΙΑΙΤΕΡΟΤΗΤΑ", "")).strip() == "Ν"
-                if _pair_conflict_penalty(aZ, aI, bZ, bI) > 0:
-                    cnt += 1
-    return cnt
-
-def _sum_conflicts(df: pd.DataFrame, col: str) -> int:
-    s = 0
-    by_class = {}
-    for _, r in df.iterrows():
-        cl = r.get(col)
-        if pd.isna(cl): continue
-        by_class.setdefault(str(cl), []).append(r)
-    for _cl, rows in by_class.items():
-        for i in range(len(rows)):
-            for j in range(i + 1, len(rows)):
-                aZ = str(rows[i].get("ΖΩΗΡΟΣ", "")).strip() == "Ν"
-                aI = str(rows[i].get("ΙΔΙΑΙΤΕΡΟΤΗΤΑ", "")).strip() == "Ν"
-                bZ = str(rows[j].get("ΖΩΗΡΟΣ", "")).strip() == "Ν"
-                bI = str(rows[j].get("ΙΔΙΑΙΤΕΡΟΤΗΤΑ", "")).strip() == "Ν"
-                s += _pair_conflict_penalty(aZ, aI, bZ, bI)
-    return s
-
-def _broken_mutual_pairs(df: pd.DataFrame, col: str, scope: Set[str]) -> int:
-    pairs = mutual_pairs_in_scope(df, scope)
-    name2class = {
-        str(r["ΟΝΟΜΑ"]).strip(): str(r.get(col))
-        for _, r in df.iterrows()
-        if pd.notna(r.get(col))
-    }
-    return sum(1 for a, b in pairs if name2class.get(a) != name2class.get(b))
-
 def _compute_targets_global(df: pd.DataFrame, step1_col: str, class_labels: List[str]) -> Dict[str, Dict[str, int]]:
     Z_step1 = {cl: 0 for cl in class_labels}
     I_step1 = {cl: 0 for cl in class_labels}
@@ -109,39 +64,125 @@ def _compute_targets_global(df: pd.DataFrame, step1_col: str, class_labels: List
         "I_step1": I_step1,
     }
 
-def _prereject(assign_map, next_name, next_cl, df, step1_col, class_labels, targets) -> bool:
-    Zc = targets["Z_step1"].copy()
-    Ic = targets["I_step1"].copy()
-    tmp = assign_map.copy()
-    if next_name and next_cl:
-        tmp[next_name] = next_cl
-
-    for n, cl in tmp.items():
-        row = df[df["ΟΝΟΜΑ"] == n].iloc[0]
-        if str(row.get("ΖΩΗΡΟΣ", "")).strip() == "Ν": Zc[cl] += 1
-        if str(row.get("ΙΔΙΑΙΤΕΡΟΤΗΤΑ", "")).strip() == "Ν": Ic[cl] += 1
-
-    for cl in class_labels:
-        if Zc[cl] > targets["Z"]["max"]: return False
-        if Ic[cl] > targets["I"]["max"]: return False
-
-    if next_name and next_cl and "ΣΥΓΚΡΟΥΣΗ" in df.columns:
-        mask_next = (df["ΟΝΟΜΑ"] == next_name)
-        next_conf_cell = df.loc[mask_next, "ΣΥΓΚΡΟΥΣΗ"]
-        toks_next = set(parse_friends_cell(next_conf_cell.values[0] if not next_conf_cell.empty else ""))
-
-        fixed_same = df[(pd.notna(df[step1_col])) & (df[step1_col] == next_cl)]
-        if any((n in toks_next) for n in fixed_same["ΟΝΟΜΑ"].astype(str).tolist()):
-            return False
-
-        for n2, cl2 in tmp.items():
-            if cl2 != next_cl: continue
-            mask_n2 = (df["ΟΝΟΜΑ"] == n2)
-            n2_conf_cell = df.loc[mask_n2, "ΣΥΓΚΡΟΥΣΗ"]
-            toks2 = set(parse_friends_cell(n2_conf_cell.values[0] if not n2_conf_cell.empty else ""))
-            if (next_name in toks2) or (n2 in toks_next):
-                return False
-    return True
+def _precompute_step2_students(df: pd.DataFrame, names: List[str], step1_col: str,
+                               class_labels: List[str]) -> Dict[str, Any]:
+    """
+    Προϋπολογισμός για τον backtracker (μία σάρωση του df αντί για αναζητήσεις ανά κόμβο).
+    Για κάθε μαθητή της λίστας names (θέση i):
+      • z[i], iv[i]: σημαίες ΖΩΗΡΟΣ / ΙΔΙΑΙΤΕΡΟΤΗΤΑ
+      • deg[i]: πλήθος ΣΥΓΚΡΟΥΣΗ + ΦΙΛΟΙ (για τη σειρά τοποθέτησης)
+      • blocked[i]: τμήματα που αποκλείονται (σύγκρουση με τοποθετημένους του Βήματος 1
+        ή αυτο-σύγκρουση)
+      • conflicts[i]: θέσεις j των υπόλοιπων μαθητών της λίστας με σύγκρουση (οποιαδήποτε φορά)
+    Για ΟΝΟΜΑ με πολλές γραμμές χρησιμοποιείται η πρώτη.
+    """
+    first_pos: Dict[str, int] = {}
+    for pos, n in enumerate(df["ΟΝΟΜΑ"].astype(str).tolist()):
+        first_pos.setdefault(n, pos)
+    rows = [first_pos[n] for n in names]
+
+    def _flags(col: str) -> List[bool]:
+        if col not in df.columns:
+            return [False] * len(rows)
+        vals = (df[col].astype(str).str.strip() == "Ν").tolist()
+        return [vals[r] for r in rows]
+
+    def _cells(col: str) -> List[Any]:
+        if col not in df.columns:
+            return [""] * len(rows)
+        vals = df[col].tolist()
+        return [vals[r] for r in rows]
+
+    conf_toks = [set(parse_friends_cell(c)) for c in _cells("ΣΥΓΚΡΟΥΣΗ")]
+    deg = [len(t) + len(parse_friends_cell(f))
+           for t, f in zip((parse_friends_cell(c) for c in _cells("ΣΥΓΚΡΟΥΣΗ")), _cells("ΦΙΛΟΙ"))]
+
+    blocked: List[Set[str]] = [set() for _ in names]
+    conflicts: List[List[int]] = [[] for _ in names]
+    if "ΣΥΓΚΡΟΥΣΗ" in df.columns:
+        step1 = df[step1_col]
+        fixed_names = {
+            cl: set(df.loc[pd.notna(step1) & (step1 == cl), "ΟΝΟΜΑ"].astype(str).tolist())
+            for cl in class_labels
+        }
+        pos_of = {n: i for i, n in enumerate(names)}
+        for i, n in enumerate(names):
+            toks = conf_toks[i]
+            if n in toks:
+                blocked[i] = set(class_labels)
+            else:
+                blocked[i] = {cl for cl in class_labels if toks & fixed_names[cl]}
+            for t in toks:
+                j = pos_of.get(t)
+                if j is not None and j != i:
+                    conflicts[i].append(j)
+                    conflicts[j].append(i)
+        conflicts = [sorted(set(c)) for c in conflicts]
+
+    return {"z": _flags("ΖΩΗΡΟΣ"), "iv": _flags("ΙΔΙΑΙΤΕΡΟΤΗΤΑ"), "deg": deg,
+            "blocked": blocked, "conflicts": conflicts}
+
+def _leaf_arrays(df: pd.DataFrame, step1_col: str, names: List[str], class_labels: List[str],
+                 pairs: List[Tuple[str, str]]) -> Dict[str, Any]:
+    """
+    Συμπαγής αναπαράσταση για τη βαθμολόγηση φύλλων χωρίς αντίγραφο DataFrame:
+      • base_codes: δείκτης τμήματος ανά γραμμή από το Βήμα 1 (-1 = κενό)
+      • kind: 0 = τίποτα, 1 = μόνο Ζ, 2 = μόνο Ι, 3 = Ζ+Ι (ανά γραμμή)
+      • rows_of[i]: γραμμές με ΟΝΟΜΑ == names[i]
+      • pair_rows: γραμμές των δύο άκρων κάθε αμοιβαίας δυάδας
+    """
+    codes: Dict[str, int] = {}
+    base_codes = np.array(
+        [-1 if pd.isna(v) else codes.setdefault(str(v), len(codes)) for v in df[step1_col].tolist()],
+        dtype=np.int64,
+    )
+    label_code = {cl: codes.setdefault(cl, len(codes)) for cl in class_labels}
+
+    def _flag(col: str) -> np.ndarray:
+        if col not in df.columns:
+            return np.zeros(len(df), dtype=np.int64)
+        return (df[col].astype(str).str.strip() == "Ν").to_numpy(dtype=np.int64)
+
+    kind = conflict_kinds(_flag("ΖΩΗΡΟΣ"), _flag("ΙΔΙΑΙΤΕΡΟΤΗΤΑ"))
+
+    positions: Dict[str, List[int]] = {}
+    for pos, n in enumerate(df["ΟΝΟΜΑ"].astype(str).str.strip().tolist()):
+        positions.setdefault(n, []).append(pos)
+    name_arr = df["ΟΝΟΜΑ"].to_numpy()
+    rows_of = [np.flatnonzero(name_arr == n) for n in names]
+    pair_rows = [(positions.get(a, []), positions.get(b, [])) for a, b in pairs]
+
+    return {"base_codes": base_codes, "kind": kind, "n_codes": len(codes),
+            "label_code": label_code, "rows_of": rows_of, "pair_rows": pair_rows}
+
+def _score_leaf(codes: np.ndarray, arrays: Dict[str, Any]) -> Tuple[int, int, int]:
+    """
+    (ped_conflicts, conflict_sum, broken) για ένα φύλλο, από πλήθη Ζ/Ι/Ζ+Ι ανά τμήμα:
+    ζεύγη συγκρούσεων, άθροισμα ποινών συγκρούσεων και σπασμένες αμοιβαίες φιλίες
+    (με τις τοποθετήσεις του φύλλου).
+    """
+    placed = codes >= 0
+    cnt = np.bincount(codes[placed] * 4 + arrays["kind"][placed],
+                      minlength=4 * arrays["n_codes"]).reshape(-1, 4)
+    z, i, zi = cnt[:, 1], cnt[:, 2], cnt[:, 3]
+    ped = int(class_conflict_pairs(z, i, zi).sum())
+    conf = int(class_conflict_sum(z, i, zi).sum())
+
+    def _cls(rows: List[int]) -> int:
+        for r in reversed(rows):
+            if codes[r] >= 0:
+                return int(codes[r])
+        return -1
+
+    broken = sum(1 for ra, rb in arrays["pair_rows"] if _cls(ra) != _cls(rb))
+    return ped, conf, broken
+
+def _tier_key(ped_cnt: int, broken: int, total: int) -> Tuple[int, int, int]:
+    """
+    Κλειδί κατάταξης φύλλων (μικρότερο = καλύτερο), ίδιο με τους κανόνες tier:
+    με 0 παιδαγωγικές συγκρούσεις → (broken, total)· αλλιώς → (total, broken).
+    """
+    return (0, broken, total) if ped_cnt == 0 else (1, total, broken)
 
 def _extract_step1_id(step1_col_name: str) -> int:
     m = re.search(r'(?:ΒΗΜΑ1_|V1_)ΣΕΝΑΡΙΟ[_\s]*(\d+)', str(step1_col_name))
@@ -153,11 +194,17 @@ def step2_apply_FIXED_v3(
     num_classes: Optional[int] = None,
     *,
     seed: int = 42,
-    max_results: int = 5,
+    max_results: Optional[int] = 5,
+    time_budget_s: Optional[float] = None,
+    node_budget: Optional[int] = None,
 ) -> List[Tuple[str, pd.DataFrame, Dict[str, Any]]]:
     """
     Επιστρέφει έως max_results σενάρια ως (label, DataFrame, metrics).
     Το DataFrame περιέχει στήλες εισόδου + «ΒΗΜΑ2_ΣΕΝΑΡΙΟ_{k}» όπου k = id του ΒΗΜΑ1_ΣΕΝΑΡΙΟ_k.
+
+    Κρατούνται μόνο τα max_results πρώτα ισοβαθμούντα φύλλα του καλύτερου tier
+    (None = όλα). Με time_budget_s / node_budget η αναζήτηση σταματά όταν εξαντληθεί
+    το όριο και επιστρέφονται τα καλύτερα μέχρι τότε, με metrics["truncated"] = True.
     """
     random.seed(seed)
     df = normalize_columns(df_in).copy()
@@ -168,63 +215,91 @@ def step2_apply_FIXED_v3(
     to_place = df[(pd.isna(df[step1_col_name])) & ((df["ΖΩΗΡΟΣ"] == "Ν") | (df["ΙΔΙΑΙΤΕΡΟΤΗΤΑ"] == "Ν"))]["ΟΝΟΜΑ"].astype(str).tolist()
     targets = _compute_targets_global(df, step1_col=step1_col_name, class_labels=class_labels)
 
-    best: List[Tuple[pd.DataFrame, int, int, int, int]] = []
+    # Φραγμένος συλλέκτης: τα πρώτα max_results φύλλα με το καλύτερο _tier_key
+    best: List[Tuple[Dict[str, str], int, int, int, int]] = []
+    best_key: Optional[Tuple[int, int, int]] = None
     assign: Dict[str, str] = {}
 
-    def deg(name: str) -> int:
-        row = df[df["ΟΝΟΜΑ"] == name].iloc[0]
-        return len(parse_friends_cell(row.get("ΣΥΓΚΡΟΥΣΗ", ""))) + len(parse_friends_cell(row.get("ΦΙΛΟΙ", "")))
-
-    to_place_sorted = sorted(
-        to_place,
-        key=lambda n: (
-            -(
-                str(df.loc[df["ΟΝΟΜΑ"] == n, "ΖΩΗΡΟΣ"].values[0]).strip() == "Ν"
-                and str(df.loc[df["ΟΝΟΜΑ"] == n, "ΙΔΙΑΙΤΕΡΟΤΗΤΑ"].values[0]).strip() == "Ν"
-            ),
-            -(str(df.loc[df["ΟΝΟΜΑ"] == n, "ΙΔΙΑΙΤΕΡΟΤΗΤΑ"].values[0]).strip() == "Ν"),
-            -(str(df.loc[df["ΟΝΟΜΑ"] == n, "ΖΩΗΡΟΣ"].values[0]).strip() == "Ν"),
-            -deg(n),
+    deadline = (time.perf_counter() + time_budget_s) if time_budget_s is not None else None
+    nodes = 0
+    truncated = False
+
+    # Σταθερές ανά μαθητή (θέση στη λίστα to_place)
+    pre = _precompute_step2_students(df, to_place, step1_col_name, class_labels)
+    order = sorted(
+        range(len(to_place)),
+        key=lambda k: (
+            -(pre["z"][k] and pre["iv"][k]),
+            -pre["iv"][k],
+            -pre["z"][k],
+            -pre["deg"][k],
         ),
     )
+    to_place_sorted = [to_place[k] for k in order]
+    Zf = [pre["z"][k] for k in order]
+    If = [pre["iv"][k] for k in order]
+    blocked = [pre["blocked"][k] for k in order]
+    rank = {k: p for p, k in enumerate(order)}
+    conflicts = [[rank[j] for j in pre["conflicts"][k]] for k in order]
+
+    # Μετρητές ανά τμήμα: ενημέρωση/αναίρεση σε O(1) ανά κόμβο
+    z_max, i_max = targets["Z"]["max"], targets["I"]["max"]
+    Zc = targets["Z_step1"].copy()
+    Ic = targets["I_step1"].copy()
+    counts_new = {cl: 0 for cl in class_labels}
+    placed_cl: List[Optional[str]] = [None] * len(to_place_sorted)
+    base_ok = all(Zc[cl] <= z_max and Ic[cl] <= i_max for cl in class_labels)
+
+    # Βαθμολόγηση φύλλων σε πίνακες· DataFrame μόνο για τα τελικά επιλεγμένα
+    mutual_pairs = mutual_pairs_in_scope(df, scope)
+    leaf = _leaf_arrays(df, step1_col_name, to_place_sorted, class_labels, mutual_pairs)
+    codes = leaf["base_codes"].copy()
 
     def backtrack(i: int) -> None:
+        nonlocal best_key, nodes, truncated
+        if truncated:
+            return
+        nodes += 1
+        if (node_budget is not None and nodes > node_budget) or \
+                (deadline is not None and time.perf_counter() > deadline):
+            truncated = True
+            return
+
         if i == len(to_place_sorted):
-            cand = df.copy()
-            cand_col = "ΒΗΜΑ2_TMP"
-            cand[cand_col] = cand[step1_col_name]
-            for n, cl in assign.items():
-                cand.loc[cand["ΟΝΟΜΑ"] == n, cand_col] = cl
-
-            counts_new = {cl: 0 for cl in class_labels}
-            for cl in assign.values():
-                counts_new[cl] += 1
-            if sum(counts_new.values()) > 0 and max(counts_new.values()) == sum(counts_new.values()):
+            total_new = sum(counts_new.values())
+            if total_new > 0 and max(counts_new.values()) == total_new:
                 return
-
-            Zc = targets["Z_step1"].copy()
-            Ic = targets["I_step1"].copy()
-            for n, cl in assign.items():
-                row = df[df["ΟΝΟΜΑ"] == n].iloc[0]
-                if str(row.get("ΖΩΗΡΟΣ", "")).strip() == "Ν": Zc[cl] += 1
-                if str(row.get("ΙΔΙΑΙΤΕΡΟΤΗΤΑ", "")).strip() == "Ν": Ic[cl] += 1
             for cl in class_labels:
-                if not (targets["Z"]["q"] <= Zc[cl] <= targets["Z"]["max"]): return
-                if not (targets["I"]["q"] <= Ic[cl] <= targets["I"]["max"]): return
+                if not (targets["Z"]["q"] <= Zc[cl] <= z_max): return
+                if not (targets["I"]["q"] <= Ic[cl] <= i_max): return
 
-            ped_cnt = _count_ped_conflicts(cand, cand_col)
-            conf_sum = _sum_conflicts(cand, cand_col)
-            broken = _broken_mutual_pairs(cand, cand_col, scope)
+            for k, cl in enumerate(placed_cl):
+                codes[leaf["rows_of"][k]] = leaf["label_code"][cl]
+            ped_cnt, conf_sum, broken = _score_leaf(codes, leaf)
             total = conf_sum + 5 * broken
-            best.append((cand, ped_cnt, broken, total, conf_sum))
+            key = _tier_key(ped_cnt, broken, total)
+            if best_key is None or key < best_key:
+                best_key = key
+                best.clear()
+            if key == best_key and (max_results is None or len(best) < max_results):
+                best.append((dict(assign), ped_cnt, broken, total, conf_sum))
             return
 
+        if not base_ok:
+            return
         name = to_place_sorted[i]
+        z, iv = Zf[i], If[i]
         for cl in class_labels:
-            if not _prereject(assign, name, cl, df, step1_col_name, class_labels, targets):
-                continue
+            if z and Zc[cl] >= z_max: continue
+            if iv and Ic[cl] >= i_max: continue
+            if cl in blocked[i]: continue
+            if any(placed_cl[j] == cl for j in conflicts[i]): continue
             assign[name] = cl
+            placed_cl[i] = cl
+            Zc[cl] += z; Ic[cl] += iv; counts_new[cl] += 1
             backtrack(i + 1)
+            Zc[cl] -= z; Ic[cl] -= iv; counts_new[cl] -= 1
+            placed_cl[i] = None
             del assign[name]
 
     backtrack(0)
@@ -233,34 +308,23 @@ def step2_apply_FIXED_v3(
         tmp = df.copy()
         base_id = _extract_step1_id(step1_col_name)
         tmp[f"ΒΗΜΑ2_ΣΕΝΑΡΙΟ_{base_id}"] = tmp[step1_col_name]
-        return [("option_1", tmp, {"ped_conflicts": None, "broken": None, "penalty": None})]
-
-    zero_ped = [x for x in best if x[1] == 0]
-    selected = []
-
-    total_pairs = len(mutual_pairs_in_scope(df, scope))
-
-    if zero_ped:
-        min_broken = min(x[2] for x in zero_ped)
-        tier1 = [x for x in zero_ped if x[2] == min_broken]
-        min_total = min(x[3] for x in tier1)
-        tier2 = [x for x in tier1 if x[3] == min_total]
-        selected = tier2
-    else:
-        min_total = min(x[3] for x in best)
-        tier1 = [x for x in best if x[3] == min_total]
-        max_preserved = max(total_pairs - x[2] for x in tier1)
-        tier2 = [x for x in tier1 if (total_pairs - x[2]) == max_preserved]
-        selected = tier2
+        return [("option_1", tmp, {"ped_conflicts": None, "broken": None, "penalty": None,
+                                   "truncated": truncated})]
+
+    selected = best
 
     results: List[Tuple[str, pd.DataFrame, Dict[str, Any]]] = []
     base_id = _extract_step1_id(step1_col_name)
-    for k, (cand, ped_cnt, broken, total, conf_sum) in enumerate(selected, start=1):
-        out = cand.copy()
+    for k, (assigned, ped_cnt, broken, total, conf_sum) in enumerate(selected, start=1):
+        out = df.copy()
+        out["ΒΗΜΑ2_TMP"] = out[step1_col_name]
+        for n, cl in assigned.items():
+            out.loc[out["ΟΝΟΜΑ"] == n, "ΒΗΜΑ2_TMP"] = cl
         final_col = f"ΒΗΜΑ2_ΣΕΝΑΡΙΟ_{base_id}"
         out[final_col] = out["ΒΗΜΑ2_TMP"]
         out.drop(columns=["ΒΗΜΑ2_TMP"], inplace=True)
         results.append((f"option_{k}", out, {
             "ped_conflicts": int(ped_cnt), "broken": int(broken), "penalty": int(total),
+            "truncated": truncated,
         }))
     return results
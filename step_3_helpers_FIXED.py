@@ -9,12 +9,19 @@ step_3_helpers_FIXED.py
 - Επιλογή σεναρίων βάσει θεωρίας
 """
 
-from typing import List, Tuple, Dict, Set
+from collections import OrderedDict
+from typing import List, Tuple, Dict, Set, Optional
+import numpy as np
 import pandas as pd
 import re, ast
 
+from class_balance import class_tallies, spread_penalty
+from friend_graph import FriendGraph
+from parse_cache import memoized_parser
+
 SAFE_SEP = re.compile(r"[,\|\;/·\n]+")
 
+@memoized_parser
 def parse_friends_string(x) -> List[str]:
     if isinstance(x, list):
         return [str(s).strip() for s in x if str(s).strip()]
@@ -43,46 +50,73 @@ def are_mutual_pair(df: pd.DataFrame, a: str, b: str) -> bool:
     fb = set(parse_friends_string(rb.iloc[0].get("ΦΙΛΟΙ","")))
     return (str(b).strip() in fa) and (str(a).strip() in fb)
 
-def mutual_dyads(df: pd.DataFrame) -> Set[Tuple[str,str]]:
+def friend_graph(df: pd.DataFrame) -> FriendGraph:
+    """FriendGraph του ρόστερ με τον parser του Βήματος 3 (χτίζεται μία φορά, ξαναχρησιμοποιείται)."""
+    return FriendGraph(df, parse_friends_string)
+
+def mutual_dyads(df: pd.DataFrame, graph: Optional[FriendGraph] = None) -> Set[Tuple[str,str]]:
+    graph = graph if graph is not None else friend_graph(df)
     names = df["ΟΝΟΜΑ"].astype(str).str.strip().tolist()
-    pairs: Set[Tuple[str,str]] = set()
-    for i, a in enumerate(names):
-        for b in names[i+1:]:
-            if are_mutual_pair(df, a, b):
-                pairs.add(tuple(sorted([a,b])))
+    pairs: Set[Tuple[str,str]] = set(graph.mutual_pairs_within(names))
+    # Διπλό όνομα που δηλώνει τον εαυτό του → (a, a), όπως στη σάρωση όλων των ζευγών
+    seen: Set[str] = set()
+    for a in names:
+        if a in seen and graph.is_mutual(a, a):
+            pairs.add((a, a))
+        seen.add(a)
     return pairs
 
-def count_broken_dyads(before_df: pd.DataFrame, after_df: pd.DataFrame, scenario_col: str) -> int:
-    """Μετρά πόσες αμοιβαίες ΔΥΑΔΕΣ σπάνε στο after_df (δηλ. κατανέμονται σε διαφορετικές τάξεις)."""
-    pairs = mutual_dyads(before_df)
-    name2class = {str(r["ΟΝΟΜΑ"]).strip(): str(r.get(scenario_col)) for _, r in after_df.iterrows() if pd.notna(r.get(scenario_col))}
-    broken=0
-    for a,b in pairs:
-        ca = name2class.get(a); cb = name2class.get(b)
-        if ca is None or cb is None:
-            # αν κάποιος δεν έχει τοποθετηθεί, θεωρούμε ότι η δυάδα δεν διατηρήθηκε
-            broken += 1
-        elif ca != cb:
-            broken += 1
-    return broken
+# Cache ρόστερ -> (γράφος, δυάδες): τα σενάρια του Βήματος 2 μοιράζονται τα ίδια ΟΝΟΜΑ/ΦΙΛΟΙ
+_ROSTER_CACHE_SIZE = 4
+_ROSTER_CACHE: "OrderedDict[tuple, Tuple[FriendGraph, Tuple[Tuple[str,str], ...]]]" = OrderedDict()
+
+def roster_dyads(df: pd.DataFrame) -> Tuple[FriendGraph, Tuple[Tuple[str,str], ...]]:
+    """
+    (FriendGraph, αμοιβαίες δυάδες) για το ρόστερ του df, υπολογισμένα μία φορά ανά ρόστερ.
+    Κλειδί είναι οι στήλες ΟΝΟΜΑ και ΦΙΛΟΙ, άρα όλα τα σενάρια ίδιου ρόστερ μοιράζονται το αποτέλεσμα.
+    """
+    names = tuple(df["ΟΝΟΜΑ"].astype(str))
+    cells = tuple(df["ΦΙΛΟΙ"].astype(str)) if "ΦΙΛΟΙ" in df.columns else ()
+    key = (names, cells)
+    hit = _ROSTER_CACHE.get(key)
+    if hit is not None:
+        _ROSTER_CACHE.move_to_end(key)
+        return hit
+    graph = friend_graph(df)
+    hit = (graph, tuple(sorted(mutual_dyads(df, graph))))
+    _ROSTER_CACHE[key] = hit
+    if len(_ROSTER_CACHE) > _ROSTER_CACHE_SIZE:
+        _ROSTER_CACHE.popitem(last=False)
+    return hit
+
+def count_broken_dyads(before_df: pd.DataFrame, after_df: pd.DataFrame, scenario_col: str,
+                       pairs: Optional[Tuple[Tuple[str,str], ...]] = None) -> int:
+    """
+    Μετρά πόσες αμοιβαίες ΔΥΑΔΕΣ σπάνε στο after_df (δηλ. κατανέμονται σε διαφορετικές τάξεις).
+    pairs: έτοιμες δυάδες του ρόστερ (αλλιώς από roster_dyads(before_df)).
+    """
+    if pairs is None:
+        pairs = roster_dyads(before_df)[1]
+    if not pairs:
+        return 0
+    placed = after_df[scenario_col].notna().to_numpy()
+    names = after_df["ΟΝΟΜΑ"].astype(str).str.strip()[placed]
+    classes = after_df[scenario_col][placed].astype(str)
+    # Τελευταία εμφάνιση κάθε ονόματος -> κωδικός τμήματος (−1 = μη τοποθετημένος)
+    codes, _ = pd.factorize(classes)
+    name2code = pd.Series(codes, index=names.to_numpy())
+    name2code = name2code[~name2code.index.duplicated(keep="last")]
+    a, b = zip(*pairs)
+    ca = name2code.reindex(list(a)).fillna(-1).to_numpy(dtype=np.int64)
+    cb = name2code.reindex(list(b)).fillna(-1).to_numpy(dtype=np.int64)
+    # αν κάποιος δεν έχει τοποθετηθεί, θεωρούμε ότι η δυάδα δεν διατηρήθηκε
+    return int(((ca < 0) | (cb < 0) | (ca != cb)).sum())
 
 def calculate_penalty_score_step3(df: pd.DataFrame, scenario_col: str, num_classes: int) -> int:
-    """+1 για κάθε μονάδα διαφοράς >2 σε αγόρια, κορίτσια, πληθυσμό."""
-    penalty = 0
-    boys_counts=[]; girls_counts=[]; pop_counts=[]
-    for i in range(num_classes):
-        cl = f"Α{i+1}"
-        sub = df[df[scenario_col]==cl]
-        boys_counts.append(int((sub["ΦΥΛΟ"].astype(str).str.upper()=="Α").sum()))
-        girls_counts.append(int((sub["ΦΥΛΟ"].astype(str).str.upper()=="Κ").sum()))
-        pop_counts.append(len(sub))
-    if boys_counts:
-        penalty += max(0, max(boys_counts)-min(boys_counts)-2)
-    if girls_counts:
-        penalty += max(0, max(girls_counts)-min(girls_counts)-2)
-    if pop_counts:
-        penalty += max(0, max(pop_counts)-min(pop_counts)-2)
-    return int(penalty)
+    """+1 για κάθε μονάδα διαφοράς >2 σε αγόρια, κορίτσια, πληθυσμό (πλήθη με ένα groupby)."""
+    tallies = class_tallies(df, scenario_col, [f"Α{i+1}" for i in range(num_classes)])
+    return (spread_penalty(tallies["boys"], 2) + spread_penalty(tallies["girls"], 2)
+            + spread_penalty(tallies["total"], 2))
 
 def select_best_scenarios(results: List[Tuple[str, pd.DataFrame, Dict]]) -> List[Tuple[str,pd.DataFrame,Dict]]:
     """
@@ -0,0 +1,8 @@
+# -*- coding: utf-8 -*-
+"""Τα modules της ροής είναι flat στη ρίζα του repo· τα κάνουμε importable από τα tests."""
+import sys
+import warnings
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+warnings.filterwarnings("ignore")
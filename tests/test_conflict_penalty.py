@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+"""ConflictCounts: move_delta / move συμφωνούν με το άθροισμα pair_conflict_penalty ανά ζεύγος."""
+import itertools
+import random
+
+import pandas as pd
+import pytest
+
+import step8_fixed_final as s8
+from conflict_penalty import ConflictCounts, conflict_kinds, pair_conflict_penalty
+
+
+def _pairwise_total(z, i, labels):
+    return sum(pair_conflict_penalty(z[a], i[a], z[b], i[b])
+               for a, b in itertools.combinations(range(len(labels)), 2)
+               if labels[a] is not None and labels[a] == labels[b])
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_move_delta_matches_pairwise_sum(seed):
+    rng = random.Random(seed)
+    k = rng.randint(2, 4)
+    classes = [f"Α{c + 1}" for c in range(k)] + [None]
+    n = rng.randint(5, 30)
+    z = [rng.random() < 0.4 for _ in range(n)]
+    i = [rng.random() < 0.3 for _ in range(n)]
+    labels = [rng.choice(classes) for _ in range(n)]
+    counts = ConflictCounts(conflict_kinds(z, i), labels)
+    assert counts.total() == _pairwise_total(z, i, labels)
+
+    for _ in range(60):
+        idx, new = rng.randrange(n), rng.choice(classes)
+        after = list(labels)
+        after[idx] = new
+        expected = _pairwise_total(z, i, after) - _pairwise_total(z, i, labels)
+        assert counts.move_delta(idx, new) == expected
+        assert counts.move(idx, new) == expected
+        labels = after
+        assert counts.labels == labels
+        assert counts.total() == _pairwise_total(z, i, labels)
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_step8_incremental_scenario_sums(seed):
+    rng = random.Random(seed)
+    n, k = rng.randint(10, 40), rng.randint(2, 4)
+    df = pd.DataFrame({
+        "ΟΝΟΜΑ": [f"Μ{j}" for j in range(n)],
+        "ΖΩΗΡΟΣ": [rng.choice(["Ν", "Ο", "ΝΑΙ", None]) for _ in range(n)],
+        "ΙΔΙΑΙΤΕΡΟΤΗΤΑ": [rng.choice(["Ν", "Ο", "Ο"]) for _ in range(n)],
+    })
+    cols = []
+    base = [f"Α{rng.randint(1, k)}" for _ in range(n)]
+    for s in range(5):
+        col = f"ΒΗΜΑ7_ΣΕΝΑΡΙΟ_{s + 1}"
+        df[col] = [rng.choice([f"Α{rng.randint(1, k)}", None]) if rng.random() < 0.3 else b for b in base]
+        cols.append(col)
+    assert s8._all_conflicts_sums(df, cols) == {c: s8._all_conflicts_sum(df, c) for c in cols}
@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+"""memoized_parser: hits, αντίγραφα αποτελεσμάτων, παράκαμψη μη-string κελιών και LRU eviction."""
+import pytest
+
+from parse_cache import PARSE_CACHE, memoized_parser
+
+
+@pytest.fixture
+def small_cache(monkeypatch):
+    monkeypatch.setattr(PARSE_CACHE, "maxsize", 3)
+    PARSE_CACHE.clear()
+    yield PARSE_CACHE
+    PARSE_CACHE.clear()
+
+
+def _counting_parser():
+    calls = []
+
+    @memoized_parser
+    def parse(x):
+        calls.append(x)
+        if isinstance(x, list):
+            return list(x)
+        return [t.strip() for t in str(x).split(",") if t.strip()]
+
+    return parse, calls
+
+
+def test_hits_return_fresh_copies(small_cache):
+    parse, calls = _counting_parser()
+    first = parse("Α, Β")
+    first.append("Γ")
+    assert parse("Α, Β") == ["Α", "Β"]
+    assert calls == ["Α, Β"]
+    assert (small_cache.hits, small_cache.misses) == (1, 1)
+
+    # μη-string κελιά δεν αποθηκεύονται
+    assert parse(["Α"]) == ["Α"]
+    assert parse(["Α"]) == ["Α"]
+    assert len(calls) == 3
+    assert small_cache.stats()["entries"] == 1
+
+
+def test_lru_eviction(small_cache):
+    parse, calls = _counting_parser()
+    for cell in ["a", "b", "c"]:
+        parse(cell)
+    parse("a")  # το "a" γίνεται το πιο πρόσφατο, το "b" το παλαιότερο
+    parse("d")
+    assert small_cache.evictions == 1
+    assert small_cache.stats()["entries"] == 3
+
+    calls.clear()
+    parse("a")
+    parse("b")
+    assert calls == ["b"]
+
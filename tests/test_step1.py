@@ -0,0 +1,28 @@
+# -*- coding: utf-8 -*-
+"""Βήμα 1: οι νέοι τρόποι παραγωγής δίνουν τα ίδια σενάρια με την παλιά απαρίθμηση."""
+import random
+
+import pytest
+
+from step1_immutable_ALLINONE import Step1ImmutableProcessor
+
+
+def _friendships(kids, n_pairs, seed):
+    rng = random.Random(seed)
+    pairs = [(a, b) for i, a in enumerate(kids) for b in kids[i + 1:]]
+    return frozenset(tuple(sorted(p)) for p in rng.sample(pairs, min(n_pairs, len(pairs))))
+
+
+@pytest.mark.parametrize("mode", ["partition", "bnb"])
+@pytest.mark.parametrize("n_kids,num_classes", [(4, 2), (7, 2), (9, 2), (6, 3), (8, 3)])
+def test_generation_matches_exhaustive(mode, n_kids, num_classes):
+    kids = [f"Παιδί_{i:02d}" for i in range(n_kids)]
+    friendships = _friendships(kids, n_kids // 2, seed=n_kids * 10 + num_classes)
+    expected = Step1ImmutableProcessor("exhaustive")._exhaustive_generation(kids, num_classes, friendships)
+    got = Step1ImmutableProcessor(mode)._exhaustive_generation(kids, num_classes, friendships)
+    assert got == expected
+
+
+def test_unknown_generation_mode_raises():
+    with pytest.raises(ValueError):
+        Step1ImmutableProcessor("random")
@@ -0,0 +1,188 @@
+# -*- coding: utf-8 -*-
+"""Βήμα 2: max_results / node_budget / time_budget_s και η σημαία truncated.
+
+Αναφορά: η παλιά ροή «όλα τα φύλλα, μετά φιλτράρισμα tiers», γραμμένη εδώ ως brute force
+πάνω σε όλες τις αναθέσεις των μαθητών του Βήματος 2.
+"""
+import functools
+import itertools
+import random
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from conflict_penalty import pair_conflict_penalty
+from step_2_zoiroi_idiaterotites_FIXED_v3_PATCHED import step2_apply_FIXED_v3
+
+STEP1 = "ΒΗΜΑ1_ΣΕΝΑΡΙΟ_1"
+STEP2 = "ΒΗΜΑ2_ΣΕΝΑΡΙΟ_1"
+MAX_BRUTE = 8  # k^MAX_BRUTE φύλλα στο brute force
+
+
+def _roster(rng: random.Random, n: int, k: int) -> pd.DataFrame:
+    """Μοναδικά ονόματα· παιδιά εκπαιδευτικών τοποθετημένα στο Βήμα 1, αμοιβαίες φιλίες, συγκρούσεις."""
+    names = [f"Μ{i}" for i in range(n)]
+    teacher = [rng.choice("ΝΟΟΟ") for _ in names]
+    friends = [set(rng.sample(names, rng.randint(0, 2))) for _ in names]
+    for _ in range(n // 3):
+        a, b = rng.sample(range(n), 2)
+        friends[a].add(names[b])
+        friends[b].add(names[a])
+    return pd.DataFrame({
+        "ΟΝΟΜΑ": names,
+        "ΦΥΛΟ": [rng.choice("ΑΚ") for _ in names],
+        "ΠΑΙΔΙ_ΕΚΠΑΙΔΕΥΤΙΚΟΥ": teacher,
+        "ΖΩΗΡΟΣ": [rng.choice("ΝΟΟ") for _ in names],
+        "ΙΔΙΑΙΤΕΡΟΤΗΤΑ": [rng.choice("ΝΟΟΟ") for _ in names],
+        "ΚΑΛΗ_ΓΝΩΣΗ_ΕΛΛΗΝΙΚΩΝ": "Ν",
+        "ΦΙΛΟΙ": [", ".join(sorted(f - {nm})) or np.nan for nm, f in zip(names, friends)],
+        "ΣΥΓΚΡΟΥΣΗ": [", ".join(rng.sample(names, 1)) if rng.random() < 0.2 else np.nan for _ in names],
+        STEP1: [f"Α{rng.randint(1, k)}" if t == "Ν" else np.nan for t in teacher],
+    })
+
+
+def _tokens(cell) -> set:
+    return set() if pd.isna(cell) else {t.strip() for t in str(cell).split(",") if t.strip()}
+
+
+def _tier_key(ped, broken, total):
+    return (0, broken, total) if ped == 0 else (1, total, broken)
+
+
+def _all_leaves_then_filter(df: pd.DataFrame, k: int):
+    """Όλα τα έγκυρα φύλλα, μετά tier: 0 παιδαγωγικές → (broken, total), αλλιώς (total, broken)."""
+    labels = [f"Α{i+1}" for i in range(k)]
+    to_place = _to_place(df)
+    z = dict(zip(df["ΟΝΟΜΑ"], df["ΖΩΗΡΟΣ"] == "Ν"))
+    iv = dict(zip(df["ΟΝΟΜΑ"], df["ΙΔΙΑΙΤΕΡΟΤΗΤΑ"] == "Ν"))
+    conf = dict(zip(df["ΟΝΟΜΑ"], df["ΣΥΓΚΡΟΥΣΗ"].map(_tokens)))
+    friends = dict(zip(df["ΟΝΟΜΑ"], df["ΦΙΛΟΙ"].map(_tokens)))
+    step1 = {n: c for n, c in zip(df["ΟΝΟΜΑ"], df[STEP1]) if pd.notna(c)}
+
+    scope = set(to_place) | {n for n in step1 if df.set_index("ΟΝΟΜΑ").at[n, "ΠΑΙΔΙ_ΕΚΠΑΙΔΕΥΤΙΚΟΥ"] == "Ν"}
+    pairs = [(a, b) for a, b in itertools.combinations(sorted(scope), 2)
+             if b in friends[a] and a in friends[b]]
+
+    def _q_max(total):
+        q, r = divmod(total, k)
+        return q, q + (1 if r else 0)
+    zq, zmax = _q_max(sum(z[n] for n in step1) + sum(z[n] for n in to_place))
+    iq, imax = _q_max(sum(iv[n] for n in step1) + sum(iv[n] for n in to_place))
+
+    leaves = []
+    for combo in itertools.product(labels, repeat=len(to_place)):
+        new = dict(zip(to_place, combo))
+        if new and len(set(combo)) == 1:
+            continue
+        placed = {**step1, **new}
+        if any(not (zq <= sum(z[n] for n, c in placed.items() if c == cl) <= zmax) or
+               not (iq <= sum(iv[n] for n, c in placed.items() if c == cl) <= imax) for cl in labels):
+            continue
+        if any(n in conf[n] or any(step1.get(t) == cl for t in conf[n]) for n, cl in new.items()):
+            continue
+        if any(new[a] == new[b] and (b in conf[a] or a in conf[b])
+               for a, b in itertools.combinations(to_place, 2)):
+            continue
+        same_class = [(a, b) for a, b in itertools.combinations(placed, 2) if placed[a] == placed[b]]
+        penalties = [pair_conflict_penalty(z[a], iv[a], z[b], iv[b]) for a, b in same_class]
+        ped = sum(1 for a, b in same_class if (z[a] or iv[a]) and (z[b] or iv[b]))
+        broken = sum(1 for a, b in pairs if placed.get(a) != placed.get(b))
+        total = sum(penalties) + 5 * broken
+        leaves.append((_tier_key(ped, broken, total), new, ped, broken, total))
+    if not leaves:
+        return to_place, []
+    best = min(leaf[0] for leaf in leaves)
+    return to_place, [leaf[1:] for leaf in leaves if leaf[0] == best]
+
+
+def _options(results, to_place):
+    """(ανάθεση των μαθητών του Βήματος 2, ped, broken, penalty) ανά option."""
+    out = []
+    for _label, df, m in results:
+        col = dict(zip(df["ΟΝΟΜΑ"], df[STEP2]))
+        out.append((tuple(col[n] for n in to_place), m["ped_conflicts"], m["broken"], m["penalty"]))
+    return sorted(out)
+
+
+def _to_place(df: pd.DataFrame) -> list:
+    flagged = (df["ΖΩΗΡΟΣ"] == "Ν") | (df["ΙΔΙΑΙΤΕΡΟΤΗΤΑ"] == "Ν")
+    return df.loc[df[STEP1].isna() & flagged, "ΟΝΟΜΑ"].tolist()
+
+
+def _case(seed: int):
+    rng = random.Random(seed)
+    k = rng.choice([2, 3])
+    df = _roster(rng, rng.randint(10, 22), k)
+    if len(_to_place(df)) > MAX_BRUTE:
+        pytest.skip("πολλοί μαθητές για brute force")
+    return df, k
+
+
+@pytest.mark.parametrize("seed", range(60))
+def test_untruncated_matches_all_leaves_then_filter(seed):
+    df, k = _case(seed)
+    to_place, expected = _all_leaves_then_filter(df, k)
+    if not expected:
+        pytest.skip("κανένα έγκυρο φύλλο")
+    results = step2_apply_FIXED_v3(df, STEP1, k, max_results=None)
+    assert not any(m["truncated"] for _, _, m in results)
+    want = sorted((tuple(new[n] for n in to_place), ped, broken, total) for new, ped, broken, total in expected)
+    assert _options(results, to_place) == want
+
+
+@functools.lru_cache(maxsize=None)
+def _tied_seed() -> int:
+    """Πρώτος seed με ≥ 3 ισοβαθμούντα βέλτιστα φύλλα και ≥ 4 μαθητές Βήματος 2."""
+    for seed in range(200):
+        rng = random.Random(seed)
+        k = rng.choice([2, 3])
+        df = _roster(rng, rng.randint(10, 22), k)
+        if 4 <= len(_to_place(df)) <= MAX_BRUTE and len(_all_leaves_then_filter(df, k)[1]) >= 3:
+            return seed
+    pytest.fail("δεν βρέθηκε ρόστερ με ισοβαθμίες")
+
+
+def _tied_case():
+    return _case(_tied_seed())
+
+
+def test_max_results_caps_the_best_tier():
+    df, k = _tied_case()
+    n_best = len(_all_leaves_then_filter(df, k)[1])
+    everything = step2_apply_FIXED_v3(df, STEP1, k, max_results=None)
+    one = step2_apply_FIXED_v3(df, STEP1, k, max_results=1)
+    assert len(everything) == n_best
+    assert len(one) == 1
+    assert one[0][2] == everything[0][2]
+    assert one[0][1].equals(everything[0][1])
+
+
+def test_node_budget_truncates():
+    df, k = _tied_case()
+    results = step2_apply_FIXED_v3(df, STEP1, k, node_budget=3)
+    assert all(m["truncated"] for _, _, m in results)
+    full = step2_apply_FIXED_v3(df, STEP1, k, node_budget=10 ** 6)
+    assert not any(m["truncated"] for _, _, m in full)
+
+
+def test_zero_time_budget_truncates():
+    df, k = _tied_case()
+    results = step2_apply_FIXED_v3(df, STEP1, k, time_budget_s=0.0)
+    assert all(m["truncated"] for _, _, m in results)
+
+
+def test_truncated_search_returns_best_so_far():
+    df, k = _tied_case()
+    to_place, expected = _all_leaves_then_filter(df, k)
+    best = _tier_key(*expected[0][1:])
+    # ο μικρότερος προϋπολογισμός κόμβων που φτάνει σε φύλλο δεν εξαντλεί το δέντρο
+    for budget in range(1, 10 ** 5):
+        results = step2_apply_FIXED_v3(df, STEP1, k, node_budget=budget)
+        if results[0][2]["ped_conflicts"] is not None:
+            break
+    label, out, metrics = results[0]
+    assert metrics["truncated"]
+    assert _tier_key(metrics["ped_conflicts"], metrics["broken"], metrics["penalty"]) >= best
+    # πραγματική λύση, όχι η εφεδρική αντιγραφή του Βήματος 1
+    assert out.loc[out["ΟΝΟΜΑ"].isin(to_place), STEP2].notna().all()
@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+"""Βήμα 3: matching ≥ greedy σε τοποθετήσεις, και ίδια έξοδος σειριακά / με workers."""
+import random
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from step3_amivaia_filia_FIXED import (
+    apply_step3_on_sheet, export_step3_nextcol_full, step3_run_all_from_step2
+)
+
+
+def _step2_roster(rng: random.Random, n: int, k: int, scenario_col: str = "ΒΗΜΑ2_ΣΕΝΑΡΙΟ_1") -> pd.DataFrame:
+    """Ρόστερ με αμοιβαίες δυάδες (και μη αμοιβαίες επιλογές) και ~75% τοποθετημένους."""
+    names = [f"Μ{i}" for i in range(n)]
+    friends = [", ".join(rng.sample(names, rng.randint(0, 3))) or np.nan for _ in names]
+    for _ in range(n // 2):
+        a, b = rng.sample(range(n), 2)
+        friends[a] = names[b]
+        friends[b] = names[a] + (", " + names[rng.randrange(n)] if rng.random() < 0.5 else "")
+    labels = [f"Α{j+1}" for j in range(k)]
+    return pd.DataFrame({
+        "ΟΝΟΜΑ": names,
+        "ΦΥΛΟ": [rng.choice("ΑΚ") for _ in names],
+        "ΦΙΛΟΙ": friends,
+        scenario_col: [rng.choice(labels) if rng.random() < 0.75 else np.nan for _ in names],
+    })
+
+
+def _sheets(path) -> dict:
+    return pd.read_excel(path, sheet_name=None)
+
+
+def _same_workbook(a, b) -> bool:
+    A, B = _sheets(a), _sheets(b)
+    return list(A) == list(B) and all(A[s].equals(B[s]) for s in A)
+
+
+@pytest.mark.parametrize("seed", range(8))
+def test_matching_places_at_least_as_many_as_greedy(seed):
+    rng = random.Random(seed)
+    # κοντά στο όριο των 25 ώστε το greedy να μπορεί να «κολλήσει»
+    df = _step2_roster(rng, rng.randint(40, 70), 2)
+    greedy, _ = apply_step3_on_sheet(df, "ΒΗΜΑ2_ΣΕΝΑΡΙΟ_1", mode="greedy")
+    matching, _ = apply_step3_on_sheet(df, "ΒΗΜΑ2_ΣΕΝΑΡΙΟ_1", mode="matching")
+    assert matching["ΒΗΜΑ3_ΣΕΝΑΡΙΟ_1"].notna().sum() >= greedy["ΒΗΜΑ3_ΣΕΝΑΡΙΟ_1"].notna().sum()
+    # όριο 25: όποιο τμήμα μεγάλωσε στο Βήμα 3 μένει ≤ 25
+    before = df["ΒΗΜΑ2_ΣΕΝΑΡΙΟ_1"].value_counts()
+    after = matching["ΒΗΜΑ3_ΣΕΝΑΡΙΟ_1"].value_counts()
+    grown = after[after > before.reindex(after.index, fill_value=0)]
+    assert (grown <= 25).all()
+    # οι τοποθετημένοι του Βήματος 2 δεν μετακινούνται
+    placed = df["ΒΗΜΑ2_ΣΕΝΑΡΙΟ_1"].notna()
+    assert matching.loc[placed, "ΒΗΜΑ3_ΣΕΝΑΡΙΟ_1"].equals(df.loc[placed, "ΒΗΜΑ2_ΣΕΝΑΡΙΟ_1"])
+
+
+def test_matching_beats_greedy_when_greedy_blocks_a_class():
+    # Α1 γεμάτο, Α2/Α3 με 2 θέσεις. Το greedy βάζει τον U0 στο Α2 και ο U1
+    # (φίλοι μόνο στο Α2) μένει εκτός· το matching μεταφέρει τον U0 στο Α3.
+    free = {"Α1": 0, "Α2": 2, "Α3": 2}
+    names, labels = [], []
+    for cl, n_free in free.items():
+        for i in range(25 - n_free):
+            names.append(f"{cl}_{i}")
+            labels.append(cl)
+    friends = {n: set() for n in names}
+    unplaced = {"U0": ["Α2_0", "Α3_0"], "U1": ["Α2_1", "Α2_2", "Α2_3"], "U2": ["Α1_0", "Α2_4"]}
+    for u, vs in unplaced.items():
+        names.append(u)
+        labels.append(np.nan)
+        friends[u] = set(vs)
+        for v in vs:
+            friends[v].add(u)
+    df = pd.DataFrame({"ΟΝΟΜΑ": names, "ΦΥΛΟ": "Α",
+                       "ΦΙΛΟΙ": [", ".join(sorted(friends[n])) for n in names],
+                       "ΒΗΜΑ2_ΣΕΝΑΡΙΟ_1": labels})
+
+    greedy, _ = apply_step3_on_sheet(df, "ΒΗΜΑ2_ΣΕΝΑΡΙΟ_1", mode="greedy")
+    matching, _ = apply_step3_on_sheet(df, "ΒΗΜΑ2_ΣΕΝΑΡΙΟ_1", mode="matching")
+    new_greedy = greedy["ΒΗΜΑ3_ΣΕΝΑΡΙΟ_1"].notna().sum() - len(df) + len(unplaced)
+    new_matching = matching["ΒΗΜΑ3_ΣΕΝΑΡΙΟ_1"].notna().sum() - len(df) + len(unplaced)
+    assert (new_greedy, new_matching) == (2, 3)
+    assert (matching["ΒΗΜΑ3_ΣΕΝΑΡΙΟ_1"].value_counts() <= 25).all()
+
+
+def test_unknown_mode_raises():
+    df = _step2_roster(random.Random(0), 10, 2)
+    with pytest.raises(ValueError):
+        apply_step3_on_sheet(df, "ΒΗΜΑ2_ΣΕΝΑΡΙΟ_1", mode="exact")
+
+
+def test_run_all_workers_match_serial(tmp_path):
+    rng = random.Random(3)
+    src = tmp_path / "step2.xlsx"
+    with pd.ExcelWriter(src) as w:
+        for k in range(1, 7):
+            col = f"ΒΗΜΑ2_ΣΕΝΑΡΙΟ_{k}"
+            _step2_roster(rng, 80, 4, col).to_excel(w, index=False, sheet_name=col)
+    step3_run_all_from_step2(str(src), str(tmp_path / "serial.xlsx"))
+    step3_run_all_from_step2(str(src), str(tmp_path / "pool.xlsx"), workers=3)
+    assert _same_workbook(tmp_path / "serial.xlsx", tmp_path / "pool.xlsx")
+
+
+def test_export_full_workers_match_serial(tmp_path):
+    rng = random.Random(4)
+    src = tmp_path / "step2_full.xlsx"
+    with pd.ExcelWriter(src) as w:
+        for k in range(1, 5):
+            df = _step2_roster(rng, 60, 3, f"ΒΗΜΑ2_ΣΕΝΑΡΙΟ_{k}")
+            df.insert(1, f"ΒΗΜΑ1_ΣΕΝΑΡΙΟ_{k}", df[f"ΒΗΜΑ2_ΣΕΝΑΡΙΟ_{k}"])
+            df.to_excel(w, index=False, sheet_name=f"ΣΕΝΑΡΙΟ_{k}")
+        pd.DataFrame({"Σενάριο": [1]}).to_excel(w, index=False, sheet_name="ΣΥΝΟΨΗ")
+    export_step3_nextcol_full(str(src), str(tmp_path / "serial.xlsx"))
+    export_step3_nextcol_full(str(src), str(tmp_path / "pool.xlsx"), workers=2)
+    assert _same_workbook(tmp_path / "serial.xlsx", tmp_path / "pool.xlsx")
@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+"""Βήμα 4: το optimal mode βρίσκει τα πραγματικά top-k (brute force) και οι exporters
+δίνουν ίδια έξοδο σειριακά και με workers."""
+import itertools
+import random
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import step4_corrected as s4
+
+
+def _step3_roster(rng: random.Random, n: int, k: int, n_dyads: int, placed: float = 0.7,
+                  scenario_col: str = "ΒΗΜΑ3_ΣΕΝΑΡΙΟ_1") -> pd.DataFrame:
+    """Ρόστερ μετά το Βήμα 3 με n_dyads αμοιβαίες δυάδες ατοποθέτητων και τυχαίες μονόπλευρες επιλογές."""
+    names = [f"Μαθ {i}" for i in range(n)]
+    labels = [f"Α{j+1}" for j in range(k)]
+    lab = [rng.choice(labels) if rng.random() < placed else np.nan for _ in names]
+    friends = [[] for _ in names]
+    unplaced = [i for i in range(n) if pd.isna(lab[i])]
+    rng.shuffle(unplaced)
+    for t in range(min(n_dyads, len(unplaced) // 2)):
+        a, b = unplaced[2 * t], unplaced[2 * t + 1]
+        friends[a].append(names[b])
+        friends[b].append(names[a])
+    for i in range(n):
+        if rng.random() < 0.3:
+            friends[i].append(names[rng.randrange(n)])
+    return pd.DataFrame({
+        "ΟΝΟΜΑ": names,
+        "ΦΥΛΟ": [rng.choice(["Α", "Κ", "αγορι", "Κ"]) for _ in names],
+        "ΚΑΛΗ_ΓΝΩΣΗ_ΕΛΛΗΝΙΚΩΝ": [rng.choice(["Ν", "Ο", "Ν"]) for _ in names],
+        "ΦΙΛΟΙ": [", ".join(f) for f in friends],
+        scenario_col: lab,
+    })
+
+
+def _random_case(seed: int):
+    rng = random.Random(seed)
+    k = rng.choice([2, 3])
+    df = _step3_roster(rng, rng.randint(8, 40), k, rng.randint(1, 5), placed=rng.choice([0.5, 0.7]))
+    limits = dict(max_scenarios=rng.choice([1, 3, 5]), max_pop_diff=rng.choice([1, 2, 4]),
+                  max_gender_diff=rng.choice([1, 2, 6]), max_greek_diff=rng.choice([1, 3, 6]),
+                  cap_per_class=rng.choice([6, 10, 25]))
+    base = s4._base_assignment_series(df)
+    classes = s4._detect_classes(df)
+    _, dyads = s4.build_unplaced_and_mutual_dyads(df)
+    return df, limits, base, classes, dyads
+
+
+def _brute_force(df, base, classes, dyads, cfg, distinct_profiles: bool):
+    """Όλες οι αναθέσεις δυάδων -> ταξινομημένα (penalty, diffs) των έγκυρων (ανά profile αν ζητηθεί)."""
+    eng = s4.Step4Engine(df, base, classes)
+    vecs = [eng.group_vector(p) for p in dyads]
+    keys = {} if distinct_profiles else []
+    for combo in itertools.product(range(len(classes)), repeat=len(dyads)):
+        M = eng.M.copy()
+        for v, c in zip(vecs, combo):
+            M[c] += v
+        if any(M[c, 0] > cfg.cap_per_class for c in set(combo)):
+            continue
+        d = tuple(int(x) for x in M.max(0) - M.min(0))
+        if not s4._diffs_ok(d, cfg):
+            continue
+        key = (s4._penalty_from_diffs(d),) + d
+        if distinct_profiles:
+            keys[M[np.lexsort(M.T[::-1])].tobytes()] = key
+        else:
+            keys.append(key)
+    values = sorted(keys.values()) if distinct_profiles else sorted(keys)
+    return values[:cfg.max_scenarios]
+
+
+@pytest.mark.parametrize("symmetry_breaking", [False, True])
+@pytest.mark.parametrize("seed", range(25))
+def test_optimal_matches_brute_force(seed, symmetry_breaking):
+    df, limits, base, classes, dyads = _random_case(seed)
+    if not dyads or len(classes) < 2:
+        pytest.skip("χωρίς δυάδες ή με ένα τμήμα")
+    cfg = s4.Step4Config(search_mode="optimal", symmetry_breaking=symmetry_breaking, **limits)
+    sols = s4.generate_scenarios_for_dyads_optimal(df, dyads, base, classes, cfg)
+    got = [(s["penalty"],) + s4.metrics_diff_tuple(s["metrics"]) for s in sols]
+    assert got == _brute_force(df, base, classes, dyads, cfg, distinct_profiles=symmetry_breaking)
+    assert all(s["search"]["proven_optimal"] for s in sols)
+
+
+def test_unknown_search_mode_raises():
+    with pytest.raises(s4.InvalidConfigError):
+        s4.Step4Config(search_mode="exact")
+
+
+@pytest.fixture
+def step3_workbook(tmp_path):
+    rng = random.Random(11)
+    path = tmp_path / "step3.xlsx"
+    with pd.ExcelWriter(path) as w:
+        for k in range(1, 5):
+            col = f"ΒΗΜΑ3_ΣΕΝΑΡΙΟ_{k}"
+            df = _step3_roster(rng, 60, 3, 6, scenario_col=col)
+            df.insert(0, "Α/Α", range(1, len(df) + 1))
+            df[f"ΒΗΜΑ1_ΣΕΝΑΡΙΟ_{k}"] = df[col]
+            df.to_excel(w, index=False, sheet_name=col)
+        pd.DataFrame({"Sheet": ["ΒΗΜΑ3_ΣΕΝΑΡΙΟ_1"]}).to_excel(w, index=False, sheet_name="Σύνοψη")
+    return path
+
+
+@pytest.mark.parametrize("exporter", [
+    s4.export_step4_nextcol_full_multi_filled_v2,
+    s4.export_step3_to_per_scenario_exact_filled_v2,
+    s4.export_step3_to_per_scenario_exact_like_template,
+])
+def test_exporters_workers_match_serial(exporter, step3_workbook, tmp_path):
+    exporter(str(step3_workbook), str(tmp_path / "serial.xlsx"))
+    exporter(str(step3_workbook), str(tmp_path / "pool.xlsx"), workers=3)
+    serial = pd.read_excel(tmp_path / "serial.xlsx", sheet_name=None)
+    pool = pd.read_excel(tmp_path / "pool.xlsx", sheet_name=None)
+    assert list(serial) == list(pool)
+    for sheet in serial:
+        if "generated_at" in serial[sheet].columns:
+            serial[sheet] = serial[sheet].drop(columns="generated_at")
+            pool[sheet] = pool[sheet].drop(columns="generated_at")
+        if "ΒΗΜΑ4_meta" in serial[sheet].columns:
+            # το meta ξεκινά με χρονοσφραγίδα δευτερολέπτου («generated:<iso> cfg=...»)
+            for df in (serial[sheet], pool[sheet]):
+                df["ΒΗΜΑ4_meta"] = df["ΒΗΜΑ4_meta"].str.replace(r"^generated:\S+", "generated:", regex=True)
+        assert serial[sheet].equals(pool[sheet]), sheet
@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+"""Βήμα 5: ίδιο αποτέλεσμα σειριακά / με workers, χωρίς αλλαγή του global random,
+και το beam mode ποτέ χειρότερο από το greedy."""
+import io
+import contextlib
+import random
+
+import pandas as pd
+import pytest
+
+from step5_enhanced import (
+    apply_step5_to_all_scenarios, calculate_penalty_score, step5_place_remaining_students
+)
+
+COL = "ΒΗΜΑ4_ΣΕΝΑΡΙΟ_1"
+
+
+def _step4_roster(rng: random.Random, n: int, k: int, placed: float = 0.6) -> pd.DataFrame:
+    """Ρόστερ μετά το Βήμα 4 με μερικές (όχι πλήρως αμοιβαίες) φιλίες και ~placed τοποθετημένους."""
+    labels = [f"Α{i+1}" for i in range(k)]
+    names = [f"Μ{i}" for i in range(n)]
+    return pd.DataFrame({
+        "ΟΝΟΜΑ": names,
+        "ΦΥΛΟ": [rng.choice("ΑΚ") for _ in names],
+        "ΚΑΛΗ_ΓΝΩΣΗ_ΕΛΛΗΝΙΚΩΝ": [rng.choice("ΝΟ") for _ in names],
+        "ΦΙΛΟΙ": [", ".join(rng.sample(names, rng.randint(0, min(2, n)))) for _ in names],
+        "ΠΛΗΡΩΣ_ΑΜΟΙΒΑΙΑ": [rng.choice(["Ν", "Ο", "Ο"]) for _ in names],
+        COL: [rng.choice(labels) if rng.random() < placed else None for _ in names],
+    })
+
+
+def _scenarios(seed: int) -> dict:
+    rng = random.Random(seed)
+    k = rng.randint(2, 4)
+    return {f"ΣΕΝΑΡΙΟ_{i}": _step4_roster(rng, rng.randint(10, 25 * k - 5), k) for i in range(1, 5)}
+
+
+def _apply(scenarios, **kwargs):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return apply_step5_to_all_scenarios(scenarios, COL, **kwargs)
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_workers_match_serial(seed):
+    scenarios = _scenarios(seed)
+    serial_df, serial_score, serial_name = _apply(scenarios, random_seed=seed)
+    pool_df, pool_score, pool_name = _apply(scenarios, random_seed=seed, workers=3)
+    assert (serial_score, serial_name) == (pool_score, pool_name)
+    assert serial_df.equals(pool_df)
+
+
+def test_seeded_run_leaves_global_random_untouched():
+    scenarios = _scenarios(7)
+    random.seed(123)
+    state = random.getstate()
+    _apply(scenarios, random_seed=5, workers=1)
+    assert random.getstate() == state
+
+
+def test_local_rng_is_reproducible():
+    df = _step4_roster(random.Random(1), 60, 3)
+    a, pa = step5_place_remaining_students(df, COL, rng=random.Random(9))
+    b, pb = step5_place_remaining_students(df, COL, rng=random.Random(9))
+    assert pa == pb and a.equals(b)
+
+
+@pytest.mark.parametrize("seed", range(15))
+def test_beam_never_worse_than_greedy(seed):
+    rng = random.Random(seed)
+    k = rng.randint(2, 4)
+    df = _step4_roster(rng, rng.randint(10, 25 * k - 5), k)
+    greedy, greedy_pen = step5_place_remaining_students(df, COL, k, rng=random.Random(seed))
+    beam, beam_pen = step5_place_remaining_students(df, COL, k, mode="beam", rng=random.Random(seed))
+    assert beam_pen <= greedy_pen
+    assert beam_pen == calculate_penalty_score(beam, COL, k)
+    assert beam[COL].notna().sum() == greedy[COL].notna().sum()
+
+
+def test_unknown_mode_raises():
+    df = _step4_roster(random.Random(0), 10, 2)
+    with pytest.raises(ValueError):
+        step5_place_remaining_students(df, COL, mode="exact")
+    with pytest.raises(ValueError):
+        apply_step5_to_all_scenarios({"ΣΕΝΑΡΙΟ_1": df}, COL, mode="exact")
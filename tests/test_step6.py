@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+"""Βήμα 6: ο Step6Evaluator συμφωνεί με την πλήρη επαναξιολόγηση (_apply_swap + έλεγχοι + penalty_score)."""
+import io
+import contextlib
+import random
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import step6_compliant as s6
+
+CLS, GENDER, LANG, STEP, GROUP = "ΤΜΗΜΑ", "ΦΥΛΟ", "ΚΑΛΗ_ΓΝΩΣΗ_ΕΛΛΗΝΙΚΩΝ", "ΒΗΜΑ_ΤΟΠΟΘΕΤΗΣΗΣ", "GROUP_ID"
+
+
+def _step5_roster(rng: random.Random) -> pd.DataFrame:
+    """Δυάδες Βήματος 4 (GROUP_ID, μερικές σπασμένες) και μεμονωμένοι Βήματος 5."""
+    k = rng.choice([2, 3, 4])
+    n = rng.randint(3 * k, 12 * k)
+    rows, gid, i = [], 0, 0
+    while i < n:
+        pair = rng.random() < 0.4 and i + 1 < n
+        gid += pair
+        for j in ((i, i + 1) if pair else (i,)):
+            rows.append({
+                "ID": f"S{j}", CLS: f"Α{rng.randint(1, k)}", GENDER: rng.choice("ΑΚ"), LANG: rng.choice("ΝΟ"),
+                STEP: 4 if pair else 5, GROUP: f"G{gid}" if pair else np.nan,
+                "ΖΩΗΡΟΣ": rng.choice("ΝΟΟΟ"), "ΙΔΙΑΙΤΕΡΟΤΗΤΑ": rng.choice("ΝΟΟΟ"),
+                "ΠΑΙΔΙ_ΕΚΠΑΙΔΕΥΤΙΚΟΥ": rng.choice("ΝΟΟΟ"),
+            })
+        i += 2 if pair else 1
+    df = pd.DataFrame(rows)
+    df["ΤΜΗΜΑ_ΠΡΙΝ_ΒΗΜΑ6"] = df[CLS]
+    return df
+
+
+def _full_recompute(df, baseline, fromA, classA, fromB, classB):
+    after = s6._apply_swap(df, CLS, fromA, classB, fromB, classA, "test", 1, STEP, GROUP)
+    ok = (s6._check_size_ok(after, CLS)
+          and s6._check_protected_constraints(baseline, after, CLS, STEP)
+          and s6._check_friendship_constraints(df, after, CLS, GROUP))
+    if not ok:
+        return None
+    d = s6._metrics(after, CLS, GENDER, LANG)["deltas"]
+    return {key: d[key] for key in ("pop", "boys", "girls", "gender", "lang")}, \
+        s6.penalty_score(after, CLS, GENDER, LANG)
+
+
+@pytest.mark.parametrize("seed", range(40))
+def test_evaluator_matches_full_recompute(seed):
+    rng = random.Random(seed)
+    df = _step5_roster(rng)
+    if df[CLS].nunique() < 2:
+        pytest.skip("ένα μόνο τμήμα")
+    baseline = df.copy()
+    if seed % 3 == 0:
+        # baseline που διαφέρει από την τρέχουσα κατάσταση
+        baseline.loc[baseline.index[0], "ΤΜΗΜΑ_ΠΡΙΝ_ΒΗΜΑ6"] = "Α1"
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        candidates = s6._enum_BOTH(df, CLS, GENDER, LANG, STEP, GROUP, top_k=3)
+        evaluator = s6.Step6Evaluator(df, baseline, CLS, GENDER, LANG, GROUP)
+        evaluated = [(c, evaluator.evaluate(c[0], c[3], c[2], c[1])) for c in candidates]
+        # η πλήρης επαναξιολόγηση είναι ακριβή: όλες οι αποδεκτές + δείγμα των απορριπτόμενων
+        accepted = [e for e in evaluated if e[1] is not None]
+        rejected = [e for e in evaluated if e[1] is None]
+        checked = accepted + rng.sample(rejected, min(20, len(rejected)))
+        for (fromA, classA, fromB, classB, _reason), got in checked:
+            expected = _full_recompute(df, baseline, fromA, classA, fromB, classB)
+            if expected is None:
+                assert got is None
+            else:
+                assert got is not None
+                d, pen = got
+                assert {key: d[key] for key in expected[0]} == expected[0]
+                assert pen == expected[1]